@@ -0,0 +1,440 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import shutil
+import logging
+from pathlib import Path
+from typing import Any, Collection, Dict, List, Optional, Tuple
+from .provider_aggregates import ProviderAggregateState, provider_index_as_str
+from .hll_sketch import HLLSketches
+from .code_features import ProviderCodeCounts
+from .duplicate_claims import duplicate_counts, update_duplicate_claims
+from .schema_registry import ID_PREFIXES, decode_prefixed_id
+from .feature_spec import PERIOD_COLUMN, spec_fingerprint
+from .data_quality import DataQualityReport
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Directorio del estado persistido de agregados por proveedor
+STATE_DIR = Path(__file__).parent.parent / "data" / "aggregate_state"
+
+# Directorio de agregados parciales por archivo calculados durante la subida
+PARTIALS_DIR = Path(__file__).parent.parent / "data" / "upload_partials"
+
+# Número de particiones (por hash de Provider) de los pares distintos
+DEFAULT_BUCKETS = 64
+
+# Versión del formato del estado persistido
+STATE_FORMAT_VERSION = 3
+
+
+def file_signature(path) -> Dict[str, int]:
+    """Tamaño y fecha de modificación de un archivo de entrada"""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def provider_buckets(providers, n_buckets: int) -> np.ndarray:
+    """
+    Asigna cada proveedor a una partición estable (independiente del proceso).
+
+    Args:
+        providers: Identificadores de proveedor
+        n_buckets: Número de particiones
+
+    Returns:
+        Array con el número de partición de cada proveedor
+    """
+    providers = pd.Series(providers)
+    if isinstance(providers.dtype, pd.CategoricalDtype):
+        # Solo se hashean las categorías (los nulos, como 'nan', igual que con astype(str))
+        buckets = provider_buckets(list(providers.cat.categories) + ['nan'], n_buckets)
+        return buckets[providers.cat.codes.to_numpy()]
+    values = np.asarray(providers.astype(str), dtype=object)
+    return (pd.util.hash_array(values) % n_buckets).astype(np.int64)
+
+
+def _sketch_precision(state: ProviderAggregateState) -> Optional[int]:
+    """Precisión de los sketches del estado (None si el conteo de distintos es exacto)"""
+    return next((sketch.precision for sketch in state.sketches.values()), None)
+
+
+class AggregateStateStore:
+    """
+    Estado persistido de agregados parciales por proveedor para la ingesta incremental.
+
+    Guarda las sumas por proveedor en un único Parquet y los pares distintos
+    (Provider, valor) particionados por hash de Provider, de modo que incorporar
+    archivos nuevos solo lee y reescribe las particiones de los proveedores afectados.
+    En modo aproximado guarda, en lugar de los pares, los sketches HyperLogLog
+    de cada proveedor (tamaño fijo, independiente del número de claims).
+    Los agregados por (Provider, Period) se guardan con el mismo formato en periods/.
+    Los productos de los claims calculados en la misma pasada (ver
+    provider_aggregates.CLAIM_PRODUCTS) se guardan junto al estado: los pares
+    proveedor-médico distintos en physicians.parquet, los conteos de códigos en
+    codes.npz y las firmas de los claims particionadas por hash de la firma en
+    signatures/, junto con los conteos y el detalle de claims repetidos que salen de
+    ellas (duplicates.parquet y duplicate_claims.parquet). Como el manifiesto, solo
+    son válidos tras commit().
+    """
+
+    def __init__(self, store_dir: Path = STATE_DIR, n_buckets: int = DEFAULT_BUCKETS):
+        self.store_dir = Path(store_dir)
+        self.n_buckets = n_buckets
+        self.manifest_path = self.store_dir / "manifest.json"
+        self.sums_path = self.store_dir / "sums.parquet"
+        self.physicians_path = self.store_dir / "physicians.parquet"
+        self.codes_path = self.store_dir / "codes.npz"
+        self.duplicates_path = self.store_dir / "duplicates.parquet"
+        self.duplicate_claims_path = self.store_dir / "duplicate_claims.parquet"
+        # Manifiesto del estado escrito por save/fold, pendiente hasta commit()
+        self._pending_manifest: Optional[Dict[str, Any]] = None
+
+    def _distinct_dir(self, source: str) -> Path:
+        return self.store_dir / "distinct" / source
+
+    def _bucket_path(self, source: str, bucket: int) -> Path:
+        return self._distinct_dir(source) / f"bucket_{bucket:04d}.parquet"
+
+    def _sketch_path(self, source: str) -> Path:
+        return self.store_dir / "sketches" / f"{source}.npz"
+
+    def _signature_path(self, bucket: int) -> Path:
+        return self.store_dir / "signatures" / f"bucket_{bucket:04d}.parquet"
+
+    def load_manifest(self) -> Optional[Dict[str, Any]]:
+        """
+        Lee el manifiesto del estado (archivos ya incorporados y versión de features).
+
+        Returns:
+            Manifiesto, o None si no existe o fue generado con otra versión
+        """
+        if not self.manifest_path.exists() or not self.sums_path.exists():
+            return None
+        with open(self.manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != STATE_FORMAT_VERSION:
+            return None
+        if manifest.get("feature_spec") != spec_fingerprint():
+            logger.info("La definición de features cambió, el estado incremental se descarta")
+            return None
+        return manifest
+
+    def _manifest(self, claim_files: Dict[str, Any], beneficiary_files: Dict[str, Any],
+                  state: ProviderAggregateState) -> Dict[str, Any]:
+        return {
+            "format_version": STATE_FORMAT_VERSION,
+            "feature_spec": spec_fingerprint(),
+            "n_buckets": self.n_buckets,
+            "sketch_precision": _sketch_precision(state),
+            "products": state.products,
+            "claim_files": claim_files,
+            "beneficiary_files": beneficiary_files,
+        }
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        tmp_path = self.manifest_path.with_suffix(".json.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _write_parquet(self, df: pd.DataFrame, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".parquet.tmp")
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+
+    def _periods_store(self) -> "AggregateStateStore":
+        return AggregateStateStore(self.store_dir / "periods", self.n_buckets)
+
+    @staticmethod
+    def _plain_sums(sums: pd.DataFrame) -> pd.DataFrame:
+        sums = sums.copy()
+        sums.index = provider_index_as_str(sums.index)
+        return sums
+
+    @staticmethod
+    def _plain_pairs(pairs: pd.DataFrame) -> pd.DataFrame:
+        """Pares distintos como texto (el mes se conserva como fecha)"""
+        return pairs.astype({col: str for col in pairs.columns if col != PERIOD_COLUMN})
+
+    @staticmethod
+    def _plain_signatures(signatures: pd.DataFrame) -> pd.DataFrame:
+        """Firmas con Provider y ClaimID como texto (el ClaimID codificado se decodifica)"""
+        claim_ids = signatures['ClaimID']
+        if pd.api.types.is_integer_dtype(claim_ids):
+            claim_ids = decode_prefixed_id(claim_ids, ID_PREFIXES['ClaimID'])
+        return pd.DataFrame({
+            'Provider': np.asarray(signatures['Provider'].astype(str), dtype=object),
+            'ClaimID': np.asarray(claim_ids.astype(str), dtype=object),
+            'Signature': signatures['Signature'].to_numpy(dtype=np.uint64),
+        })
+
+    def _signature_buckets(self, signatures: pd.DataFrame) -> np.ndarray:
+        return (signatures['Signature'].to_numpy(dtype=np.uint64) % np.uint64(self.n_buckets)).astype(np.int64)
+
+    def load_duplicates(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Conteos por proveedor y detalle de claims repetidos del estado guardado.
+
+        Returns:
+            Tupla (conteos, detalle), como duplicate_claims.duplicate_counts
+        """
+        return pd.read_parquet(self.duplicates_path), pd.read_parquet(self.duplicate_claims_path)
+
+    def save(self, state: ProviderAggregateState, claim_files: Dict[str, Any],
+             beneficiary_files: Dict[str, Any]) -> None:
+        """
+        Reemplaza el estado persistido por uno completo. El estado no es reutilizable
+        hasta commit(), que se llama cuando las salidas ya están escritas.
+
+        Args:
+            state: Estado agregado de todos los claims
+            claim_files: Firmas de los archivos de claims incorporados
+            beneficiary_files: Firmas de los archivos de beneficiarios usados
+        """
+        self.clear()
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self._write_state(state)
+        self._pending_manifest = self._manifest(claim_files, beneficiary_files, state)
+        logger.info(f"Estado de agregados guardado: {len(state.sums)} providers en {self.store_dir}")
+
+    def _write_state(self, state: ProviderAggregateState) -> None:
+        self._write_parquet(self._plain_sums(state.sums), self.sums_path)
+
+        for source, pairs in state.distinct.items():
+            pairs = self._plain_pairs(pairs)
+            buckets = provider_buckets(pairs['Provider'], self.n_buckets)
+            for bucket, bucket_pairs in pairs.groupby(buckets):
+                self._write_parquet(bucket_pairs.reset_index(drop=True), self._bucket_path(source, int(bucket)))
+
+        for source, sketch in state.sketches.items():
+            sketch.save(self._sketch_path(source))
+
+        if state.periods is not None:
+            self._periods_store()._write_state(state.periods)
+
+        if state.physicians is not None:
+            self._write_parquet(self._plain_pairs(state.physicians).reset_index(drop=True), self.physicians_path)
+
+        if state.codes is not None:
+            state.codes.save(self.codes_path)
+
+        if state.signatures is not None:
+            signatures = self._plain_signatures(state.signatures)
+            for bucket, bucket_signatures in signatures.groupby(self._signature_buckets(signatures)):
+                self._write_parquet(bucket_signatures.reset_index(drop=True), self._signature_path(int(bucket)))
+            counts, drilldown = duplicate_counts(signatures)
+            self._write_parquet(counts, self.duplicates_path)
+            self._write_parquet(drilldown, self.duplicate_claims_path)
+
+    def fold(self, delta: ProviderAggregateState, claim_files: Dict[str, Any],
+             beneficiary_files: Dict[str, Any]) -> ProviderAggregateState:
+        """
+        Incorpora los agregados de archivos nuevos al estado persistido.
+
+        Args:
+            delta: Estado agregado solo de los claims nuevos
+            claim_files: Firmas de todos los archivos de claims (ya incorporados + nuevos)
+            beneficiary_files: Firmas de los archivos de beneficiarios usados
+
+        Returns:
+            Estado combinado restringido a los proveedores afectados por el delta
+            (en los agregados por mes, todos los meses de esos proveedores). Los pares
+            proveedor-médico y los conteos de códigos se devuelven completos: la red se
+            recalcula sobre todos y los conteos se guardan en un único archivo
+        """
+        # Sin manifiesto el estado no se reutiliza: si la ingesta no llega a commit()
+        # (cancelada o con error), la siguiente recalcula todo
+        self.manifest_path.unlink(missing_ok=True)
+        merged, total = self._fold_state(delta)
+        self._pending_manifest = self._manifest(claim_files, beneficiary_files, delta)
+        logger.info(f"Estado incremental actualizado: {len(merged.sums)} providers afectados de {total}")
+        return merged
+
+    def _fold_state(self, delta: ProviderAggregateState) -> Tuple[ProviderAggregateState, int]:
+        """Combina el delta con lo guardado; devuelve el estado afectado y el total de filas de sums"""
+        delta_sums = self._plain_sums(delta.sums)
+        keys = list(delta_sums.index.names)
+        affected = delta_sums.index.get_level_values('Provider').unique()
+
+        stored_sums = pd.read_parquet(self.sums_path) if self.sums_path.exists() else delta_sums.iloc[:0]
+        is_affected = stored_sums.index.get_level_values('Provider').isin(affected)
+        merged_sums = pd.concat([stored_sums[is_affected], delta_sums]).groupby(level=keys).sum()
+        all_sums = pd.concat([stored_sums[~is_affected], merged_sums])
+        self._write_parquet(all_sums, self.sums_path)
+
+        merged_distinct = {}
+        affected_buckets = provider_buckets(affected, self.n_buckets)
+        for source, pairs in delta.distinct.items():
+            pairs = self._plain_pairs(pairs)
+            pair_buckets = provider_buckets(pairs['Provider'], self.n_buckets)
+            merged_pairs = []
+            for bucket in np.unique(affected_buckets):
+                path = self._bucket_path(source, int(bucket))
+                bucket_pairs = pairs[pair_buckets == bucket]
+                if path.exists():
+                    bucket_pairs = pd.concat([pd.read_parquet(path), bucket_pairs], ignore_index=True).drop_duplicates()
+                self._write_parquet(bucket_pairs.reset_index(drop=True), path)
+                merged_pairs.append(bucket_pairs[bucket_pairs['Provider'].isin(affected)])
+            merged_distinct[source] = pd.concat(merged_pairs, ignore_index=True)
+
+        merged_sketches = {}
+        for source, sketch in delta.sketches.items():
+            path = self._sketch_path(source)
+            if path.exists():
+                sketch = HLLSketches.load(path).merge(sketch)
+            sketch.save(path)
+            merged_sketches[source] = sketch.subset(affected)
+
+        merged_periods = None
+        if delta.periods is not None and not delta.periods.sums.empty:
+            merged_periods, _ = self._periods_store()._fold_state(delta.periods)
+
+        merged_physicians = None
+        if delta.physicians is not None:
+            # Solo se añaden los pares nuevos a los guardados, sin volver a leer los claims
+            merged_physicians = self._plain_pairs(delta.physicians)
+            if self.physicians_path.exists():
+                merged_physicians = pd.concat([pd.read_parquet(self.physicians_path), merged_physicians],
+                                              ignore_index=True).drop_duplicates(ignore_index=True)
+            self._write_parquet(merged_physicians, self.physicians_path)
+
+        merged_codes = None
+        if delta.codes is not None:
+            # Los conteos son sumas: a los guardados se suman los de los archivos nuevos
+            merged_codes = delta.codes
+            if self.codes_path.exists():
+                merged_codes = ProviderCodeCounts.load(self.codes_path).merge(delta.codes)
+            merged_codes.save(self.codes_path)
+
+        if delta.signatures is not None:
+            self._fold_signatures(self._plain_signatures(delta.signatures))
+        merged = ProviderAggregateState(merged_sums, merged_distinct, merged_sketches, merged_periods,
+                                        merged_physicians, merged_codes)
+        return merged, len(all_sums)
+
+    def _fold_signatures(self, new: pd.DataFrame) -> None:
+        """
+        Añade firmas nuevas a las guardadas y actualiza los conteos de repetidos.
+
+        Solo se leen las particiones de las firmas nuevas; en cada una, las firmas
+        guardadas con el mismo valor se buscan por hash (isin) y solo esos grupos se
+        vuelven a contar (ver duplicate_claims.update_duplicate_claims).
+        """
+        matches = []
+        for bucket, bucket_new in new.groupby(self._signature_buckets(new)):
+            path = self._signature_path(int(bucket))
+            if path.exists():
+                stored = pd.read_parquet(path)
+                matches.append(stored[stored['Signature'].isin(bucket_new['Signature'])])
+                bucket_new = pd.concat([stored, bucket_new], ignore_index=True)
+            self._write_parquet(bucket_new.reset_index(drop=True), path)
+        matches = pd.concat(matches, ignore_index=True) if matches else new.iloc[:0]
+        counts, drilldown = update_duplicate_claims(*self.load_duplicates(), matches, new)
+        self._write_parquet(counts, self.duplicates_path)
+        self._write_parquet(drilldown, self.duplicate_claims_path)
+
+    def commit(self) -> None:
+        """
+        Escribe el manifiesto del último save/fold: a partir de aquí el estado
+        corresponde a las salidas escritas y la siguiente ingesta puede reutilizarlo.
+        """
+        if self._pending_manifest is None:
+            return
+        self._write_manifest(self._pending_manifest)
+        self._pending_manifest = None
+
+    def clear(self) -> None:
+        """Elimina el estado persistido"""
+        if self.store_dir.exists():
+            shutil.rmtree(self.store_dir)
+
+
+class UploadPartialStore:
+    """
+    Agregados parciales de un archivo de claims calculados mientras se subía.
+
+    Cada parcial queda asociado a la firma del archivo, la versión de features,
+    los beneficiarios con que se unió y la precisión de los sketches; si alguno
+    cambia, el parcial se ignora y el archivo se vuelve a leer en la ingesta.
+    Junto al estado se guarda el informe de calidad de los bloques agregados, que
+    la ingesta incorpora a su propio informe como si hubiera leído el archivo, y los
+    productos de CLAIM_PRODUCTS que se calcularon (un parcial solo sirve a una ingesta
+    que no pida otros).
+    """
+
+    def __init__(self, partials_dir: Path = PARTIALS_DIR):
+        self.partials_dir = Path(partials_dir)
+
+    def _partial_path(self, claim_file) -> Path:
+        return self.partials_dir / f"{Path(claim_file).name}.pkl"
+
+    def save(self, claim_file, state: ProviderAggregateState, beneficiary_files: Dict[str, Any],
+             quality: DataQualityReport, sketch_precision: Optional[int] = None) -> None:
+        """
+        Guarda el estado parcial de un archivo de claims ya escrito en disco.
+
+        Args:
+            claim_file: Ruta del archivo de claims
+            state: Estado agregado del archivo completo
+            beneficiary_files: Firmas de los archivos de beneficiarios usados en la unión
+            quality: Informe de calidad de los bloques del archivo (sin errores)
+            sketch_precision: Precisión de los sketches del estado (None = exacto)
+        """
+        self.partials_dir.mkdir(parents=True, exist_ok=True)
+        path = self._partial_path(claim_file)
+        tmp_path = path.with_suffix(".pkl.tmp")
+        pd.to_pickle({
+            "signature": file_signature(claim_file),
+            "feature_spec": spec_fingerprint(),
+            "beneficiary_files": beneficiary_files,
+            "sketch_precision": sketch_precision,
+            "state": state,
+            "products": state.products,
+            "quality": quality,
+        }, tmp_path)
+        os.replace(tmp_path, path)
+        logger.info(f"Agregado parcial guardado para {Path(claim_file).name}: {len(state.sums)} providers")
+
+    def load(self, claim_file, beneficiary_files: Dict[str, Any],
+             sketch_precision: Optional[int] = None,
+             products: Collection[str] = ()) -> Optional[Tuple[ProviderAggregateState, DataQualityReport]]:
+        """
+        Devuelve el estado parcial de un archivo si sigue siendo válido.
+
+        Args:
+            claim_file: Ruta del archivo de claims
+            beneficiary_files: Firmas de los archivos de beneficiarios actuales
+            sketch_precision: Precisión de sketches requerida (None = exacto)
+            products: Productos de CLAIM_PRODUCTS que el parcial debe incluir
+
+        Returns:
+            Tupla (estado parcial, informe de calidad de sus bloques), o None si no existe
+            o ya no corresponde (también si se guardó sin informe de calidad)
+        """
+        path = self._partial_path(claim_file)
+        if not path.exists():
+            return None
+        try:
+            partial = pd.read_pickle(path)
+        except Exception as e:
+            logger.warning(f"Agregado parcial ilegible {path}: {e}")
+            return None
+        is_valid = (
+            partial.get("signature") == file_signature(claim_file)
+            and partial.get("feature_spec") == spec_fingerprint()
+            and partial.get("beneficiary_files") == beneficiary_files
+            and partial.get("sketch_precision") == sketch_precision
+            and partial.get("quality") is not None
+            and partial.get("products") is not None
+            and set(products) <= set(partial["products"])
+        )
+        return (partial["state"], partial["quality"]) if is_valid else None
+
+    def discard(self, claim_file) -> None:
+        """Elimina el parcial de un archivo (p. ej. si se reemplaza)"""
+        self._partial_path(claim_file).unlink(missing_ok=True)
@@ -0,0 +1,448 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from .aggregate_store import file_signature
+from .columnar_cache import read_table, iter_table_chunks
+from .schema_registry import ID_PREFIXES, decode_prefixed_id
+from .code_features import CODE_FAMILIES, text_categorical
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pragma: no cover - el índice es opcional
+    pa = None
+    pc = None
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Columnas de detalle de cada claim por tipo (las que no existan en un archivo quedan nulas)
+TEXT_COLUMNS = [
+    'Provider', 'ClaimID', 'BeneID', 'AttendingPhysician', 'OperatingPhysician', 'OtherPhysician',
+    'ClmAdmitDiagnosisCode', 'DiagnosisGroupCode'
+] + CODE_FAMILIES['dx'] + CODE_FAMILIES['px']
+DATE_COLUMNS = ['ClaimStartDt', 'ClaimEndDt', 'AdmissionDt', 'DischargeDt']
+AMOUNT_COLUMNS = ['InscClaimAmtReimbursed', 'DeductibleAmtPaid']
+CLAIM_COLUMNS = TEXT_COLUMNS + DATE_COLUMNS + AMOUNT_COLUMNS
+
+# Filas por record batch del archivo Arrow
+BATCH_SIZE = 65_536
+
+# Máximo de claims por página
+MAX_PAGE_SIZE = 1000
+
+# Segmentos agregados por ingestas con archivos nuevos antes de reconstruir en uno solo
+MAX_SEGMENTS = 8
+
+
+def index_path(claims_file: Path) -> Path:
+    """Ruta del índice de offsets (Provider -> segmento y filas) junto al archivo de claims ordenado"""
+    claims_file = Path(claims_file)
+    return claims_file.with_name(f"{claims_file.stem}_index.csv")
+
+
+def manifest_path(claims_file: Path) -> Path:
+    """Ruta del manifiesto con los archivos de entrada incluidos en cada segmento"""
+    claims_file = Path(claims_file)
+    return claims_file.with_name(f"{claims_file.stem}_manifest.json")
+
+
+def segment_path(claims_file: Path, segment: int) -> Path:
+    """Ruta de un segmento (el 0 es el propio archivo de claims, los siguientes se agregan al lado)"""
+    claims_file = Path(claims_file)
+    if segment == 0:
+        return claims_file
+    return claims_file.with_name(f"{claims_file.stem}_{segment}{claims_file.suffix}")
+
+
+def is_available() -> bool:
+    """Indica si pyarrow está instalado y el índice de claims puede generarse"""
+    return pa is not None
+
+
+def _claim_schema() -> "pa.Schema":
+    return pa.schema(
+        [(col, pa.string()) for col in TEXT_COLUMNS]
+        + [(col, pa.timestamp('ns')) for col in DATE_COLUMNS]
+        + [(col, pa.float64()) for col in AMOUNT_COLUMNS]
+        + [('Claim_Type', pa.string())]
+    )
+
+
+def _run_schema() -> "pa.Schema":
+    """Esquema de un bloque ordenado: las columnas de texto como diccionarios (códigos + valores distintos)"""
+    text = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema(
+        [(col, text) for col in TEXT_COLUMNS]
+        + [(col, pa.timestamp('ns')) for col in DATE_COLUMNS]
+        + [(col, pa.float64()) for col in AMOUNT_COLUMNS]
+        + [('Claim_Type', text)]
+    )
+
+
+def _text_categorical(claims: pd.DataFrame, col: str) -> pd.Categorical:
+    """
+    Categórico con el texto de una columna. Los IDs con prefijo se decodifican solo en
+    las categorías y, como no son códigos, no pasan por text_categorical.
+    """
+    values = claims[col]
+    if col not in ID_PREFIXES:
+        return text_categorical(values)
+    values = values.astype('category')
+    categories = decode_prefixed_id(pd.Series(values.cat.categories), ID_PREFIXES[col]).astype(str)
+    return pd.Categorical.from_codes(values.cat.codes.to_numpy(), categories=pd.Index(categories, dtype=object))
+
+
+def _dictionary_array(codes: np.ndarray, categories) -> "pa.DictionaryArray":
+    codes = codes.astype(np.int32)
+    return pa.DictionaryArray.from_arrays(pa.array(codes, mask=codes < 0),
+                                          pa.array(np.asarray(categories, dtype=object), pa.string()))
+
+
+def _sorted_run(claims: pd.DataFrame, claim_type: str) -> Tuple["pa.Table", pd.DataFrame]:
+    """
+    Ordena un bloque de claims por Provider y ClaimStartDt (sin los claims sin proveedor).
+
+    Las columnas de texto se convierten a categóricos y se ordenan y escriben como
+    diccionarios de Arrow: solo los valores distintos pasan a texto, no cada fila.
+    El orden se calcula con lexsort sobre los códigos del proveedor (con las categorías
+    ordenadas) y la fecha de inicio, y es estable como el de pc.sort_indices.
+
+    Returns:
+        Tupla (tabla con _run_schema, offsets Provider -> [Start, End) del bloque)
+    """
+    provider = _text_categorical(claims, 'Provider')
+    provider = provider.reorder_categories(provider.categories.sort_values())
+    start_dates = (pd.to_datetime(claims['ClaimStartDt'], errors='coerce').to_numpy(dtype='datetime64[ns]')
+                   if 'ClaimStartDt' in claims.columns else np.full(len(claims), np.datetime64('NaT'), 'datetime64[ns]'))
+    # Las fechas nulas van al final, como en pc.sort_indices
+    start_keys = np.where(np.isnat(start_dates), np.iinfo(np.int64).max, start_dates.view(np.int64))
+    provider_codes = provider.codes
+    order = np.lexsort((start_keys, provider_codes))
+    order = order[provider_codes[order] >= 0]
+
+    arrays = []
+    for col in TEXT_COLUMNS:
+        if col not in claims.columns:
+            arrays.append(pa.nulls(len(order), pa.dictionary(pa.int32(), pa.string())))
+            continue
+        values = provider if col == 'Provider' else _text_categorical(claims, col)
+        arrays.append(_dictionary_array(values.codes[order], values.categories))
+    for col in DATE_COLUMNS:
+        values = (pd.to_datetime(claims[col], errors='coerce').to_numpy(dtype='datetime64[ns]') if col in claims.columns
+                  else np.full(len(claims), np.datetime64('NaT'), 'datetime64[ns]'))
+        arrays.append(pa.array(values[order], pa.timestamp('ns'), from_pandas=True))
+    for col in AMOUNT_COLUMNS:
+        values = (pd.to_numeric(claims[col], errors='coerce').to_numpy(dtype=np.float64) if col in claims.columns
+                  else np.full(len(claims), np.nan))
+        arrays.append(pa.array(values[order], pa.float64(), from_pandas=True))
+    arrays.append(_dictionary_array(np.zeros(len(order)), [claim_type]))
+    table = pa.Table.from_arrays(arrays, schema=_run_schema())
+
+    counts = np.bincount(provider_codes[order], minlength=len(provider.categories))
+    ends = np.cumsum(counts)
+    offsets = pd.DataFrame({
+        'Provider': np.asarray(provider.categories, dtype=object),
+        'Start': (ends - counts).astype(np.int64),
+        'End': ends.astype(np.int64),
+    })[counts > 0].reset_index(drop=True)
+    return table, offsets
+
+
+def _claim_paths(files: Dict[str, List[Path]]) -> List[Tuple[Path, str]]:
+    """Archivos de claims con su tipo, en el orden de lectura"""
+    return [(Path(file), claim_type) for claim_type in ['inpatient', 'outpatient']
+            for file in files.get(claim_type, [])]
+
+
+def _write_table(table: "pa.Table", path: Path) -> None:
+    """Escribe una tabla Arrow IPC sin comprimir (para leerla con memory mapping)"""
+    with pa.OSFile(str(path), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=BATCH_SIZE)
+
+
+def _merge_runs(runs: List[Tuple[Path, pd.DataFrame]], path: Path) -> pd.DataFrame:
+    """
+    Combina bloques ordenados en un segmento ordenado por Provider y ClaimStartDt.
+
+    Los proveedores se reparten en tandas de unas BATCH_SIZE filas; como cada bloque
+    está ordenado por proveedor, las filas de una tanda son un tramo contiguo de cada
+    bloque. Los tramos se concatenan en el orden de los bloques y se reordenan (orden
+    estable, igual que ordenar todos los claims juntos), así que en memoria solo hay
+    una tanda a la vez además de los bloques mapeados.
+
+    Args:
+        runs: Bloques (archivo Arrow con _run_schema, offsets) en el orden de lectura
+        path: Ruta del segmento (escritura atómica)
+
+    Returns:
+        Offsets Provider -> [Start, End) del segmento
+    """
+    totals = (pd.concat([offsets for _, offsets in runs], ignore_index=True) if runs
+              else pd.DataFrame({'Provider': pd.Series(dtype=object), 'Start': [], 'End': []}))
+    totals = (totals['End'] - totals['Start']).groupby(totals['Provider'], sort=True).sum()
+    ends = np.cumsum(totals.to_numpy(dtype=np.int64))
+    offsets = pd.DataFrame({'Provider': totals.index.to_numpy(dtype=object),
+                            'Start': ends - totals.to_numpy(dtype=np.int64), 'End': ends})
+
+    sources = [pa.memory_map(str(run_path), 'r') for run_path, _ in runs]
+    try:
+        tables = [pa.ipc.open_file(source).read_all() for source in sources]
+        tmp_path = path.with_name(path.name + ".tmp")
+        with pa.OSFile(str(tmp_path), 'wb') as sink:
+            with pa.ipc.new_file(sink, _claim_schema()) as writer:
+                batches = offsets['Start'].to_numpy() // BATCH_SIZE
+                bounds = np.flatnonzero(np.diff(batches, prepend=-1, append=-1))
+                for first, last in zip(bounds[:-1], bounds[1:] - 1):
+                    low, high = offsets['Provider'].iloc[first], offsets['Provider'].iloc[last]
+                    parts = []
+                    for table, (_, run_offsets) in zip(tables, runs):
+                        providers = run_offsets['Provider'].to_numpy(dtype=object)
+                        i, j = np.searchsorted(providers, low, 'left'), np.searchsorted(providers, high, 'right')
+                        if i < j:
+                            start, end = run_offsets['Start'].iloc[i], run_offsets['End'].iloc[j - 1]
+                            parts.append(table.slice(start, end - start).cast(_claim_schema()))
+                    rows = pa.concat_tables(parts)
+                    rows = rows.take(pc.sort_indices(rows, sort_keys=[('Provider', 'ascending'),
+                                                                      ('ClaimStartDt', 'ascending')]))
+                    writer.write_table(rows, max_chunksize=BATCH_SIZE)
+        os.replace(tmp_path, path)
+    finally:
+        for source in sources:
+            source.close()
+    return offsets
+
+
+def _write_sorted_claims(paths: List[Tuple[Path, str]], path: Path,
+                         chunk_size: Optional[int] = None) -> pd.DataFrame:
+    """
+    Escribe los claims de los archivos ordenados por Provider y ClaimStartDt en un segmento.
+
+    Cada bloque leído (cada archivo, o cada chunk_size filas) se ordena y se escribe
+    como un bloque temporal; después los bloques se combinan por tandas de proveedores
+    (ver _merge_runs), sin juntar todos los claims en memoria.
+
+    Args:
+        paths: Archivos de claims con su tipo (ver _claim_paths)
+        path: Ruta del segmento
+        chunk_size: Si se indica, lee y ordena por bloques de este tamaño
+
+    Returns:
+        Offsets Provider -> [Start, End) del segmento
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="claim_runs_", dir=path.parent) as tmp_dir:
+        runs = []
+        for file, claim_type in paths:
+            chunks = iter_table_chunks(file, chunk_size, CLAIM_COLUMNS) if chunk_size else [read_table(file, CLAIM_COLUMNS)]
+            for chunk in chunks:
+                table, offsets = _sorted_run(chunk, claim_type)
+                run_path = Path(tmp_dir) / f"run_{len(runs):05d}.arrow"
+                _write_table(table, run_path)
+                runs.append((run_path, offsets))
+        return _merge_runs(runs, path)
+
+
+def _write_index(output: Path, offsets: pd.DataFrame, segments: List[Dict[str, Any]]) -> None:
+    """Reemplaza el índice de offsets y después el manifiesto de segmentos"""
+    index_tmp = index_path(output).with_name(index_path(output).name + ".tmp")
+    offsets[['Provider', 'Segment', 'Start', 'End']].to_csv(index_tmp, index=False)
+    os.replace(index_tmp, index_path(output))
+    manifest_tmp = manifest_path(output).with_name(manifest_path(output).name + ".tmp")
+    with open(manifest_tmp, 'w') as f:
+        json.dump({"segments": segments}, f, indent=2)
+    os.replace(manifest_tmp, manifest_path(output))
+
+
+def _load_manifest(output: Path) -> Optional[Dict[str, Any]]:
+    """Manifiesto de segmentos, o None si falta o no corresponde a los archivos en disco"""
+    path = manifest_path(output)
+    if not path.exists() or not index_path(output).exists():
+        return None
+    try:
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    segments = manifest.get("segments") or []
+    if not segments or not all(segment_path(output, n).exists() for n in range(len(segments))):
+        return None
+    return manifest
+
+
+def build_claim_index(files: Dict[str, List[Path]], output: Path, chunk_size: Optional[int] = None) -> int:
+    """
+    Escribe los claims ordenados por Provider en un único segmento Arrow IPC (sin comprimir,
+    para poder leerlo con memory mapping) y el índice Provider -> [Start, End) de filas.
+
+    Cada archivo (o cada bloque de chunk_size filas) se ordena por separado y los
+    bloques ordenados se combinan por tandas de proveedores (ver _write_sorted_claims).
+
+    Args:
+        files: Rutas por tipo de archivo (ver unified_ingestor.find_input_files)
+        output: Ruta del archivo .arrow (el índice se guarda en index_path(output))
+        chunk_size: Si se indica, lee y ordena por bloques de este tamaño
+
+    Returns:
+        Número de claims escritos
+    """
+    output = Path(output)
+    previous = _load_manifest(output)
+    paths = _claim_paths(files)
+    offsets = _write_sorted_claims(paths, output, chunk_size)
+    rows = int(offsets['End'].max()) if len(offsets) else 0
+    offsets['Segment'] = 0
+    _write_index(output, offsets, [{"claim_files": {path.name: file_signature(path) for path, _ in paths}}])
+    # Los segmentos agregados en ingestas anteriores ya están incluidos en el nuevo
+    for segment in range(1, len(previous["segments"]) if previous else 0):
+        segment_path(output, segment).unlink(missing_ok=True)
+    logger.info(f"Claims ordenados por proveedor guardados en: {output} ({rows} filas, "
+                f"{len(offsets)} providers)")
+    return rows
+
+
+def update_claim_index(files: Dict[str, List[Path]], output: Path, chunk_size: Optional[int] = None) -> int:
+    """
+    Actualiza los claims ordenados sin reescribir los ya indexados.
+
+    Si todos los archivos ya indexados siguen iguales, los archivos nuevos se ordenan
+    en un segmento aparte y solo se reescribe el índice de offsets; si no hay archivos
+    nuevos no se escribe nada. Si cambió o se quitó un archivo ya indexado, o se llegó
+    a MAX_SEGMENTS, se reconstruye en un único segmento (ver build_claim_index).
+
+    Args:
+        files: Rutas por tipo de archivo (ver unified_ingestor.find_input_files)
+        output: Ruta del archivo .arrow
+        chunk_size: Si se indica, lee y ordena por bloques de este tamaño
+
+    Returns:
+        Número de claims escritos
+    """
+    output = Path(output)
+    manifest = _load_manifest(output)
+    if manifest is None:
+        return build_claim_index(files, output, chunk_size)
+
+    paths = _claim_paths(files)
+    current = {path.name: file_signature(path) for path, _ in paths}
+    indexed = {name: signature for segment in manifest["segments"] for name, signature in segment["claim_files"].items()}
+    if any(current.get(name) != signature for name, signature in indexed.items()):
+        logger.info("Cambió un archivo de claims ya indexado, se reconstruye el índice de claims")
+        return build_claim_index(files, output, chunk_size)
+    new_paths = [(path, claim_type) for path, claim_type in paths if path.name not in indexed]
+    if not new_paths:
+        logger.info(f"Índice de claims sin cambios: {output}")
+        return 0
+    segment = len(manifest["segments"])
+    if segment >= MAX_SEGMENTS:
+        return build_claim_index(files, output, chunk_size)
+
+    offsets = _write_sorted_claims(new_paths, segment_path(output, segment), chunk_size)
+    rows = int(offsets['End'].max()) if len(offsets) else 0
+    offsets['Segment'] = segment
+    existing = pd.read_csv(index_path(output), dtype={'Provider': str})
+    if 'Segment' not in existing.columns:
+        existing['Segment'] = 0
+    offsets = pd.concat([existing[existing['Segment'] < segment], offsets], ignore_index=True)
+    _write_index(output, offsets, manifest["segments"] + [{"claim_files": {path.name: current[path.name]
+                                                                           for path, _ in new_paths}}])
+    logger.info(f"Claims de {len(new_paths)} archivos nuevos agregados como segmento {segment} de {output} "
+                f"({rows} filas)")
+    return rows
+
+
+class ClaimIndex:
+    """
+    Acceso paginado a los claims de un proveedor sobre los segmentos ordenados.
+
+    Los archivos Arrow se abren con memory mapping: leer una página solo toca las filas
+    [Start + offset, Start + offset + limit) del proveedor en cada segmento, así que la
+    latencia no depende del volumen total de claims. Si el proveedor tiene claims en
+    varios segmentos, las filas de cada uno se combinan por ClaimStartDt.
+    """
+
+    def __init__(self, claims_file: Path):
+        self.claims_file = Path(claims_file)
+        offsets = pd.read_csv(index_path(claims_file), dtype={'Provider': str})
+        if 'Segment' not in offsets.columns:
+            offsets['Segment'] = 0
+        self.offsets: Dict[str, List[Tuple[int, int, int]]] = {}
+        for provider, segment, start, end in zip(offsets['Provider'], offsets['Segment'],
+                                                 offsets['Start'], offsets['End']):
+            self.offsets.setdefault(provider, []).append((int(segment), int(start), int(end)))
+        self._sources = {}
+        self.tables: Dict[int, "pa.Table"] = {}
+        for segment in sorted(offsets['Segment'].unique()):
+            self._sources[segment] = pa.memory_map(str(segment_path(self.claims_file, segment)), 'r')
+            # Sin copia: las columnas apuntan al archivo mapeado
+            self.tables[segment] = pa.ipc.open_file(self._sources[segment]).read_all()
+
+    def page(self, provider: str, offset: int = 0, limit: int = 100) -> Optional[Dict[str, Any]]:
+        """
+        Página de claims de un proveedor.
+
+        Args:
+            provider: Identificador del proveedor
+            offset: Primer claim de la página (dentro de los del proveedor)
+            limit: Número máximo de claims
+
+        Returns:
+            Dict con total_claims y claims (None si el proveedor no tiene claims)
+        """
+        bounds = self.offsets.get(provider)
+        if bounds is None:
+            return None
+        for segment, start, end in bounds:
+            table = self.tables[segment]
+            if end > table.num_rows or (end > start and table['Provider'][start].as_py() != provider):
+                raise ValueError("El índice de claims no corresponde al archivo (ingesta en curso)")
+        if len(bounds) == 1:
+            segment, start, end = bounds[0]
+            first = min(start + offset, end)
+            rows = self.tables[segment].slice(first, max(0, min(limit, end - first)))
+        else:
+            # Cada segmento ya está ordenado por fecha: basta con sus primeras offset + limit filas
+            rows = pa.concat_tables([self.tables[segment].slice(start, min(end - start, offset + limit))
+                                     for segment, start, end in bounds])
+            rows = rows.take(pc.sort_indices(rows, sort_keys=[('ClaimStartDt', 'ascending')]))
+            rows = rows.slice(offset, max(0, limit))
+        claims = rows.to_pylist()
+        for claim in claims:
+            for col in DATE_COLUMNS:
+                if claim[col] is not None:
+                    claim[col] = claim[col].strftime('%Y-%m-%d')
+        return {"total_claims": int(sum(end - start for _, start, end in bounds)), "claims": claims}
+
+
+_open_indexes: Dict[Path, Tuple[Tuple[int, int], ClaimIndex]] = {}
+_open_lock = threading.Lock()
+
+
+def open_claim_index(claims_file: Path) -> Optional[ClaimIndex]:
+    """
+    Devuelve el ClaimIndex de un archivo (reabierto solo si una ingesta lo reescribió).
+
+    Args:
+        claims_file: Ruta del archivo .arrow
+
+    Returns:
+        ClaimIndex, o None si el archivo o su índice no existen
+    """
+    claims_file = Path(claims_file)
+    if not claims_file.exists() or not index_path(claims_file).exists():
+        return None
+    version = (claims_file.stat().st_mtime_ns, index_path(claims_file).stat().st_mtime_ns)
+    with _open_lock:
+        cached = _open_indexes.get(claims_file)
+        if cached is None or cached[0] != version:
+            cached = _open_indexes[claims_file] = (version, ClaimIndex(claims_file))
+        return cached[1]
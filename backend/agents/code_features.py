@@ -0,0 +1,277 @@
+import pandas as pd
+import numpy as np
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from scipy import sparse
+from .columnar_cache import read_table, iter_table_chunks
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Columnas de códigos por familia (cada familia usa su propia clave de hash)
+CODE_FAMILIES: Dict[str, List[str]] = {
+    'dx': [f'ClmDiagnosisCode_{i}' for i in range(1, 11)],
+    'px': [f'ClmProcedureCode_{i}' for i in range(1, 7)],
+    'drg': ['DiagnosisGroupCode'],
+}
+CODE_COLUMNS = [col for columns in CODE_FAMILIES.values() for col in columns]
+
+# Dimensión del espacio de hashing (columnas de la matriz dispersa)
+DEFAULT_N_FEATURES = 2 ** 18
+
+
+def _hash_key(family: str) -> str:
+    """Clave de hash (16 bytes) de una familia, para que el mismo código en otra familia caiga en otra columna"""
+    return family.ljust(16, '0')[:16]
+
+
+def code_strings(values: pd.Series) -> pd.Series:
+    """
+    Normaliza una columna de códigos a texto. Los códigos leídos como números
+    (p. ej. procedimientos 4019.0) se convierten a su forma entera, también si
+    están mezclados con texto (columnas de archivos con distinto tipo concatenadas).
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype('Int64').astype(str).where(values.notna())
+    is_number = values.map(lambda value: isinstance(value, (int, float, np.number))) & values.notna()
+    if is_number.any():
+        values = values.copy()
+        values[is_number] = code_strings(values[is_number].astype(float))
+    return values
+
+
+def text_categorical(values: pd.Series) -> pd.Categorical:
+    """
+    Categórico con el texto normalizado de cada valor (ver code_strings). Solo se
+    convierten a texto las categorías, no cada fila; las categorías que quedan con
+    el mismo texto (4019.0 y '4019') se unen.
+    """
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype('category')
+    categories = code_strings(pd.Series(values.cat.categories, dtype=object)).astype(str)
+    positions, unique = pd.factorize(categories)
+    codes = values.cat.codes.to_numpy()
+    if len(unique) < len(categories):
+        codes = np.where(codes >= 0, positions[codes], -1)
+    return pd.Categorical.from_codes(codes, categories=pd.Index(unique, dtype=object))
+
+
+def hash_codes(codes: np.ndarray, family: str, n_features: int = DEFAULT_N_FEATURES) -> np.ndarray:
+    """
+    Columna de hashing de cada código de una familia (hash estable entre ejecuciones).
+
+    Args:
+        codes: Códigos como texto
+        family: Familia del código ('dx', 'px' o 'drg')
+        n_features: Dimensión del espacio de hashing
+
+    Returns:
+        Array int64 con la columna de cada código
+    """
+    hashes = pd.util.hash_array(np.asarray(codes, dtype=object), hash_key=_hash_key(family))
+    return (hashes % np.uint64(n_features)).astype(np.int64)
+
+
+class ProviderCodeCounts:
+    """
+    Conteos de códigos de diagnóstico/procedimiento por proveedor con el hashing trick.
+
+    Cada código (con su familia: dx, px o drg) se proyecta a una de n_features
+    columnas mediante un hash estable; la matriz proveedor x columna se guarda en
+    CSR, por lo que la memoria depende del número de celdas no nulas y no del
+    vocabulario de códigos. Para poder mostrar los códigos más frecuentes se guarda
+    además qué códigos cayeron en cada columna usada.
+    """
+
+    def __init__(self, matrix: sparse.csr_matrix, providers: pd.Index,
+                 vocabulary: pd.DataFrame, n_features: int = DEFAULT_N_FEATURES):
+        self.matrix = matrix
+        self.providers = providers
+        # Columnas 'bucket' y 'code' (p. ej. 'dx:4019')
+        self.vocabulary = vocabulary
+        self.n_features = n_features
+
+    @classmethod
+    def empty(cls, n_features: int = DEFAULT_N_FEATURES) -> "ProviderCodeCounts":
+        return cls(sparse.csr_matrix((0, n_features), dtype=np.int64), pd.Index([], name='Provider', dtype=object),
+                   pd.DataFrame({'bucket': pd.Series(dtype=np.int64), 'code': pd.Series(dtype=object)}),
+                   n_features)
+
+    @classmethod
+    def from_claims(cls, claims: pd.DataFrame, n_features: int = DEFAULT_N_FEATURES) -> "ProviderCodeCounts":
+        """
+        Cuenta los códigos de un bloque de claims.
+
+        Las columnas de códigos se apilan (melt) como arrays: una fila por
+        (claim, código no nulo), con el proveedor del claim y la columna de hashing.
+
+        Args:
+            claims: Claims con Provider y alguna de CODE_COLUMNS
+            n_features: Dimensión del espacio de hashing
+
+        Returns:
+            Conteos del bloque (sin los claims sin proveedor)
+        """
+        claims = claims[claims['Provider'].notna()]
+        providers, provider_codes = pd.factorize(claims['Provider'].astype(str))
+        rows, buckets, vocabulary = [], [], []
+        for family, columns in CODE_FAMILIES.items():
+            for col in columns:
+                if col not in claims.columns:
+                    continue
+                present = claims[col].notna().to_numpy()
+                if not present.any():
+                    continue
+                # Cada código distinto se hashea una sola vez y se indexa por su código de categoría
+                values = text_categorical(claims[col][present]).remove_unused_categories()
+                categories = values.categories.astype(str)
+                category_buckets = hash_codes(categories, family, n_features)
+                rows.append(providers[present])
+                buckets.append(category_buckets[values.codes])
+                vocabulary.append(pd.DataFrame({'bucket': category_buckets, 'code': family + ':' + categories}))
+
+        if not rows:
+            return cls.empty(n_features)
+        rows = np.concatenate(rows)
+        buckets = np.concatenate(buckets)
+        # Las entradas repetidas (mismo proveedor y columna) se suman al construir la matriz
+        matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, buckets)),
+                                   shape=(len(provider_codes), n_features))
+        vocabulary = pd.concat(vocabulary, ignore_index=True).drop_duplicates(ignore_index=True)
+        return cls(matrix, pd.Index(provider_codes, name='Provider'), vocabulary, n_features)
+
+    def merge(self, other: "ProviderCodeCounts") -> "ProviderCodeCounts":
+        """
+        Suma dos conjuntos de conteos (los proveedores se alinean por nombre).
+
+        Args:
+            other: Conteos a sumar (con el mismo n_features)
+
+        Returns:
+            Nuevos conteos con ambos
+        """
+        return ProviderCodeCounts.merge_all([self, other])
+
+    @classmethod
+    def merge_all(cls, counts: List["ProviderCodeCounts"]) -> "ProviderCodeCounts":
+        """
+        Suma varios conjuntos de conteos en una sola construcción: las entradas de
+        todas las matrices se reindexan a la unión de proveedores y se apilan en un
+        único COO (las repetidas se suman al convertir a CSR), en lugar de sumar
+        matrices de a pares.
+
+        Args:
+            counts: Conteos a sumar (todos con el mismo n_features)
+
+        Returns:
+            Conteos combinados (los proveedores, en orden de aparición)
+        """
+        n_features = counts[0].n_features
+        if any(c.n_features != n_features for c in counts):
+            raise ValueError("No se pueden combinar conteos con distinto n_features")
+        if len(counts) == 1:
+            return counts[0]
+        providers = pd.Index(pd.unique(np.concatenate([c.providers.to_numpy(dtype=object) for c in counts])),
+                             name='Provider')
+        rows, cols, data = [], [], []
+        for c in counts:
+            coo = c.matrix.tocoo()
+            rows.append(providers.get_indexer(c.providers)[coo.row])
+            cols.append(coo.col)
+            data.append(coo.data)
+        matrix = sparse.csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                                   shape=(len(providers), n_features))
+        vocabulary = pd.concat([c.vocabulary for c in counts], ignore_index=True).drop_duplicates(ignore_index=True)
+        return cls(matrix, providers, vocabulary, n_features)
+
+    def subset(self, providers) -> "ProviderCodeCounts":
+        """
+        Conteos de los proveedores indicados, con el vocabulario de sus columnas usadas.
+
+        Args:
+            providers: Proveedores (todos presentes en los conteos)
+
+        Returns:
+            Nuevos conteos con una fila por proveedor indicado
+        """
+        providers = pd.Index(providers, name='Provider')
+        matrix = self.matrix[self.providers.get_indexer(providers)]
+        vocabulary = self.vocabulary[self.vocabulary['bucket'].isin(np.unique(matrix.indices))]
+        return ProviderCodeCounts(matrix, providers, vocabulary.reset_index(drop=True), self.n_features)
+
+    def top_codes(self, provider: str, n: int = 10) -> List[Dict[str, Any]]:
+        """
+        Códigos más frecuentes de un proveedor.
+
+        Args:
+            provider: Identificador del proveedor
+            n: Número de códigos
+
+        Returns:
+            Lista de {'code', 'count'} ordenada por frecuencia; si varios códigos
+            colisionan en la misma columna de hashing se muestran separados por '|'
+        """
+        position = self.providers.get_indexer([provider])[0]
+        if position < 0:
+            return []
+        row = self.matrix.getrow(position)
+        order = np.argsort(-row.data, kind='stable')[:n]
+        top_buckets = row.indices[order]
+        vocabulary = self.vocabulary[self.vocabulary['bucket'].isin(top_buckets)]
+        labels = vocabulary.groupby('bucket')['code'].agg(lambda codes: '|'.join(sorted(codes)))
+        return [
+            {'code': labels.get(int(bucket), str(int(bucket))), 'count': int(count)}
+            for bucket, count in zip(top_buckets, row.data[order])
+        ]
+
+    def save(self, path: Path) -> None:
+        """Guarda los conteos en un archivo .npz (CSR + proveedores + vocabulario, escritura atómica)"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp.npz")
+        matrix = self.matrix.tocsr()
+        np.savez(tmp_path, n_features=self.n_features, shape=np.asarray(matrix.shape),
+                 data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+                 providers=np.asarray(self.providers.astype(str), dtype=str),
+                 vocabulary_buckets=self.vocabulary['bucket'].to_numpy(dtype=np.int64),
+                 vocabulary_codes=np.asarray(self.vocabulary['code'].astype(str), dtype=str))
+        tmp_path.replace(path)
+        logger.info(f"Conteos de códigos guardados: {len(self.providers)} providers, {matrix.nnz} no nulos en {path}")
+
+    @classmethod
+    def load(cls, path: Path) -> "ProviderCodeCounts":
+        """Lee conteos guardados con save()"""
+        with np.load(path) as data:
+            matrix = sparse.csr_matrix((data['data'], data['indices'], data['indptr']), shape=tuple(data['shape']))
+            vocabulary = pd.DataFrame({'bucket': data['vocabulary_buckets'],
+                                       'code': data['vocabulary_codes'].astype(object)})
+            return cls(matrix, pd.Index(data['providers'].astype(object), name='Provider'),
+                       vocabulary, int(data['n_features']))
+
+
+def build_code_counts(files: Dict[str, List[Path]], chunk_size: Optional[int] = None,
+                      n_features: int = DEFAULT_N_FEATURES) -> ProviderCodeCounts:
+    """
+    Lee solo Provider y las columnas de códigos de los archivos de claims y
+    acumula sus conteos por proveedor.
+
+    Args:
+        files: Rutas por tipo de archivo (ver unified_ingestor.find_input_files)
+        chunk_size: Si se indica, lee por bloques de este tamaño
+        n_features: Dimensión del espacio de hashing
+
+    Returns:
+        Conteos de todos los claims
+    """
+    columns = ['Provider'] + CODE_COLUMNS
+    counts = [ProviderCodeCounts.empty(n_features)]
+    for claim_type in ['inpatient', 'outpatient']:
+        for file in files.get(claim_type, []):
+            chunks = iter_table_chunks(file, chunk_size, columns) if chunk_size else [read_table(file, columns)]
+            for chunk in chunks:
+                counts.append(ProviderCodeCounts.from_claims(chunk, n_features))
+    return ProviderCodeCounts.merge_all(counts)
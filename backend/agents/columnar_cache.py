@@ -0,0 +1,322 @@
+import pandas as pd
+import numpy as np
+import os
+import logging
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+from .schema_registry import ID_PREFIXES, SCHEMA_VERSION, decode_prefixed_id, read_csv_typed
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - el caché es opcional
+    pa = None
+    pq = None
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Subdirectorio (junto a cada CSV) donde se guardan las copias columnares
+CACHE_DIR_NAME = ".columnar"
+
+# Metadatos que identifican la versión del CSV de origen
+SOURCE_SIZE_KEY = b"source_size"
+SOURCE_MTIME_KEY = b"source_mtime_ns"
+SCHEMA_VERSION_KEY = b"schema_version"
+
+# Filas por bloque al convertir un CSV al caché (acota la memoria de la conversión)
+CONVERT_CHUNK_ROWS = 100_000
+
+def is_available() -> bool:
+    """Indica si pyarrow está instalado y el caché columnar puede usarse"""
+    return pq is not None
+
+
+def cache_path_for(csv_path) -> Path:
+    """
+    Devuelve la ruta del archivo Parquet asociado a un CSV.
+
+    Args:
+        csv_path: Ruta al CSV de origen
+
+    Returns:
+        Ruta del archivo columnar (puede no existir)
+    """
+    csv_path = Path(csv_path)
+    return csv_path.parent / CACHE_DIR_NAME / f"{csv_path.stem}.parquet"
+
+
+def _source_signature(csv_path) -> Dict[bytes, bytes]:
+    """
+    Tamaño y fecha de modificación del CSV y versión del registro de tipos,
+    guardados como metadatos del Parquet
+    """
+    stat = os.stat(csv_path)
+    return {
+        SOURCE_SIZE_KEY: str(stat.st_size).encode(),
+        SOURCE_MTIME_KEY: str(stat.st_mtime_ns).encode(),
+        SCHEMA_VERSION_KEY: str(SCHEMA_VERSION).encode(),
+    }
+
+
+def is_cache_fresh(csv_path) -> bool:
+    """
+    Comprueba si el Parquet corresponde a la versión actual del CSV.
+
+    Args:
+        csv_path: Ruta al CSV de origen
+
+    Returns:
+        True si el caché existe y fue generado desde el CSV actual con el registro de tipos actual
+    """
+    if not is_available():
+        return False
+    cache_path = cache_path_for(csv_path)
+    if not cache_path.exists() or not os.path.exists(csv_path):
+        return False
+    try:
+        metadata = pq.read_schema(cache_path).metadata or {}
+    except Exception as e:
+        logger.warning(f"Caché columnar ilegible {cache_path}: {e}")
+        return False
+    signature = _source_signature(csv_path)
+    return all(metadata.get(key) == value for key, value in signature.items())
+
+
+def _normalize_text_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convierte a texto las columnas object con valores mixtos (p. ej. códigos de
+    diagnóstico "V420" y 5789), que Parquet no puede guardar en una sola columna.
+
+    Args:
+        df: DataFrame leído desde CSV
+
+    Returns:
+        DataFrame con las columnas de texto homogéneas
+    """
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def _text_values(values: pd.Series, col: str) -> pd.Series:
+    """Valores de una columna como texto (los IDs con prefijo codificados se decodifican)"""
+    if col in ID_PREFIXES and pd.api.types.is_integer_dtype(values):
+        return decode_prefixed_id(values, ID_PREFIXES[col])
+    values = values.astype(object)
+    return values.where(values.isna(), values.astype(str))
+
+
+def _arrow_chunk(df: pd.DataFrame, overrides: Dict[str, "pa.DataType"]) -> "pa.Table":
+    """
+    Convierte un bloque a Arrow con tipos estables entre bloques: los categóricos como
+    diccionarios de índices int32 (pandas elige int8/int16 según el número de categorías)
+    y las columnas de overrides con el tipo indicado.
+    """
+    df = _normalize_text_columns(df)
+    for col, arrow_type in overrides.items():
+        if col in df.columns and pa.types.is_dictionary(arrow_type):
+            df[col] = _text_values(df[col], col).astype('category')
+        elif col in df.columns and pa.types.is_string(arrow_type):
+            df[col] = _text_values(df[col], col)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(table.schema):
+        if field.name in overrides:
+            arrow_type = overrides[field.name]
+        elif pa.types.is_dictionary(field.type):
+            value_type = pa.string() if pa.types.is_null(field.type.value_type) else field.type.value_type
+            arrow_type = pa.dictionary(pa.int32(), value_type)
+        else:
+            continue
+        if field.type != arrow_type:
+            table = table.set_column(i, pa.field(field.name, arrow_type), table.column(i).cast(arrow_type))
+    return table
+
+
+def _promoted_type(current: "pa.DataType", new: "pa.DataType") -> "pa.DataType":
+    """
+    Tipo común de una columna que cambió de tipo entre bloques: float64 si ambos son
+    numéricos, categórico de texto si alguno era categórico (p. ej. un ID con prefijo
+    codificado como entero en unos bloques y categórico en otros) y texto en otro caso
+    """
+    numeric = (pa.types.is_integer, pa.types.is_floating, pa.types.is_null)
+    if all(any(check(t) for check in numeric) for t in (current, new)):
+        return pa.float64()
+    if pa.types.is_dictionary(current) or pa.types.is_dictionary(new):
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.string()
+
+
+def _write_cache_chunks(csv_path, cache_path: Path, overrides: Dict[str, "pa.DataType"]) -> Optional[Dict[str, "pa.DataType"]]:
+    """
+    Escribe el caché bloque a bloque con el esquema del primer bloque.
+
+    Returns:
+        None si se escribió, o los tipos comunes de las columnas que cambiaron de tipo
+        entre bloques (la conversión se repite con esos tipos)
+    """
+    tmp_path = cache_path.with_suffix(".parquet.tmp")
+    writer = None
+    rows = 0
+    try:
+        for chunk in read_csv_typed(csv_path, all_columns=True, chunksize=CONVERT_CHUNK_ROWS):
+            table = _arrow_chunk(chunk, overrides)
+            if writer is None:
+                metadata = dict(table.schema.metadata or {})
+                metadata.update(_source_signature(csv_path))
+                writer = pq.ParquetWriter(tmp_path, table.schema.with_metadata(metadata))
+            drift = {}
+            for field in writer.schema:
+                new_type = table.schema.field(field.name).type
+                if new_type == field.type:
+                    continue
+                try:
+                    table = table.set_column(table.schema.get_field_index(field.name), field,
+                                             table.column(field.name).cast(field.type))
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                    drift[field.name] = _promoted_type(field.type, new_type)
+            if drift:
+                return drift
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        # CSV sin filas: el caché solo guarda las columnas
+        write_cache(pd.read_csv(csv_path, nrows=0), csv_path)
+        return None
+    os.replace(tmp_path, cache_path)
+    logger.info(f"Caché columnar generado: {cache_path} ({rows} filas)")
+    return None
+
+
+def convert_csv_to_cache(csv_path) -> Optional[Path]:
+    """
+    Convierte un CSV a su copia columnar tipada (Parquet), con los tipos compactos
+    de schema_registry para las columnas conocidas.
+
+    El CSV se lee por bloques de CONVERT_CHUNK_ROWS filas que se escriben como grupos
+    de filas del Parquet, por lo que la memoria no depende del tamaño del archivo. Si
+    una columna sin tipo en el registro cambia de tipo entre bloques (p. ej. códigos
+    numéricos en los primeros bloques y con letras después), la conversión se repite
+    con el tipo común de esa columna.
+
+    Args:
+        csv_path: Ruta al CSV de origen
+
+    Returns:
+        Ruta del Parquet generado, o None si pyarrow no está disponible
+    """
+    if not is_available():
+        logger.warning("pyarrow no está instalado, no se genera caché columnar")
+        return None
+
+    cache_path = cache_path_for(csv_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    overrides: Dict[str, "pa.DataType"] = {}
+    try:
+        while True:
+            drift = _write_cache_chunks(csv_path, cache_path, overrides)
+            if not drift:
+                return cache_path
+            logger.info(f"Columnas con tipos distintos entre bloques en {csv_path}: "
+                        f"{ {col: str(arrow_type) for col, arrow_type in drift.items()} }, se repite la conversión")
+            overrides.update(drift)
+    finally:
+        tmp_path = cache_path.with_suffix(".parquet.tmp")
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def write_cache(df: pd.DataFrame, csv_path) -> Optional[Path]:
+    """
+    Guarda un DataFrame como caché columnar de un CSV ya escrito en disco.
+
+    Args:
+        df: Contenido del CSV
+        csv_path: Ruta al CSV de origen (debe existir)
+
+    Returns:
+        Ruta del Parquet generado, o None si pyarrow no está disponible
+    """
+    if not is_available():
+        return None
+
+    cache_path = cache_path_for(csv_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata.update(_source_signature(csv_path))
+    table = table.replace_schema_metadata(metadata)
+
+    # Escritura atómica para que un lector nunca vea un archivo a medias
+    tmp_path = cache_path.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, cache_path)
+    logger.info(f"Caché columnar generado: {cache_path} ({len(df)} filas)")
+    return cache_path
+
+
+def write_table(df: pd.DataFrame, csv_path) -> None:
+    """
+    Escribe un DataFrame como CSV y actualiza su caché columnar.
+
+    Args:
+        df: DataFrame a guardar
+        csv_path: Ruta del CSV de salida
+    """
+    Path(csv_path).parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(csv_path, index=False)
+    write_cache(df, csv_path)
+
+
+def _cached_columns(csv_path, columns: Optional[List[str]]) -> Optional[List[str]]:
+    """Proyección de columnas limitada a las que existen en el caché"""
+    if columns is None:
+        return None
+    names = set(pq.read_schema(cache_path_for(csv_path)).names)
+    return [col for col in columns if col in names]
+
+
+def read_table(csv_path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Lee un CSV desde su caché columnar si está al día, o desde el CSV si no
+    (con las columnas y tipos compactos de schema_registry).
+
+    Args:
+        csv_path: Ruta al CSV
+        columns: Columnas a leer (las que no existan se ignoran); None para todas
+
+    Returns:
+        DataFrame con las columnas solicitadas
+    """
+    if is_cache_fresh(csv_path):
+        return pd.read_parquet(cache_path_for(csv_path), columns=_cached_columns(csv_path, columns))
+
+    return read_csv_typed(csv_path, columns)
+
+
+def iter_table_chunks(csv_path, chunk_size: int,
+                      columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Lee un CSV por bloques desde su caché columnar si está al día, o desde el CSV si no.
+
+    Args:
+        csv_path: Ruta al CSV
+        chunk_size: Número de filas por bloque
+        columns: Columnas a leer (las que no existan se ignoran); None para todas
+
+    Yields:
+        Bloques de filas
+    """
+    if is_cache_fresh(csv_path):
+        parquet_file = pq.ParquetFile(cache_path_for(csv_path))
+        for batch in parquet_file.iter_batches(batch_size=chunk_size,
+                                               columns=_cached_columns(csv_path, columns)):
+            yield batch.to_pandas()
+        return
+
+    yield from read_csv_typed(csv_path, columns, chunksize=chunk_size)
@@ -0,0 +1,102 @@
+import zlib
+import logging
+from pathlib import Path
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstd es opcional
+    zstandard = None
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Extensiones de CSV comprimido y compresión de pandas que les corresponde
+COMPRESSIONS = {'.gz': 'gzip', '.zst': 'zstd'}
+
+# Extensiones de archivo de entrada aceptadas (CSV plano o comprimido)
+CSV_SUFFIXES = ('.csv', '.csv.gz', '.csv.zst')
+
+
+def compression_for(path) -> Optional[str]:
+    """
+    Compresión de un archivo de entrada según su extensión.
+
+    Args:
+        path: Ruta o nombre del archivo
+
+    Returns:
+        'gzip', 'zstd', o None si es un CSV plano
+    """
+    return COMPRESSIONS.get(Path(str(path).lower()).suffix)
+
+
+def is_csv_file(name: str) -> bool:
+    """Indica si el nombre corresponde a un CSV plano o comprimido"""
+    return str(name).lower().endswith(CSV_SUFFIXES)
+
+
+def is_supported(name: str) -> bool:
+    """Indica si un archivo se puede leer (los .zst requieren el paquete zstandard)"""
+    return is_csv_file(name) and (compression_for(name) != 'zstd' or zstandard is not None)
+
+
+def input_glob(input_dir: Path, pattern: str):
+    """
+    Archivos de un directorio que coinciden con un patrón, en cualquier extensión aceptada.
+
+    Args:
+        input_dir: Directorio de entrada
+        pattern: Patrón sin extensión (p. ej. '*Inpatient*')
+
+    Returns:
+        Rutas ordenadas
+    """
+    return sorted(path for suffix in CSV_SUFFIXES for path in Path(input_dir).glob(pattern + suffix))
+
+
+class StreamDecompressor:
+    """
+    Descomprime por bloques un archivo gzip o zstd que llega en partes,
+    sin escribir el contenido descomprimido a disco.
+    """
+
+    def __init__(self, compression: Optional[str]):
+        self.compression = compression
+        self._decompressor = self._new_decompressor()
+
+    def _new_decompressor(self):
+        if self.compression == 'gzip':
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self.compression == 'zstd':
+            if zstandard is None:
+                raise RuntimeError("zstandard no está instalado, no se pueden leer archivos .zst")
+            return zstandard.ZstdDecompressor().decompressobj()
+        return None
+
+    def feed(self, data: bytes) -> bytes:
+        """
+        Descomprime los bytes recibidos.
+
+        Args:
+            data: Bytes comprimidos
+
+        Returns:
+            Bytes descomprimidos disponibles (puede ser vacío)
+        """
+        if self._decompressor is None:
+            return data
+        output = self._decompressor.decompress(data)
+        # gzip admite varios miembros concatenados (p. ej. archivos partidos y unidos)
+        while self.compression == 'gzip' and self._decompressor.eof and self._decompressor.unused_data:
+            remaining = self._decompressor.unused_data
+            self._decompressor = self._new_decompressor()
+            output += self._decompressor.decompress(remaining)
+        return output
+
+    def flush(self) -> bytes:
+        """Devuelve los bytes pendientes al terminar la entrada"""
+        if self.compression == 'gzip':
+            return self._decompressor.flush()
+        return b''
@@ -0,0 +1,331 @@
+import pandas as pd
+import numpy as np
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from .schema_registry import DATETIME, DATE_FORMAT, PREFIXED_ID, ID_PREFIXES, column_types, decode_prefixed_id, schema_for
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Columnas sin las que no se puede agregar un tipo de archivo
+REQUIRED_COLUMNS: Dict[str, List[str]] = {
+    'beneficiary': ['BeneID'],
+    'inpatient': ['Provider', 'ClaimID', 'BeneID', 'InscClaimAmtReimbursed'],
+    'outpatient': ['Provider', 'ClaimID', 'BeneID', 'InscClaimAmtReimbursed'],
+}
+
+# Columnas de importes (deben ser numéricas; los negativos se informan como aviso)
+AMOUNT_COLUMNS = ['InscClaimAmtReimbursed']
+
+# Proporción máxima de nulos en una columna requerida antes de rechazar el archivo
+MAX_NULL_RATE = 0.05
+
+# Proporción máxima de fechas no interpretables antes de rechazar el archivo
+MAX_INVALID_DATE_RATE = 0.05
+
+
+class DataQualityError(ValueError):
+    """Los archivos de entrada no superan la validación (report contiene el informe de calidad)"""
+
+    def __init__(self, message: str, report: Dict[str, Any]):
+        super().__init__(message)
+        self.report = report
+
+
+class FileQuality:
+    """
+    Estadísticas de calidad de un archivo de entrada, acumuladas bloque a bloque
+    con operaciones vectorizadas sobre las columnas ya leídas.
+    """
+
+    def __init__(self, name: str, kind: str):
+        self.name = name
+        self.kind = kind
+        self.rows = 0
+        self.nulls: Dict[str, int] = {}
+        # Valores presentes que no se pudieron interpretar (importes no numéricos, fechas inválidas)
+        self.invalid: Dict[str, int] = {}
+        self.negative: Dict[str, int] = {}
+        self.minimum: Dict[str, Any] = {}
+        self.maximum: Dict[str, Any] = {}
+        self.missing_columns: List[str] = []
+
+    def observe(self, chunk: pd.DataFrame, types: Dict[str, str],
+                columns: Optional[List[str]] = None) -> None:
+        """
+        Acumula las estadísticas de un bloque. Las fechas que read_csv dejó como texto
+        se reemplazan en el bloque por su versión interpretada (NaT si no son válidas),
+        para no volver a convertirlas al agregar.
+
+        Args:
+            chunk: Bloque leído del archivo
+            types: Tipos del registro para las columnas del archivo
+            columns: Columnas a validar (por defecto todas las del bloque)
+        """
+        self.rows += len(chunk)
+        for col in chunk.columns:
+            if columns is not None and col not in columns:
+                continue
+            values = chunk[col]
+            self.nulls[col] = self.nulls.get(col, 0) + int(values.isna().sum())
+            if types.get(col) == DATETIME:
+                values = self._observe_dates(col, values)
+                chunk[col] = values
+            elif col in AMOUNT_COLUMNS:
+                values = self._observe_amounts(col, values)
+            elif types.get(col) == PREFIXED_ID or not pd.api.types.is_numeric_dtype(values):
+                continue
+            self._observe_range(col, values)
+
+    def _observe_dates(self, col: str, values: pd.Series) -> pd.Series:
+        # Si read_csv no pudo interpretar alguna fecha, la columna queda como texto
+        if not pd.api.types.is_datetime64_any_dtype(values):
+            parsed = pd.to_datetime(values, format=DATE_FORMAT, errors='coerce')
+            self.invalid[col] = self.invalid.get(col, 0) + int((values.notna() & parsed.isna()).sum())
+            values = parsed
+        return values
+
+    def _observe_amounts(self, col: str, values: pd.Series) -> pd.Series:
+        if not pd.api.types.is_numeric_dtype(values):
+            parsed = pd.to_numeric(values, errors='coerce')
+            self.invalid[col] = self.invalid.get(col, 0) + int((values.notna() & parsed.isna()).sum())
+            values = parsed
+        self.negative[col] = self.negative.get(col, 0) + int((values < 0).sum())
+        return values
+
+    def _observe_range(self, col: str, values: pd.Series) -> None:
+        low, high = values.min(), values.max()
+        if pd.isna(low):
+            return
+        self.minimum[col] = low if col not in self.minimum else min(self.minimum[col], low)
+        self.maximum[col] = high if col not in self.maximum else max(self.maximum[col], high)
+
+    def merge(self, other: "FileQuality") -> None:
+        """Suma las estadísticas de otros bloques del mismo archivo (leídos en otro proceso)"""
+        self.rows += other.rows
+        for mine, theirs in ((self.nulls, other.nulls), (self.invalid, other.invalid),
+                             (self.negative, other.negative)):
+            for col, count in theirs.items():
+                mine[col] = mine.get(col, 0) + count
+        for col, low in other.minimum.items():
+            self.minimum[col] = low if col not in self.minimum else min(self.minimum[col], low)
+        for col, high in other.maximum.items():
+            self.maximum[col] = high if col not in self.maximum else max(self.maximum[col], high)
+        self.missing_columns = sorted(set(self.missing_columns) | set(other.missing_columns))
+
+    def null_rate(self, col: str) -> float:
+        return self.nulls.get(col, 0) / self.rows if self.rows else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Estadísticas del archivo para la API"""
+        def plain(value):
+            return str(value.date()) if isinstance(value, pd.Timestamp) else value.item() if hasattr(value, 'item') else value
+
+        return {
+            "kind": self.kind,
+            "rows": self.rows,
+            "missing_columns": self.missing_columns,
+            "null_rates": {col: round(self.null_rate(col), 6) for col in self.nulls},
+            "invalid_values": dict(self.invalid),
+            "negative_values": dict(self.negative),
+            "ranges": {col: {"min": plain(self.minimum[col]), "max": plain(self.maximum[col])}
+                       for col in self.minimum},
+        }
+
+
+class DataQualityReport:
+    """
+    Informe de calidad de los archivos leídos en una ingesta.
+
+    Se alimenta durante la misma pasada de lectura (ver observe_chunk): los errores
+    estructurales (columnas requeridas ausentes, importes no numéricos) se detectan en
+    el primer bloque que los contiene y los de proporción (nulos, fechas inválidas)
+    al terminar cada archivo, siempre antes de unir beneficiarios o agregar.
+    """
+
+    def __init__(self):
+        self.files: Dict[str, FileQuality] = {}
+        self.errors: List[str] = []
+        self.warnings: List[str] = []
+        # ClaimID leídos, para contar duplicados al final: los codificados como entero
+        # (ver schema_registry.encode_prefixed_id) y el hash de los que quedaron como texto
+        self._claim_ids: List[np.ndarray] = []
+        self._claim_hashes: List[np.ndarray] = []
+        self.duplicate_claim_ids = 0
+
+    def observe(self, path: Path, chunk: pd.DataFrame, columns: Optional[List[str]] = None) -> None:
+        """
+        Valida un bloque recién leído y acumula sus estadísticas.
+
+        Args:
+            path: Archivo al que pertenece el bloque
+            chunk: Bloque leído
+            columns: Columnas a validar (por defecto todas las del bloque). Permite leer
+                columnas adicionales en la misma pasada sin cambiar el informe
+
+        Raises:
+            DataQualityError: Si el bloque tiene errores que impiden agregar
+        """
+        schema = schema_for(path)
+        if schema is None:
+            return
+        name = Path(path).name
+        quality = self.files.get(name)
+        if quality is None:
+            quality = self.files[name] = FileQuality(name, schema.kind)
+            quality.missing_columns = [col for col in REQUIRED_COLUMNS.get(schema.kind, [])
+                                       if col not in chunk.columns]
+            if quality.missing_columns:
+                self._fail(f"{name}: faltan columnas requeridas {', '.join(quality.missing_columns)}")
+
+        quality.observe(chunk, column_types(path, all_columns=True), columns)
+        for col in AMOUNT_COLUMNS:
+            if quality.invalid.get(col):
+                self._fail(f"{name}: {quality.invalid[col]} valores no numéricos en {col}")
+        if 'ClaimID' in chunk.columns and schema.kind != 'beneficiary':
+            claim_ids = chunk['ClaimID']
+            if pd.api.types.is_integer_dtype(claim_ids):
+                self._claim_ids.append(claim_ids.dropna().to_numpy(dtype=np.int64))
+            else:
+                self._claim_hashes.append(claim_id_hashes(claim_ids))
+
+    def merge(self, other: "DataQualityReport") -> None:
+        """
+        Incorpora el informe de bloques leídos en otro proceso (ver parallel_ingestor).
+
+        Raises:
+            DataQualityError: Si el otro informe tiene errores
+        """
+        for name, quality in other.files.items():
+            if name in self.files:
+                self.files[name].merge(quality)
+            else:
+                self.files[name] = quality
+        self._claim_ids.extend(other._claim_ids)
+        self._claim_hashes.extend(other._claim_hashes)
+        self.warnings.extend(other.warnings)
+        if other.errors:
+            self._fail(other.errors[0])
+
+    def close_file(self, path: Path) -> None:
+        """
+        Comprueba las proporciones de un archivo ya leído por completo.
+
+        Raises:
+            DataQualityError: Si alguna proporción supera los umbrales
+        """
+        quality = self.files.get(Path(path).name)
+        if quality is None:
+            return
+        for col in REQUIRED_COLUMNS.get(quality.kind, []):
+            if quality.null_rate(col) > MAX_NULL_RATE:
+                self._fail(f"{quality.name}: {quality.null_rate(col):.1%} de nulos en {col} "
+                           f"(máximo {MAX_NULL_RATE:.0%})")
+        for col, invalid in quality.invalid.items():
+            if col in AMOUNT_COLUMNS or not invalid:
+                continue
+            rate = invalid / quality.rows
+            if rate > MAX_INVALID_DATE_RATE:
+                self._fail(f"{quality.name}: {rate:.1%} de fechas no interpretables en {col} "
+                           f"(máximo {MAX_INVALID_DATE_RATE:.0%})")
+            self.warnings.append(f"{quality.name}: {invalid} fechas no interpretables en {col} (se ignoran)")
+        for col, negative in quality.negative.items():
+            if negative:
+                self.warnings.append(f"{quality.name}: {negative} importes negativos en {col}")
+        for col in AMOUNT_COLUMNS:
+            if quality.nulls.get(col):
+                self.warnings.append(f"{quality.name}: {quality.nulls[col]} importes nulos en {col} (cuentan como 0)")
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Cierra el informe: cuenta los ClaimID duplicados entre todos los archivos leídos.
+
+        Returns:
+            Informe de calidad (ver to_dict)
+        """
+        if self._claim_ids and self._claim_hashes:
+            # Hay archivos con ambas representaciones: se comparan por el hash del texto
+            ids = pd.Series(np.concatenate(self._claim_ids))
+            self._claim_hashes.append(claim_id_hashes(decode_prefixed_id(ids, ID_PREFIXES['ClaimID'])))
+            self._claim_ids = []
+        for keys in (self._claim_ids, self._claim_hashes):
+            if keys:
+                keys = np.concatenate(keys)
+                self.duplicate_claim_ids += int(len(keys) - len(pd.unique(keys)))
+        self._claim_ids, self._claim_hashes = [], []
+        if self.duplicate_claim_ids:
+            self.warnings.append(f"{self.duplicate_claim_ids} ClaimID duplicados")
+        return self.to_dict()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Informe de calidad para la respuesta de la ingesta"""
+        return {
+            "valid": not self.errors,
+            "errors": list(self.errors),
+            "warnings": list(self.warnings),
+            "duplicate_claim_ids": self.duplicate_claim_ids,
+            "files": {name: quality.to_dict() for name, quality in self.files.items()},
+        }
+
+    def _fail(self, message: str) -> None:
+        self.errors.append(message)
+        logger.error(f"Validación de datos: {message}")
+        raise DataQualityError(f"Validación de datos fallida: {message}", self.to_dict())
+
+
+def claim_id_hashes(values: pd.Series) -> np.ndarray:
+    """
+    Hash del texto de cada ClaimID no nulo de un bloque leído como categórico o texto.
+
+    Args:
+        values: Columna ClaimID de un bloque
+
+    Returns:
+        Array uint64 de hashes
+    """
+    values = values.dropna()
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype('category')
+    # Solo se hashean las categorías usadas por el bloque (los bloques del caché columnar
+    # comparten las categorías de todo el archivo)
+    used, positions = np.unique(values.cat.codes.to_numpy(), return_inverse=True)
+    categories = values.cat.categories[used].astype(str)
+    return pd.util.hash_array(np.asarray(categories, dtype=object))[positions]
+
+
+_current_report: ContextVar[Optional[DataQualityReport]] = ContextVar("data_quality", default=None)
+
+
+@contextmanager
+def collecting(report: DataQualityReport):
+    """Asocia un DataQualityReport a la ingesta que se ejecute dentro del bloque"""
+    token = _current_report.set(report)
+    try:
+        yield report
+    finally:
+        _current_report.reset(token)
+
+
+def observe_chunk(path: Path, chunk: pd.DataFrame, columns: Optional[List[str]] = None) -> None:
+    """Valida un bloque leído con el DataQualityReport activo (no hace nada si no hay ninguno)"""
+    report = _current_report.get()
+    if report is not None:
+        report.observe(path, chunk, columns)
+
+
+def close_file(path: Path) -> None:
+    """Comprueba un archivo terminado de leer con el DataQualityReport activo"""
+    report = _current_report.get()
+    if report is not None:
+        report.close_file(path)
+
+
+def merge_report(other: DataQualityReport) -> None:
+    """Incorpora al DataQualityReport activo el informe de otro proceso (no hace nada si no hay ninguno)"""
+    report = _current_report.get()
+    if report is not None:
+        report.merge(other)
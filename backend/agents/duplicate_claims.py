@@ -0,0 +1,216 @@
+import pandas as pd
+import numpy as np
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from .columnar_cache import read_table, iter_table_chunks
+from .schema_registry import ID_PREFIXES, concat_frames, decode_prefixed_id
+from .code_features import CODE_FAMILIES, text_categorical
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Columnas que definen la firma de un claim: mismo beneficiario, fechas y diagnósticos
+SIGNATURE_COLUMNS = ['BeneID', 'ClaimStartDt', 'ClaimEndDt'] + CODE_FAMILIES['dx']
+
+# Columnas de salida de test_duplicates.csv (features por proveedor)
+DUPLICATE_COLUMNS = [
+    'Provider', 'Signed_Claims', 'Duplicate_Claims', 'Duplicate_Rate',
+    'Cross_Provider_Claims', 'Cross_Provider_Rate'
+]
+
+# Columnas de salida de test_duplicate_claims.csv (detalle de los claims repetidos)
+DRILLDOWN_COLUMNS = ['Signature', 'Provider', 'ClaimID', 'Group_Claims', 'Group_Providers']
+
+# Conteos por proveedor de los que salen las tasas de DUPLICATE_COLUMNS (ver duplicate_counts)
+COUNT_COLUMNS = ['Provider', 'Signed_Claims', 'Duplicate_Claims', 'Cross_Provider_Claims']
+
+
+def drilldown_path(output: Path) -> Path:
+    """Ruta del detalle de claims repetidos junto a test_duplicates.csv"""
+    return Path(output).with_name("test_duplicate_claims.csv")
+
+
+def claim_signatures(claims: pd.DataFrame) -> pd.DataFrame:
+    """
+    Firma (hash de 64 bits) de cada claim de un bloque.
+
+    Las columnas de la firma se normalizan antes de hashear para que el mismo claim
+    dé la misma firma en cualquier archivo: fechas como datetime y el resto como
+    categóricos cuyas categorías son el texto del valor (ver code_features.text_categorical),
+    de modo que solo se convierten a texto los valores distintos y no cada fila.
+    Las columnas ausentes cuentan como nulas. Los claims sin proveedor, sin BeneID o
+    sin fecha de inicio no tienen firma.
+
+    Args:
+        claims: Claims con Provider, ClaimID y alguna de SIGNATURE_COLUMNS
+
+    Returns:
+        DataFrame con Provider, ClaimID y Signature (uint64)
+    """
+    if 'BeneID' not in claims.columns or 'ClaimStartDt' not in claims.columns:
+        return pd.DataFrame(columns=['Provider', 'ClaimID', 'Signature'])
+
+    normalized = {}
+    for col in SIGNATURE_COLUMNS:
+        if col not in claims.columns:
+            normalized[col] = pd.Categorical.from_codes(np.full(len(claims), -1), categories=pd.Index([], dtype=object))
+        elif col in ('ClaimStartDt', 'ClaimEndDt'):
+            normalized[col] = pd.to_datetime(claims[col], errors='coerce').to_numpy()
+        else:
+            normalized[col] = text_categorical(claims[col])
+    normalized = pd.DataFrame(normalized)
+
+    signed = (claims['Provider'].notna().to_numpy() & normalized['BeneID'].notna().to_numpy()
+              & normalized['ClaimStartDt'].notna().to_numpy())
+    signatures = pd.util.hash_pandas_object(normalized[signed], index=False).to_numpy()
+    claim_ids = claims['ClaimID'] if 'ClaimID' in claims.columns else pd.Series(np.nan, index=claims.index)
+    return pd.DataFrame({
+        'Provider': claims['Provider'][signed].astype('category').reset_index(drop=True),
+        'ClaimID': claim_ids[signed].reset_index(drop=True),
+        'Signature': signatures,
+    })
+
+
+def load_claim_signatures(files: Dict[str, List[Path]], chunk_size: Optional[int] = None) -> pd.DataFrame:
+    """
+    Lee solo Provider, ClaimID y las columnas de la firma de los archivos de claims.
+
+    Args:
+        files: Rutas por tipo de archivo (ver unified_ingestor.find_input_files)
+        chunk_size: Si se indica, lee por bloques de este tamaño
+
+    Returns:
+        Firmas de todos los claims (ver claim_signatures)
+    """
+    columns = ['Provider', 'ClaimID'] + SIGNATURE_COLUMNS
+    signatures = []
+    for claim_type in ['inpatient', 'outpatient']:
+        for file in files.get(claim_type, []):
+            chunks = iter_table_chunks(file, chunk_size, columns) if chunk_size else [read_table(file, columns)]
+            for chunk in chunks:
+                signatures.append(claim_signatures(chunk))
+    if not signatures:
+        return pd.DataFrame(columns=['Provider', 'ClaimID', 'Signature'])
+    return concat_frames(signatures)
+
+
+def find_duplicate_claims(signatures: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Busca claims con la misma firma: repetidos por el mismo proveedor (claim
+    facturado dos veces) o por proveedores distintos.
+
+    Args:
+        signatures: Firmas de los claims (ver claim_signatures)
+
+    Returns:
+        Tupla (features por proveedor con DUPLICATE_COLUMNS,
+        detalle de los claims repetidos con DRILLDOWN_COLUMNS)
+    """
+    counts, drilldown = duplicate_counts(signatures)
+    logger.info(f"Claims repetidos: {len(drilldown)} de {len(signatures)} "
+                f"en {drilldown['Signature'].nunique()} firmas")
+    return duplicate_features(counts), drilldown
+
+
+def duplicate_features(counts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Tasas de claims repetidos por proveedor a partir de sus conteos.
+
+    Args:
+        counts: Conteos con COUNT_COLUMNS (ver duplicate_counts)
+
+    Returns:
+        DataFrame con DUPLICATE_COLUMNS ordenado por Provider
+    """
+    signed_claims = np.maximum(counts['Signed_Claims'].to_numpy(), 1)
+    return counts.assign(
+        Duplicate_Rate=counts['Duplicate_Claims'].to_numpy() / signed_claims,
+        Cross_Provider_Rate=counts['Cross_Provider_Claims'].to_numpy() / signed_claims,
+    )[DUPLICATE_COLUMNS].sort_values('Provider', ignore_index=True)
+
+
+def duplicate_counts(signatures: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Conteos por proveedor de claims firmados, repetidos por el mismo proveedor y
+    repetidos entre proveedores, más el detalle de los claims repetidos.
+
+    Las colisiones se encuentran con una pasada de hash sobre las firmas
+    (Series.duplicated, lineal); solo los claims con firma repetida se agrupan.
+    Como cada conteo depende solo de los claims de la misma firma, los conteos de
+    un subconjunto de firmas completas se pueden restar y sumar (ver update_duplicate_claims).
+
+    Args:
+        signatures: Firmas de los claims (ver claim_signatures)
+
+    Returns:
+        Tupla (conteos con COUNT_COLUMNS ordenados por Provider,
+        detalle de los claims repetidos con DRILLDOWN_COLUMNS)
+    """
+    providers, provider_index = pd.factorize(signatures['Provider'].astype(str))
+    signed_claims = np.bincount(providers, minlength=len(provider_index))
+
+    repeated = signatures['Signature'].duplicated(keep=False).to_numpy()
+    groups = pd.DataFrame({
+        'Signature': signatures['Signature'].to_numpy()[repeated],
+        'Provider': providers[repeated],
+    })
+    by_signature = groups.groupby('Signature')['Provider']
+    group_claims = by_signature.transform('size').to_numpy()
+    group_providers = by_signature.transform('nunique').to_numpy()
+    pair_claims = groups.groupby(['Signature', 'Provider'])['Provider'].transform('size').to_numpy()
+
+    duplicate_claims = np.bincount(groups['Provider'], weights=pair_claims > 1, minlength=len(provider_index))
+    cross_claims = np.bincount(groups['Provider'], weights=group_providers > 1, minlength=len(provider_index))
+    counts = pd.DataFrame({
+        'Provider': provider_index.astype(str),
+        'Signed_Claims': signed_claims.astype(np.int64),
+        'Duplicate_Claims': duplicate_claims.astype(np.int64),
+        'Cross_Provider_Claims': cross_claims.astype(np.int64),
+    }, columns=COUNT_COLUMNS).sort_values('Provider', ignore_index=True)
+
+    claim_ids = signatures['ClaimID'][repeated]
+    if pd.api.types.is_integer_dtype(claim_ids):
+        claim_ids = decode_prefixed_id(claim_ids, ID_PREFIXES['ClaimID'])
+    drilldown = pd.DataFrame({
+        'Signature': [f"{signature:016x}" for signature in groups['Signature']],
+        'Provider': provider_index[groups['Provider']].astype(str),
+        'ClaimID': claim_ids.astype(str).to_numpy(),
+        'Group_Claims': group_claims,
+        'Group_Providers': group_providers,
+    }, columns=DRILLDOWN_COLUMNS).sort_values(['Signature', 'Provider', 'ClaimID'], ignore_index=True)
+    return counts, drilldown
+
+
+def update_duplicate_claims(counts: pd.DataFrame, drilldown: pd.DataFrame,
+                            matches: pd.DataFrame, new: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Incorpora firmas nuevas a unos conteos ya calculados sin volver a agrupar todas.
+
+    Solo cambian las firmas que aparecen entre las nuevas: a los conteos se les restan
+    los de los claims guardados con esas firmas y se les suman los de esos claims más
+    los nuevos; en el detalle se reemplazan los grupos de esas firmas.
+
+    Args:
+        counts: Conteos de los claims guardados (ver duplicate_counts)
+        drilldown: Detalle de los claims repetidos guardados
+        matches: Firmas guardadas cuyo valor de Signature está entre las nuevas
+            (todas las de esos valores; ver AggregateStateStore)
+        new: Firmas de los claims nuevos
+
+    Returns:
+        Tupla (conteos, detalle) de todos los claims
+    """
+    touched = pd.concat([matches, new], ignore_index=True)
+    before, _ = duplicate_counts(matches)
+    after, after_drilldown = duplicate_counts(touched)
+    counts = (counts.set_index('Provider')
+              .sub(before.set_index('Provider'), fill_value=0)
+              .add(after.set_index('Provider'), fill_value=0)
+              .astype(np.int64).reset_index())
+    touched_signatures = [f"{signature:016x}" for signature in pd.unique(touched['Signature'])]
+    drilldown = pd.concat([drilldown[~drilldown['Signature'].isin(touched_signatures)], after_drilldown],
+                          ignore_index=True).sort_values(['Signature', 'Provider', 'ClaimID'], ignore_index=True)
+    logger.info(f"Claims repetidos: {len(new)} firmas nuevas, {len(matches)} coincidencias con las guardadas")
+    return counts[COUNT_COLUMNS].sort_values('Provider', ignore_index=True), drilldown
@@ -0,0 +1,223 @@
+import pandas as pd
+import numpy as np
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Reducciones soportadas. Todas se compilan a sumas/conteos numéricos por proveedor
+# (sum, count, coincidencias o pares distintos), de modo que ninguna necesita
+# ejecutar Python por grupo y todas se pueden combinar entre bloques.
+REDUCTIONS = ('sum', 'mean', 'count', 'rate', 'nunique')
+
+# Columna parcial con el número de filas por proveedor (denominador de 'rate')
+ROWS_COLUMN = '__rows'
+
+
+@dataclass(frozen=True)
+class FeatureSpec:
+    """
+    Definición declarativa de una feature agregada por proveedor.
+
+    Attributes:
+        name: Nombre de la columna de salida
+        source: Columna de los claims de la que se calcula
+        reduction: 'sum', 'mean', 'count' (no nulos), 'rate' (proporción de filas
+            iguales a match) o 'nunique' (valores distintos)
+        default: Valor usado cuando la columna origen no existe
+        match: Valor que cuenta como positivo en 'rate'
+    """
+    name: str
+    source: str
+    reduction: str
+    default: float = 0.0
+    match: Any = None
+
+    def __post_init__(self):
+        if self.reduction not in REDUCTIONS:
+            raise ValueError(f"Reducción no soportada para {self.name}: {self.reduction}")
+        if self.reduction == 'rate' and self.match is None:
+            raise ValueError(f"La feature {self.name} de tipo 'rate' requiere match")
+
+
+# Condiciones crónicas del archivo de beneficiarios y su nombre en el dashboard
+CHRONIC_CONDITIONS = {
+    'ChronicCond_Alzheimer': 'Alzheimer',
+    'ChronicCond_Heartfailure': 'Heartfailure',
+    'ChronicCond_Cancer': 'Cancer',
+    'ChronicCond_ObstrPulmonary': 'ObstrPulmonary',
+    'ChronicCond_Depression': 'Depression',
+    'ChronicCond_Diabetes': 'Diabetes',
+    'ChronicCond_IschemicHeart': 'IschemicHeart',
+    'ChronicCond_Osteoporasis': 'Osteoporasis',
+    'ChronicCond_rheumatoidarthritis': 'Arthritis',
+    'ChronicCond_stroke': 'Stroke'
+}
+
+# Features por proveedor compartidas por test_final.csv y test_dashboard.csv
+PROVIDER_FEATURES: List[FeatureSpec] = [
+    FeatureSpec('Total_Reimbursed', 'InscClaimAmtReimbursed', 'sum'),
+    FeatureSpec('Mean_Reimbursed', 'InscClaimAmtReimbursed', 'mean'),
+    FeatureSpec('Claim_Count', 'ClaimID', 'count'),
+    FeatureSpec('Unique_Beneficiaries', 'BeneID', 'nunique'),
+] + [
+    FeatureSpec(name, condition, 'mean') for condition, name in CHRONIC_CONDITIONS.items()
+] + [
+    FeatureSpec('RenalDisease', 'RenalDiseaseIndicator', 'rate', match='Y'),
+    FeatureSpec('Avg_Age', 'Age', 'mean'),
+    # Gender es 1=Masculino, 2=Femenino
+    FeatureSpec('Pct_Male', 'Gender', 'rate', default=0.5, match=1),
+]
+
+# Valores por defecto de las features cuando no se pueden calcular
+FEATURE_DEFAULTS: Dict[str, float] = {spec.name: spec.default for spec in PROVIDER_FEATURES}
+
+# Fecha de los claims con la que se agrupan por mes y nombre de la columna del mes
+PERIOD_SOURCE = 'ClaimStartDt'
+PERIOD_COLUMN = 'Period'
+
+# Features que además se calculan por (Provider, mes): las que usa el modelo
+PERIOD_FEATURES: List[FeatureSpec] = [
+    spec for spec in PROVIDER_FEATURES
+    if spec.name in ('Total_Reimbursed', 'Mean_Reimbursed', 'Claim_Count',
+                     'Unique_Beneficiaries', 'Avg_Age', 'Pct_Male')
+]
+
+
+def spec_fingerprint(features: Optional[List[FeatureSpec]] = None) -> str:
+    """Huella de la definición de features; cambia si se agrega o modifica una feature"""
+    if features is None:
+        features = (PROVIDER_FEATURES, PERIOD_SOURCE, PERIOD_FEATURES)
+    return hashlib.sha256(repr(features).encode()).hexdigest()[:16]
+
+
+def source_columns(features: Optional[List[FeatureSpec]] = None) -> List[str]:
+    """Columnas origen que necesitan las features (para proyectar la lectura)"""
+    features = PROVIDER_FEATURES if features is None else features
+    return list(dict.fromkeys(spec.source for spec in features))
+
+
+def _partial_columns(spec: FeatureSpec) -> List[Tuple[str, str]]:
+    """Columnas parciales (nombre, operación) que necesita una feature"""
+    if spec.reduction == 'sum':
+        return [(f'{spec.source}__sum', 'value')]
+    if spec.reduction == 'mean':
+        return [(f'{spec.source}__sum', 'value'), (f'{spec.source}__count', 'notna')]
+    if spec.reduction == 'count':
+        return [(f'{spec.source}__count', 'notna')]
+    if spec.reduction == 'rate':
+        return [(f'{spec.source}__eq_{spec.match}', 'eq'), (ROWS_COLUMN, 'rows')]
+    return []
+
+
+def compile_plan(columns, features: Optional[List[FeatureSpec]] = None) -> Dict[str, Any]:
+    """
+    Compila las features disponibles a un plan de columnas indicadoras numéricas.
+
+    Args:
+        columns: Columnas presentes en los claims
+        features: Features a calcular (por defecto PROVIDER_FEATURES)
+
+    Returns:
+        Dict con 'features' (las calculables), 'partials' (columna parcial ->
+        (operación, columna origen, valor)) y 'distinct' (columnas con nunique)
+    """
+    features = PROVIDER_FEATURES if features is None else features
+    available = [spec for spec in features if spec.source in columns]
+
+    partials: Dict[str, Tuple[str, str, Any]] = {}
+    for spec in available:
+        for partial, op in _partial_columns(spec):
+            partials.setdefault(partial, (op, spec.source, spec.match))
+
+    distinct = sorted({spec.source for spec in available if spec.reduction == 'nunique'})
+    return {'features': available, 'partials': partials, 'distinct': distinct}
+
+
+def _widen(values: pd.Series) -> pd.Series:
+    """
+    Amplía enteros compactos (uint8, int32) a 64 bits antes de sumar, ya que
+    groupby().sum() conserva el dtype de entrada y podría desbordarse.
+    """
+    if pd.api.types.is_integer_dtype(values) and values.dtype.itemsize < 8:
+        is_nullable = isinstance(values.dtype, pd.api.extensions.ExtensionDtype)
+        return values.astype('Int64' if is_nullable else np.int64)
+    return values
+
+
+def month_buckets(dates: pd.Series) -> np.ndarray:
+    """
+    Mes de cada fecha (primer día del mes) con una única conversión vectorizada.
+
+    Args:
+        dates: Fechas de los claims (las inválidas quedan como NaT)
+
+    Returns:
+        Array datetime64[ns] con el inicio del mes de cada fila
+    """
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, errors='coerce')
+    return dates.to_numpy(dtype='datetime64[ns]').astype('datetime64[M]').astype('datetime64[ns]')
+
+
+def compute_partial_sums(claims: pd.DataFrame, plan: Dict[str, Any],
+                         keys: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Materializa las columnas indicadoras del plan y las suma por proveedor
+    con una única agregación numérica vectorizada.
+
+    Args:
+        claims: Claims (completos o un bloque) con columna Provider
+        plan: Plan compilado (ver compile_plan)
+        keys: Columnas de agrupación (por defecto solo Provider; p. ej. Provider y Period)
+
+    Returns:
+        DataFrame de sumas parciales indexado por las columnas de keys
+    """
+    keys = keys or ['Provider']
+    columns = {key: claims[key] for key in keys}
+    for partial, (op, source, match) in plan['partials'].items():
+        if op == 'value':
+            columns[partial] = _widen(claims[source])
+        elif op == 'notna':
+            columns[partial] = claims[source].notna()
+        elif op == 'eq':
+            columns[partial] = claims[source] == match
+        elif op == 'rows':
+            columns[partial] = np.ones(len(claims), dtype=np.int64)
+    return pd.DataFrame(columns).groupby(keys, observed=True).sum()
+
+
+def finalize_features(sums: pd.DataFrame, distinct_counts: Dict[str, pd.Series],
+                      features: Optional[List[FeatureSpec]] = None) -> pd.DataFrame:
+    """
+    Calcula las features finales a partir de sumas parciales ya combinadas.
+
+    Args:
+        sums: Sumas parciales indexadas por Provider (o Provider y Period)
+        distinct_counts: Conteo de valores distintos por columna origen (Series con el índice de sums)
+        features: Features a calcular (por defecto PROVIDER_FEATURES)
+
+    Returns:
+        DataFrame con el índice de sums y una columna por feature calculable
+    """
+    features = PROVIDER_FEATURES if features is None else features
+    result = pd.DataFrame(index=sums.index)
+    for spec in features:
+        if spec.reduction == 'nunique':
+            if spec.source in distinct_counts:
+                result[spec.name] = distinct_counts[spec.source].reindex(sums.index, fill_value=0)
+            continue
+
+        partials = dict(_partial_columns(spec))
+        if not all(partial in sums.columns for partial in partials):
+            continue
+
+        if spec.reduction == 'sum':
+            result[spec.name] = sums[f'{spec.source}__sum']
+        elif spec.reduction == 'count':
+            result[spec.name] = sums[f'{spec.source}__count']
+        elif spec.reduction == 'mean':
+            result[spec.name] = sums[f'{spec.source}__sum'] / sums[f'{spec.source}__count'].replace(0, np.nan)
+        elif spec.reduction == 'rate':
+            result[spec.name] = sums[f'{spec.source}__eq_{spec.match}'] / sums[ROWS_COLUMN]
+    return result
@@ -0,0 +1,231 @@
+import numpy as np
+import json
+import logging
+from typing import Any, List, Optional
+
+try:
+    from numba import njit
+except ImportError:  # pragma: no cover - sin numba se usa siempre el booster de XGBoost
+    njit = None
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Diferencia máxima de probabilidad admitida frente al booster en la verificación de paridad
+PARITY_TOLERANCE = 1e-6
+
+# Filas de la muestra de verificación de paridad
+PARITY_ROWS = 2048
+
+
+def is_available() -> bool:
+    """Indica si numba está instalado y el evaluador compilado puede usarse"""
+    return njit is not None
+
+
+def _forest_margin(X, feature, threshold, left, right, default_left, value, roots, base_margin):
+    """
+    Margen (log-odds) de cada fila recorriendo los árboles en los arrays planos.
+    Reproduce al predictor de XGBoost: comparaciones en float32 (x < umbral va a la
+    izquierda), los nulos siguen la rama por defecto y la suma parte de base_margin.
+    """
+    out = np.empty(X.shape[0], dtype=np.float32)
+    for i in range(X.shape[0]):
+        total = base_margin
+        for root in roots:
+            node = root
+            while left[node] != -1:
+                x = X[i, feature[node]]
+                if np.isnan(x):
+                    node = left[node] if default_left[node] else right[node]
+                elif x < threshold[node]:
+                    node = left[node]
+                else:
+                    node = right[node]
+            total += value[node]
+        out[i] = total
+    return out
+
+
+if njit is not None:
+    # nogil: varias peticiones pueden evaluar en paralelo desde hilos distintos
+    _forest_margin = njit(cache=True, nogil=True)(_forest_margin)
+
+
+class CompiledForest:
+    """
+    Bosque de XGBoost aplanado en arrays NumPy (un nodo por posición, con los
+    árboles concatenados) y evaluado por un kernel compilado con numba.
+
+    Expone predict_proba y predict como el clasificador de sklearn, de modo que
+    puede reemplazarlo en los caminos de baja latencia (una fila o lotes pequeños),
+    donde el costo del wrapper de XGBoost supera al del recorrido de los árboles.
+    """
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray, right: np.ndarray,
+                 default_left: np.ndarray, value: np.ndarray, roots: np.ndarray, base_margin: float,
+                 feature_names: List[str]):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.base_margin = np.float32(base_margin)
+        self.feature_names = feature_names
+
+    @classmethod
+    def from_model(cls, model: Any) -> "CompiledForest":
+        """
+        Aplana un XGBClassifier binario (gbtree, objetivo binary:logistic).
+
+        Args:
+            model: Clasificador de xgboost ya entrenado
+
+        Returns:
+            Bosque compilado
+
+        Raises:
+            ValueError: Si el modelo usa algo que el evaluador no reproduce
+                (dart, multiclase, splits categóricos u otro objetivo)
+        """
+        booster = model.get_booster()
+        learner = json.loads(booster.save_raw('json'))['learner']
+        objective = learner['objective']['name']
+        if objective != 'binary:logistic':
+            raise ValueError(f"Objetivo no soportado por el evaluador compilado: {objective}")
+        if learner['gradient_booster']['name'] != 'gbtree':
+            raise ValueError(f"Booster no soportado por el evaluador compilado: {learner['gradient_booster']['name']}")
+        gbtree = learner['gradient_booster']['model']
+        trees = gbtree['trees']
+
+        # Mismo rango de iteraciones que usa predict_proba (best_iteration si hubo early stopping)
+        best_iteration = getattr(model, 'best_iteration', None)
+        if best_iteration is not None:
+            trees = trees[:(best_iteration + 1) * int(gbtree['gbtree_model_param']['num_parallel_tree'])]
+
+        features, thresholds, lefts, rights, defaults, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            if any(tree['split_type']):
+                raise ValueError("Los splits categóricos no están soportados por el evaluador compilado")
+            left = np.asarray(tree['left_children'], dtype=np.int32)
+            right = np.asarray(tree['right_children'], dtype=np.int32)
+            leaf = left == -1
+            roots.append(offset)
+            # Los hijos pasan a ser posiciones absolutas en los arrays concatenados
+            lefts.append(np.where(leaf, -1, left + offset).astype(np.int32))
+            rights.append(np.where(leaf, -1, right + offset).astype(np.int32))
+            features.append(np.asarray(tree['split_indices'], dtype=np.int32))
+            # En las hojas split_conditions guarda el valor de la hoja
+            conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+            thresholds.append(conditions)
+            values.append(np.where(leaf, conditions, np.float32(0)).astype(np.float32))
+            defaults.append(np.asarray(tree['default_left'], dtype=np.bool_))
+            offset += len(left)
+
+        base_score = float(learner['learner_model_param']['base_score'].strip('[]'))
+        return cls(
+            feature=np.concatenate(features), threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts), right=np.concatenate(rights),
+            default_left=np.concatenate(defaults), value=np.concatenate(values),
+            roots=np.asarray(roots, dtype=np.int64),
+            base_margin=np.log(base_score / (1 - base_score)),
+            feature_names=list(booster.feature_names or []),
+        )
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def _as_matrix(self, X: Any) -> np.ndarray:
+        # Las columnas de un DataFrame se ordenan como en el entrenamiento
+        if hasattr(X, 'columns') and self.feature_names:
+            X = X[self.feature_names]
+        return np.ascontiguousarray(X, dtype=np.float32).reshape(-1, len(self.feature_names) or np.shape(X)[-1])
+
+    def predict_margin(self, X: Any) -> np.ndarray:
+        """Margen (log-odds) float32 de cada fila"""
+        return _forest_margin(self._as_matrix(X), self.feature, self.threshold, self.left, self.right,
+                              self.default_left, self.value, self.roots, self.base_margin)
+
+    def predict_proba(self, X: Any) -> np.ndarray:
+        """Probabilidades (n, 2) de las clases 0 y 1, como XGBClassifier.predict_proba"""
+        positive = np.float32(1) / (np.float32(1) + np.exp(-self.predict_margin(X)))
+        return np.column_stack([np.float32(1) - positive, positive])
+
+    def predict(self, X: Any) -> np.ndarray:
+        """Clase de cada fila (probabilidad de fraude > 0.5), como XGBClassifier.predict"""
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(np.int64)
+
+    def parity_sample(self, n_rows: int = PARITY_ROWS, seed: int = 0) -> np.ndarray:
+        """
+        Filas de prueba que recorren todas las ramas: cada valor es un umbral de la
+        feature, el float32 inmediatamente inferior (el caso x < umbral), un nulo o
+        un valor fuera del rango de los umbrales.
+
+        Args:
+            n_rows: Número de filas
+            seed: Semilla del generador
+
+        Returns:
+            Matriz float32 (n_rows, n_features)
+        """
+        rng = np.random.default_rng(seed)
+        n_features = len(self.feature_names) or int(self.feature.max()) + 1
+        split = self.left != -1
+        sample = np.empty((n_rows, n_features), dtype=np.float32)
+        for col in range(n_features):
+            thresholds = np.unique(self.threshold[split & (self.feature == col)])
+            if len(thresholds) == 0:
+                thresholds = np.zeros(1, dtype=np.float32)
+            candidates = np.concatenate([
+                thresholds, np.nextafter(thresholds, np.float32(-np.inf)),
+                [np.nan, thresholds.min() - 1, thresholds.max() + 1],
+            ]).astype(np.float32)
+            sample[:, col] = rng.choice(candidates, size=n_rows)
+        return sample
+
+    def check_parity(self, model: Any, X: Optional[np.ndarray] = None) -> float:
+        """
+        Compara las probabilidades del evaluador con las del booster.
+
+        Args:
+            model: Clasificador del que se compiló el bosque
+            X: Filas a comparar (por defecto parity_sample())
+
+        Returns:
+            Diferencia absoluta máxima de probabilidad
+        """
+        X = self.parity_sample() if X is None else self._as_matrix(X)
+        expected = model.predict_proba(X)[:, 1].astype(np.float64)
+        return float(np.max(np.abs(self.predict_proba(X)[:, 1] - expected), initial=0.0))
+
+
+def compile_forest(model: Any) -> Optional[CompiledForest]:
+    """
+    Compila un modelo al evaluador de arrays planos y verifica su paridad con el booster.
+
+    Args:
+        model: Clasificador de xgboost ya entrenado
+
+    Returns:
+        CompiledForest, o None si numba no está instalado, el modelo no está soportado
+        o la verificación de paridad falla (en ese caso se sigue usando el booster)
+    """
+    if njit is None or model is None:
+        return None
+    try:
+        forest = CompiledForest.from_model(model)
+        difference = forest.check_parity(model)
+    except Exception as e:
+        logger.warning(f"No se pudo compilar el modelo al evaluador de árboles: {e}")
+        return None
+    if difference > PARITY_TOLERANCE:
+        logger.warning(f"El evaluador de árboles difiere del booster ({difference:.2e}); se usa el booster")
+        return None
+    logger.info(f"Modelo compilado al evaluador de árboles: {forest.n_trees} árboles, "
+                f"{len(forest.left)} nodos (diferencia máxima {difference:.1e})")
+    return forest
@@ -0,0 +1,162 @@
+import pandas as pd
+import numpy as np
+import math
+import logging
+from pathlib import Path
+from typing import Optional
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Rango de precisión soportado (2^p registros de un byte por proveedor)
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+
+
+def precision_for_error(error: float) -> int:
+    """
+    Precisión mínima de HyperLogLog para un error relativo (desviación típica ~1.04/sqrt(2^p)).
+
+    Args:
+        error: Error relativo deseado (p. ej. 0.02 para 2%)
+
+    Returns:
+        Precisión p entre MIN_PRECISION y MAX_PRECISION
+    """
+    if not 0 < error < 1:
+        raise ValueError(f"El error del conteo aproximado debe estar entre 0 y 1: {error}")
+    precision = math.ceil(2 * math.log2(1.04 / error))
+    return min(max(precision, MIN_PRECISION), MAX_PRECISION)
+
+
+def standard_error(precision: int) -> float:
+    """Error relativo típico de HyperLogLog con 2^precision registros"""
+    return 1.04 / math.sqrt(1 << precision)
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Número de bits significativos de cada uint64 (búsqueda binaria vectorizada)"""
+    values = values.copy()
+    length = np.zeros(values.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >= (np.uint64(1) << np.uint64(shift))
+        length[high] += shift
+        values[high] >>= np.uint64(shift)
+    return length + (values > 0)
+
+
+def _alpha(m: int) -> float:
+    if m == 16:
+        return 0.673
+    if m == 32:
+        return 0.697
+    if m == 64:
+        return 0.709
+    return 0.7213 / (1 + 1.079 / m)
+
+
+class HLLSketches:
+    """
+    Sketches HyperLogLog de valores distintos, uno por proveedor.
+
+    Cada proveedor ocupa 2^precision registros de un byte sin importar cuántos
+    valores vea, y dos conjuntos de sketches se combinan con un máximo por registro,
+    de modo que el conteo se puede repartir entre bloques, particiones y cargas
+    incrementales sin conservar los IDs originales.
+    """
+
+    def __init__(self, precision: int, providers: Optional[pd.Index] = None,
+                 registers: Optional[np.ndarray] = None):
+        self.precision = precision
+        self.providers = providers if providers is not None else pd.Index([], name='Provider')
+        self.registers = registers if registers is not None else \
+            np.zeros((0, 1 << precision), dtype=np.uint8)
+
+    @classmethod
+    def from_pairs(cls, providers: pd.Series, values: pd.Series, precision: int) -> "HLLSketches":
+        """
+        Construye los sketches a partir de pares (Provider, valor).
+
+        Args:
+            providers: Proveedor de cada fila
+            values: Valor a contar de cada fila (p. ej. BeneID)
+            precision: Precisión p de HyperLogLog
+
+        Returns:
+            Sketches de los proveedores presentes
+        """
+        present = providers.notna().values & values.notna().values
+        codes, uniques = pd.factorize(providers[present].astype(str), sort=True)
+        hashes = pd.util.hash_array(np.asarray(values[present].astype(str), dtype=object))
+
+        # Los primeros p bits eligen el registro; el resto define el rango (ceros iniciales + 1)
+        width = 64 - precision
+        index = (hashes >> np.uint64(width)).astype(np.int64)
+        rest = hashes & np.uint64((1 << width) - 1)
+        rank = (width - _bit_length(rest) + 1).astype(np.uint8)
+
+        registers = np.zeros((len(uniques), 1 << precision), dtype=np.uint8)
+        np.maximum.at(registers, (codes, index), rank)
+        return cls(precision, pd.Index(uniques, name='Provider'), registers)
+
+    def merge(self, other: "HLLSketches") -> "HLLSketches":
+        """
+        Combina dos conjuntos de sketches (unión de los valores vistos).
+
+        Args:
+            other: Sketches con la misma precisión
+
+        Returns:
+            Nuevos sketches con todos los proveedores de ambos
+        """
+        if other.precision != self.precision:
+            raise ValueError(f"No se pueden combinar sketches de precisión {self.precision} y {other.precision}")
+        if len(self.providers) == 0:
+            return other
+        if len(other.providers) == 0:
+            return self
+        providers = self.providers.union(other.providers).rename('Provider')
+        registers = np.zeros((len(providers), self.registers.shape[1]), dtype=np.uint8)
+        for sketches in (self, other):
+            positions = providers.get_indexer(sketches.providers)
+            registers[positions] = np.maximum(registers[positions], sketches.registers)
+        return HLLSketches(self.precision, providers, registers)
+
+    def subset(self, providers) -> "HLLSketches":
+        """Sketches restringidos a los proveedores indicados (los que existan)"""
+        mask = self.providers.isin(providers)
+        return HLLSketches(self.precision, self.providers[mask], self.registers[mask])
+
+    def estimate(self) -> pd.Series:
+        """
+        Estima el número de valores distintos por proveedor.
+
+        Returns:
+            Series indexada por Provider con el conteo estimado (entero)
+        """
+        m = self.registers.shape[1]
+        raw = _alpha(m) * m * m / np.power(2.0, -self.registers.astype(np.float64)).sum(axis=1)
+
+        # Corrección para cardinalidades pequeñas (conteo lineal sobre registros vacíos)
+        zeros = (self.registers == 0).sum(axis=1)
+        small = (raw <= 2.5 * m) & (zeros > 0)
+        linear = m * np.log(m / np.maximum(zeros, 1))
+        estimate = np.where(small, linear, raw)
+        return pd.Series(np.rint(estimate).astype(np.int64), index=self.providers)
+
+    def save(self, path: Path) -> None:
+        """Guarda los sketches en un archivo .npz (escritura atómica)"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp.npz")
+        np.savez(tmp_path, precision=self.precision,
+                 providers=np.asarray(self.providers.astype(str), dtype=str), registers=self.registers)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "HLLSketches":
+        """Lee sketches guardados con save()"""
+        with np.load(path) as data:
+            return cls(int(data['precision']), pd.Index(data['providers'].astype(object), name='Provider'),
+                       data['registers'])
@@ -0,0 +1,166 @@
+import json
+import time
+import uuid
+import threading
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+from .ingest_progress import IngestCancelled, ProgressTracker, tracking
+from .aggregate_store import file_signature
+from .unified_ingestor import INPUT_DIR, find_input_files, process_all_files
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Hilos del pool de ingesta. Todas las ingestas escriben los mismos archivos de salida
+# (test_final.csv, test_dashboard.csv), por lo que por defecto se ejecutan de a una
+DEFAULT_JOB_WORKERS = 1
+
+# Trabajos terminados que se conservan para consultar su resultado
+MAX_FINISHED_JOBS = 100
+
+# Estados de un trabajo
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = "queued", "running", "completed", "failed", "cancelled"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class IngestJob:
+    """Una ejecución de ingesta en segundo plano"""
+
+    def __init__(self, job_id: str, key: str, params: Dict[str, Any]):
+        self.job_id = job_id
+        self.key = key
+        self.params = params
+        self.status = QUEUED
+        self.tracker = ProgressTracker()
+        self.submitted_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.future: Optional[Future] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Estado del trabajo para la API (sin el resultado completo)"""
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "params": self.params,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            **self.tracker.snapshot(),
+        }
+
+
+class IngestJobManager:
+    """
+    Cola de trabajos de ingesta ejecutados en un pool de hilos, para que el
+    procesamiento no bloquee el event loop de FastAPI.
+
+    Los envíos con los mismos parámetros y los mismos archivos de entrada mientras
+    hay un trabajo igual en cola o en ejecución se combinan en ese trabajo.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_JOB_WORKERS,
+                 runner: Callable[..., Dict[str, Any]] = process_all_files):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self.runner = runner
+        self.jobs: Dict[str, IngestJob] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _job_key(params: Dict[str, Any]) -> str:
+        """Clave de coalescencia: parámetros + firma de los archivos de entrada"""
+        files = find_input_files(params.get("input_dir", INPUT_DIR))
+        signatures = {kind: {p.name: file_signature(p) for p in paths} for kind, paths in files.items()}
+        return json.dumps({"params": params, "files": signatures}, sort_keys=True, default=str)
+
+    def submit(self, **params: Any) -> Tuple[IngestJob, bool]:
+        """
+        Encola una ingesta.
+
+        Args:
+            **params: Argumentos de process_all_files
+
+        Returns:
+            (trabajo, True si se reutilizó un trabajo igual ya activo)
+        """
+        key = self._job_key(params)
+        with self._lock:
+            for job in self.jobs.values():
+                if job.key == key and job.status in ACTIVE_STATES:
+                    logger.info(f"Ingesta combinada con el trabajo activo {job.job_id}")
+                    return job, True
+
+            job = IngestJob(uuid.uuid4().hex[:12], key, params)
+            self.jobs[job.job_id] = job
+            self._prune()
+            job.future = self.executor.submit(self._run, job)
+        logger.info(f"Trabajo de ingesta encolado: {job.job_id}")
+        return job, False
+
+    def _run(self, job: IngestJob) -> Dict[str, Any]:
+        if job.tracker.cancelled:
+            self._finish(job, CANCELLED, error="Cancelado antes de iniciar")
+            return {}
+
+        job.status = RUNNING
+        try:
+            with tracking(job.tracker):
+                result = self.runner(**job.params)
+        except IngestCancelled:
+            self._finish(job, CANCELLED, error="Cancelado por el usuario")
+            return {}
+        except Exception as e:
+            logger.error(f"Error en el trabajo de ingesta {job.job_id}: {str(e)}")
+            self._finish(job, FAILED, error=str(e))
+            return {}
+
+        if result.get("success"):
+            self._finish(job, COMPLETED, result=result)
+        else:
+            self._finish(job, FAILED, result=result, error=result.get("message"))
+        return result
+
+    @staticmethod
+    def _finish(job: IngestJob, status: str, result: Optional[Dict[str, Any]] = None,
+                error: Optional[str] = None) -> None:
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        job.status = status
+        logger.info(f"Trabajo de ingesta {job.job_id}: {status}")
+
+    def _prune(self) -> None:
+        """Descarta los trabajos terminados más antiguos por encima de MAX_FINISHED_JOBS"""
+        finished = [job for job in self.jobs.values() if job.status not in ACTIVE_STATES]
+        finished.sort(key=lambda job: job.finished_at or 0)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job.job_id]
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        """Devuelve un trabajo por su id (None si no existe)"""
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[IngestJob]:
+        """
+        Pide cancelar un trabajo. Si está en cola no llega a ejecutarse; si está en
+        ejecución se detiene en el siguiente punto de progreso.
+
+        Args:
+            job_id: Id del trabajo
+
+        Returns:
+            El trabajo, o None si no existe
+        """
+        job = self.jobs.get(job_id)
+        if job is not None and job.status in ACTIVE_STATES:
+            job.tracker.cancel()
+            if job.future is not None and job.future.cancel():
+                self._finish(job, CANCELLED, error="Cancelado antes de iniciar")
+        return job
+
+
+# Cola compartida por la API
+ingest_jobs = IngestJobManager()
@@ -0,0 +1,149 @@
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class IngestCancelled(Exception):
+    """La ingesta fue cancelada mientras se ejecutaba"""
+
+
+class ProgressTracker:
+    """
+    Progreso de una ejecución de ingesta: etapa actual, filas procesadas y
+    fracción estimada del trabajo. También transporta la señal de cancelación:
+    cada actualización lanza IngestCancelled si se pidió cancelar.
+    """
+
+    def __init__(self):
+        self.stage = "queued"
+        self.rows_processed = 0
+        self.fraction = 0.0
+        self.started_at: Optional[float] = None
+        self._cancel_event = threading.Event()
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        """Registra una función que recibe cada evento de progreso"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    @property
+    def has_listeners(self) -> bool:
+        with self._lock:
+            return bool(self._listeners)
+
+    def cancel(self) -> None:
+        """Pide cancelar la ingesta en la siguiente actualización de progreso"""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def update(self, stage: Optional[str] = None, rows: int = 0,
+               fraction: Optional[float] = None, **details: Any) -> None:
+        """
+        Registra un avance de la ingesta.
+
+        Args:
+            stage: Nueva etapa (None para mantener la actual)
+            rows: Filas procesadas desde la última actualización
+            fraction: Fracción estimada del trabajo completado (0 a 1)
+            **details: Datos adicionales del evento (p. ej. archivo o partición)
+
+        Raises:
+            IngestCancelled: Si se pidió cancelar
+        """
+        if self.cancelled:
+            raise IngestCancelled("Ingesta cancelada")
+        if self.started_at is None:
+            self.started_at = time.time()
+        if stage is not None:
+            self.stage = stage
+        self.rows_processed += rows
+        if fraction is not None:
+            self.fraction = max(self.fraction, min(fraction, 1.0))
+
+        with self._lock:
+            listeners = list(self._listeners)
+        if listeners:
+            event = {**self.snapshot(), **details}
+            for listener in listeners:
+                try:
+                    listener(event)
+                except Exception as e:
+                    logger.warning(f"Error notificando progreso de ingesta: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Estado actual del progreso.
+
+        Returns:
+            Dict con stage, rows_processed, progress, elapsed_seconds y eta_seconds
+            (None mientras no haya avance suficiente para estimarlo)
+        """
+        elapsed = time.time() - self.started_at if self.started_at is not None else 0.0
+        eta = None
+        if 0 < self.fraction < 1:
+            eta = round(elapsed / self.fraction - elapsed, 1)
+        elif self.fraction >= 1:
+            eta = 0.0
+        return {
+            "stage": self.stage,
+            "rows_processed": self.rows_processed,
+            "progress": round(self.fraction, 4),
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": eta,
+        }
+
+
+# Seguimiento de la ingesta que se ejecuta en el contexto actual (hilo o tarea)
+_current_tracker: ContextVar[Optional[ProgressTracker]] = ContextVar("ingest_progress", default=None)
+
+
+@contextmanager
+def tracking(tracker: ProgressTracker):
+    """Asocia un ProgressTracker a la ingesta que se ejecute dentro del bloque"""
+    token = _current_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current_tracker.reset(token)
+
+
+def report(stage: Optional[str] = None, rows: int = 0, fraction: Optional[float] = None,
+           **details: Any) -> None:
+    """
+    Informa un avance al ProgressTracker activo (no hace nada si no hay ninguno).
+
+    Args:
+        stage: Nueva etapa (None para mantener la actual)
+        rows: Filas procesadas desde la última actualización
+        fraction: Fracción estimada del trabajo completado (0 a 1)
+        **details: Datos adicionales del evento
+
+    Raises:
+        IngestCancelled: Si se pidió cancelar la ingesta activa
+    """
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        tracker.update(stage, rows, fraction, **details)
+
+
+def listening() -> bool:
+    """Indica si hay alguien recibiendo los eventos de la ingesta activa (para omitir trabajo extra si no)"""
+    tracker = _current_tracker.get()
+    return tracker is not None and tracker.has_listeners
@@ -4,6 +4,7 @@ from typing import List, Dict, Any, Optional
 import logging
 import glob
 import numpy as np
+from .unified_ingestor import process_all_files
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -459,117 +460,10 @@ def process_test_files():
         # Generar datos simulados para demo
         generate_demo_data()
     
-    # Procesar archivos
-    try:
-        # Leer archivos
-        beneficiary = pd.read_csv(beneficiary_file) if os.path.exists(beneficiary_file) else pd.DataFrame()
-        inpatient = pd.read_csv(inpatient_file) if os.path.exists(inpatient_file) else pd.DataFrame()
-        outpatient = pd.read_csv(outpatient_file) if os.path.exists(outpatient_file) else pd.DataFrame()
-        provider = pd.read_csv(provider_file) if os.path.exists(provider_file) else pd.DataFrame()
-        
-        # Consolidar claims
-        claims_list = []
-        if not inpatient.empty:
-            claims_list.append(inpatient)
-        if not outpatient.empty:
-            claims_list.append(outpatient)
-        
-        if not claims_list:
-            logger.warning("No se encontraron datos de claims")
-            return
-        
-        claims = pd.concat(claims_list, ignore_index=True)
-        
-        # Merge con beneficiarios si es posible
-        if not beneficiary.empty and 'BeneID' in beneficiary.columns and 'BeneID' in claims.columns:
-            # Seleccionar solo las columnas que existen
-            beneficiary_columns = ['BeneID']
-            if 'DOB' in beneficiary.columns:
-                beneficiary_columns.append('DOB')
-            if 'DOD' in beneficiary.columns:
-                beneficiary_columns.append('DOD')
-            if 'Gender' in beneficiary.columns:
-                beneficiary_columns.append('Gender')
-            
-            claims = claims.merge(beneficiary[beneficiary_columns], on='BeneID', how='left')
-        
-        # Calcular edad si es posible
-        if 'DOB' in claims.columns:
-            claims['DOB'] = pd.to_datetime(claims['DOB'], errors='coerce')
-            reference_date = pd.to_datetime("2009-01-01")
-            claims['Age'] = ((reference_date - claims['DOB']).dt.days / 365.25).fillna(0).astype(int)
-        
-        # Función para calcular porcentaje de hombres (Gender es 1=Masculino, 2=Femenino)
-        def pct_male(genders):
-            if len(genders) == 0:
-                return 0.5
-            return (genders == 1).mean()
-        
-        # Agregar por proveedor para test_final.csv (predicción) - LÓGICA ORIGINAL
-        agg_by_provider = claims.groupby('Provider').agg({
-            'InscClaimAmtReimbursed': ['sum', 'mean'],
-            'ClaimID': 'count',
-            'BeneID': pd.Series.nunique,
-            'Age': 'mean' if 'Age' in claims.columns else lambda x: 0.0,
-            'Gender': pct_male if 'Gender' in claims.columns else lambda x: 0.5,
-        }).reset_index()
-        
-        # Aplanar columnas multi-nivel
-        if isinstance(agg_by_provider.columns, pd.MultiIndex):
-            agg_by_provider.columns = [f"{col[0]}_{col[1]}" if col[1] else col[0] 
-                                     for col in agg_by_provider.columns]
-        
-        # Log para diagnosticar las columnas generadas
-        logger.info(f"Columnas después de aplanar: {list(agg_by_provider.columns)}")
-        
-        # Renombrar columnas correctamente
-        column_mapping = {
-            'InscClaimAmtReimbursed_sum': 'Total_Reimbursed',
-            'InscClaimAmtReimbursed_mean': 'Mean_Reimbursed',
-            'ClaimID_count': 'Claim_Count',
-            'BeneID_nunique': 'Unique_Beneficiaries',
-            'Age_mean': 'Avg_Beneficiary_Age',
-            'Gender_pct_male': 'Pct_Male',
-            'Gender_<lambda>': 'Pct_Male'
-        }
-        
-        # Log para diagnosticar el mapeo
-        logger.info(f"Intentando mapear columnas: {column_mapping}")
-        
-        # Aplicar mapeo de columnas
-        for old_col, new_col in column_mapping.items():
-            if old_col in agg_by_provider.columns:
-                agg_by_provider = agg_by_provider.rename(columns={old_col: new_col})
-                logger.info(f"Mapeado: {old_col} -> {new_col}")
-            else:
-                logger.warning(f"Columna no encontrada para mapeo: {old_col}")
-        
-        # Log después del mapeo
-        logger.info(f"Columnas después del mapeo: {list(agg_by_provider.columns)}")
-        
-        # Verificar que Pct_Male existe, si no, crear con valor por defecto
-        if 'Pct_Male' not in agg_by_provider.columns:
-            agg_by_provider['Pct_Male'] = 0.5
-            logger.warning("Columna Pct_Male no encontrada, usando valor por defecto 0.5")
-        
-        # Limpiar datos
-        final_df = agg_by_provider.fillna(0)
-        
-        # Asegurar tipos de datos correctos
-        for feature in ['Total_Reimbursed', 'Mean_Reimbursed', 'Claim_Count', 'Unique_Beneficiaries', 'Pct_Male']:
-            if feature in final_df.columns:
-                final_df[feature] = pd.to_numeric(final_df[feature], errors='coerce').fillna(0)
-        
-        # Guardar test_final.csv (SIN LIMITAR A 30)
-        final_df.to_csv(OUTPUT_FILE, index=False)
-        logger.info(f"Archivo test_final.csv guardado en: {OUTPUT_FILE} con {len(final_df)} providers")
-        logger.info(f"Columnas finales en test_final.csv: {list(final_df.columns)}")
-        
-        # NOTA: test_dashboard.csv se genera por separado usando dashboard_ingestor.py
-        
-    except Exception as e:
-        logger.error(f"Error procesando archivos: {e}")
-        raise
+    # Procesar archivos en una sola pasada compartida con el dashboard
+    result = process_all_files(INPUT_DIR, final_output=OUTPUT_FILE, dashboard_output=None)
+    if not result["success"] and "error" in result:
+        raise RuntimeError(result["error"])
 
 def generate_demo_data():
     # Implementa la lógica para generar datos simulados
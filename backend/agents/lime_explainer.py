@@ -1,13 +1,12 @@
 import pandas as pd
 import numpy as np
-import joblib
 import os
-import lime
-import lime.lime_tabular
 import logging
 from typing import Dict, List, Any, Tuple, Optional
 import json
 from .predictor import FraudPredictor
+from .columnar_cache import read_table
+from .model_registry import DEFAULT_MODEL_PATH, ModelRegistry, ModelVersion, get_registry
 
 # Configurar logger
 logger = logging.getLogger(__name__)
@@ -18,9 +17,11 @@ class LIMEExplainer:
     LIME es especialmente útil para explicaciones locales de predicciones individuales.
     """
     
-    def __init__(self, model_path: str = "models/xgb_fraud_model.pkl"):
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, registry: Optional[ModelRegistry] = None,
+                 lazy: bool = False):
         self.model_path = model_path
-        self.model = None
+        # Modelo y evaluador compilado compartidos por versión (ver ModelRegistry)
+        self.registry = registry or get_registry(model_path)
         self.explainer = None
         self.feature_names = [
             'Total_Reimbursed', 'Mean_Reimbursed', 'Claim_Count', 
@@ -28,30 +29,35 @@ class LIMEExplainer:
         ]
         self.training_data_path = "data/test_final/test_final.csv"
         
-        # Cargar modelo y crear explainer
+        # Cargar modelo y crear explainer (con lazy, en la primera explicación)
         self._load_model()
-        self._create_explainer()
+        if not lazy:
+            self._create_explainer()
     
     def _load_model(self):
-        """Carga el modelo XGBoost"""
-        try:
-            if not os.path.exists(self.model_path):
-                raise FileNotFoundError(f"Modelo no encontrado en: {self.model_path}")
-            
-            self.model = joblib.load(self.model_path)
-            
-        except Exception as e:
-            raise
+        """Carga el modelo XGBoost (si el registro aún no lo cargó)"""
+        self.registry.current()
+    
+    @property
+    def model(self) -> Any:
+        return self.registry.current().model
+    
+    @property
+    def forest(self) -> Any:
+        return self.registry.current().forest
     
     def _create_explainer(self):
         """
         Crea el explainer LIME con datos reales de entrenamiento.
         """
         try:
+            # LIME (y scikit-learn) solo se importan al crear el explainer
+            import lime.lime_tabular
+            
             # Usar datos reales si están disponibles
             if os.path.exists(self.training_data_path):
                 logger.info(f"Using real training data from: {self.training_data_path}")
-                df = pd.read_csv(self.training_data_path)
+                df = read_table(self.training_data_path, self.feature_names)
                 training_data = df[self.feature_names].values
             else:
                 logger.warning(f"Training data not found at {self.training_data_path}, using synthetic data")
@@ -83,7 +89,10 @@ class LIMEExplainer:
             Diccionario con la explicación LIME
         """
         try:
-            if self.model is None:
+            # Una sola versión del modelo para toda la explicación
+            version = self.registry.current()
+            model = version.model
+            if model is None:
                 raise ValueError("Modelo no está cargado")
                 
             # Convertir features a array
@@ -96,23 +105,25 @@ class LIMEExplainer:
             
             if self.explainer is None:
                 # Si no se puede crear el explainer, devolver explicación basada en el modelo
-                return self._create_model_based_explanation(features, feature_values, X)
+                return self._create_model_based_explanation(features, feature_values, X, version)
             
             # Generar explicación LIME
             try:
                 explanation = self.explainer.explain_instance(
                     np.array(feature_values),  # Asegurar que sea numpy array
-                    self.model.predict_proba,
+                    model.predict_proba,
                     num_features=len(self.feature_names),
                     top_labels=1
                 )
                 
-                # Extraer información de la explicación
+                # Extraer información de la explicación (la fila se puntúa con el evaluador
+                # compilado; las muestras de LIME, un lote grande, con el booster)
+                scorer = version.forest if version.forest is not None else model
                 lime_explanation = {
                     'feature_names': self.feature_names,
                     'feature_values': [float(v) for v in feature_values],  # Convertir a float nativos
-                    'prediction': int(self.model.predict(X)[0]),
-                    'prediction_proba': float(self.model.predict_proba(X)[0][1]),
+                    'prediction': int(scorer.predict(X)[0]),
+                    'prediction_proba': float(scorer.predict_proba(X)[0][1]),
                     'explanation_type': 'LIME'
                 }
                 
@@ -151,7 +162,7 @@ class LIMEExplainer:
                 
             except Exception as lime_error:
                 logger.warning(f"LIME explanation failed, using model-based explanation: {lime_error}")
-                return self._create_model_based_explanation(features, feature_values, X)
+                return self._create_model_based_explanation(features, feature_values, X, version)
             
         except Exception as e:
             logger.error(f"Error in LIME explanation: {e}")
@@ -176,23 +187,27 @@ class LIMEExplainer:
                     }
                 }
     
-    def _create_model_based_explanation(self, features: Dict[str, float], feature_values: List[float], X: np.ndarray) -> Dict[str, Any]:
+    def _create_model_based_explanation(self, features: Dict[str, float], feature_values: List[float], X: np.ndarray,
+                                        version: Optional[ModelVersion] = None) -> Dict[str, Any]:
         """
         Crea una explicación basada en el modelo real cuando LIME no está disponible.
         Usa las feature importances del modelo XGBoost para generar contribuciones reales.
         """
         try:
-            # Verificar que el modelo esté cargado
-            if self.model is None:
+            # Verificar que el modelo esté cargado (misma versión que el resto de la explicación)
+            version = version or self.registry.current()
+            model = version.model
+            if model is None:
                 raise ValueError("Modelo no está cargado")
                 
             # Obtener predicción del modelo
-            prediction = int(self.model.predict(X)[0])
-            prediction_proba = float(self.model.predict_proba(X)[0][1])
+            scorer = version.forest if version.forest is not None else model
+            prediction = int(scorer.predict(X)[0])
+            prediction_proba = float(scorer.predict_proba(X)[0][1])
             
             # Obtener feature importances del modelo
-            if hasattr(self.model, 'feature_importances_'):
-                importances = self.model.feature_importances_
+            if hasattr(model, 'feature_importances_'):
+                importances = model.feature_importances_
             else:
                 # Si no hay feature importances, usar valores por defecto
                 importances = np.array([0.2, 0.2, 0.2, 0.2, 0.2])
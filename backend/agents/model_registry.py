@@ -0,0 +1,324 @@
+import os
+import time
+import hashlib
+import threading
+import logging
+import joblib
+from pathlib import Path
+from typing import Any, Dict, Optional
+from .aggregate_store import file_signature
+from .forest_evaluator import CompiledForest, compile_forest
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Modelo que usan el predictor y los explainers
+DEFAULT_MODEL_PATH = "models/xgb_fraud_model.pkl"
+
+# Cada cuántos segundos se comprueba si el archivo del modelo cambió
+WATCH_INTERVAL_SECONDS = 5.0
+
+# Subdirectorio (junto al .pkl) con la copia del modelo en formato nativo de XGBoost
+NATIVE_DIR_NAME = ".native"
+
+# Atributos del booster nativo que identifican la versión del .pkl de origen
+SOURCE_SIZE_ATTR = "source_size"
+SOURCE_MTIME_ATTR = "source_mtime_ns"
+
+
+def _content_version(path: str) -> str:
+    """Identificador de versión: hash del contenido del archivo (estable entre reinicios)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def native_path_for(model_path) -> Path:
+    """
+    Devuelve la ruta de la copia en formato nativo (UBJSON) de un modelo .pkl.
+
+    Args:
+        model_path: Ruta del modelo serializado con joblib
+
+    Returns:
+        Ruta del archivo .ubj (puede no existir)
+    """
+    model_path = Path(model_path)
+    return model_path.parent / NATIVE_DIR_NAME / f"{model_path.stem}.ubj"
+
+
+def _load_native(model_path: str, signature: Dict[str, int]) -> Optional[Any]:
+    """
+    Carga la copia nativa del modelo si corresponde a la versión actual del .pkl.
+    Se evita deserializar el pickle (y sus advertencias de compatibilidad entre
+    versiones de XGBoost) en cada arranque.
+
+    Returns:
+        XGBClassifier, o None si no hay copia, está desactualizada o no se puede leer
+    """
+    native_path = native_path_for(model_path)
+    if not native_path.exists():
+        return None
+    try:
+        import xgboost as xgb
+        model = xgb.XGBClassifier()
+        model.load_model(native_path)
+        booster = model.get_booster()
+        if (booster.attr(SOURCE_SIZE_ATTR) != str(signature["size"])
+                or booster.attr(SOURCE_MTIME_ATTR) != str(signature["mtime_ns"])):
+            return None
+        return model
+    except Exception as e:
+        logger.warning(f"No se pudo leer la copia nativa del modelo {native_path}: {e}")
+        return None
+
+
+def _save_native(model: Any, model_path: str, signature: Dict[str, int]) -> None:
+    """Guarda la copia nativa del modelo (solo clasificadores de XGBoost)"""
+    if not hasattr(model, "save_model") or not hasattr(model, "get_booster"):
+        return
+    native_path = native_path_for(model_path)
+    try:
+        native_path.parent.mkdir(parents=True, exist_ok=True)
+        booster = model.get_booster()
+        booster.set_attr(**{SOURCE_SIZE_ATTR: str(signature["size"]),
+                            SOURCE_MTIME_ATTR: str(signature["mtime_ns"])})
+        # save_model elige el formato por la extensión: el temporal también termina en .ubj
+        tmp_path = native_path.with_name(f"{native_path.stem}.tmp.ubj")
+        model.save_model(tmp_path)
+        os.replace(tmp_path, native_path)
+    except Exception as e:
+        logger.warning(f"No se pudo guardar la copia nativa del modelo en {native_path}: {e}")
+
+
+class ModelVersion:
+    """
+    Una versión cargada del modelo junto con el estado que se deriva de ella
+    (evaluador compilado y TreeExplainer de SHAP). El modelo no cambia una vez cargado:
+    las peticiones que la tomaron siguen usándola aunque el registro cambie de versión.
+    El estado derivado puede completarse después de publicarla (arranque rápido);
+    mientras tanto forest es None y se predice con el booster.
+    """
+
+    def __init__(self, version_id: str, path: str, model: Any, signature: Dict[str, int]):
+        self.version_id = version_id
+        self.path = path
+        self.model = model
+        self.signature = signature
+        self.loaded_at = time.time()
+        self.forest: Optional[CompiledForest] = None
+        self.prepare_seconds: Optional[float] = None
+        self._tree_explainer = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "ModelVersion":
+        """
+        Lee el modelo de disco: la copia en formato nativo de XGBoost si está al día,
+        y si no el .pkl (que luego se exporta al formato nativo para el próximo arranque).
+
+        Raises:
+            FileNotFoundError: Si el archivo no existe
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Modelo no encontrado en: {path}")
+        signature = file_signature(path)
+        version_id = _content_version(path)
+        model = _load_native(path, signature)
+        if model is None:
+            model = joblib.load(path)
+            _save_native(model, path, signature)
+        return cls(version_id, path, model, signature)
+
+    def prepare(self, explainers: bool = True) -> "ModelVersion":
+        """
+        Construye el estado derivado antes de publicar la versión.
+
+        Args:
+            explainers: Crear también el TreeExplainer (si no, se crea en el primer uso)
+        """
+        started = time.perf_counter()
+        self.forest = compile_forest(self.model)
+        self.prepare_seconds = time.perf_counter() - started
+        if explainers:
+            try:
+                self.tree_explainer()
+            except Exception as e:
+                logger.warning(f"No se pudo crear el TreeExplainer de la versión {self.version_id}: {e}")
+        return self
+
+    def prepare_in_background(self) -> threading.Thread:
+        """Compila el evaluador en un hilo aparte; hasta que termine se usa el booster"""
+        def compile_version():
+            started = time.perf_counter()
+            self.forest = compile_forest(self.model)
+            self.prepare_seconds = time.perf_counter() - started
+
+        thread = threading.Thread(target=compile_version, name="model-prepare", daemon=True)
+        thread.start()
+        return thread
+
+    def tree_explainer(self) -> Any:
+        """TreeExplainer de SHAP del modelo (se crea una sola vez por versión)"""
+        with self._lock:
+            if self._tree_explainer is None:
+                import shap
+                self._tree_explainer = shap.TreeExplainer(self.model)
+            return self._tree_explainer
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Datos de la versión para la API"""
+        return {
+            "version_id": self.version_id,
+            "model_path": self.path,
+            "loaded_at": self.loaded_at,
+            "compiled_evaluator": self.forest is not None,
+            "prepare_seconds": round(self.prepare_seconds, 4) if self.prepare_seconds is not None else None,
+        }
+
+
+class ModelRegistry:
+    """
+    Registro de un modelo compartido por FraudPredictor, SHAPExplainer y LIMEExplainer:
+    cada versión se deserializa una sola vez y todos usan la misma instancia.
+
+    Con start_watching, un hilo vigila el archivo del modelo; cuando cambia, la nueva
+    versión se carga y se prepara en ese hilo, y luego se publica reemplazando una sola
+    referencia. Las peticiones en curso conservan la versión que tomaron con current().
+    Si la carga falla se mantiene la versión anterior.
+
+    Con fast_start, la primera versión se publica apenas se carga: el evaluador
+    compilado se prepara en segundo plano y el TreeExplainer en el primer uso.
+    """
+
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, fast_start: bool = False):
+        self.model_path = model_path
+        self.fast_start = fast_start
+        self._current: Optional[ModelVersion] = None
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # Firma del archivo ya procesado (cargado o con error), para no reintentar sin cambios
+        self._seen_signature: Optional[Dict[str, int]] = None
+        self.last_error: Optional[str] = None
+        self.swaps = 0
+
+    def current(self) -> ModelVersion:
+        """
+        Versión publicada del modelo (la primera llamada la carga).
+
+        Raises:
+            FileNotFoundError: Si todavía no hay versión y el archivo no existe
+        """
+        version = self._current
+        if version is None:
+            with self._lock:
+                if self._current is None:
+                    version = ModelVersion.load(self.model_path)
+                    if self.fast_start:
+                        version.prepare_in_background()
+                    else:
+                        version.prepare()
+                    self._publish(version)
+                version = self._current
+        return version
+
+    def reload(self, force: bool = False) -> Optional[ModelVersion]:
+        """
+        Carga el archivo del modelo si cambió y publica la nueva versión.
+
+        Args:
+            force: Recargar aunque la firma del archivo no haya cambiado
+
+        Returns:
+            La nueva versión, o None si no hubo cambios
+        """
+        with self._lock:
+            signature = file_signature(self.model_path)
+            if not force and signature == self._seen_signature:
+                return None
+            self._seen_signature = signature
+            try:
+                version = ModelVersion.load(self.model_path)
+                if self._current is not None and version.version_id == self._current.version_id:
+                    return None
+                self._publish(version.prepare(explainers=not self.fast_start))
+                self.swaps += 1
+                self.last_error = None
+                return version
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"No se pudo cargar la nueva versión del modelo {self.model_path}: {e}")
+                raise
+
+    def start_watching(self, interval: float = WATCH_INTERVAL_SECONDS) -> None:
+        """Inicia el hilo que recarga el modelo cuando cambia su archivo"""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def status(self) -> Dict[str, Any]:
+        """Versión publicada y estado de la vigilancia para la API"""
+        version = self._current
+        return {
+            "current": version.to_dict() if version is not None else None,
+            "watching": self._watcher is not None and self._watcher.is_alive(),
+            "fast_start": self.fast_start,
+            "swaps": self.swaps,
+            "last_error": self.last_error,
+        }
+
+    def _publish(self, version: ModelVersion) -> None:
+        previous = self._current
+        self._current = version
+        self._seen_signature = version.signature
+        if previous is None:
+            logger.info(f"Modelo {self.model_path} cargado (versión {version.version_id})")
+        else:
+            logger.info(f"Modelo {self.model_path} actualizado: {previous.version_id} -> {version.version_id}")
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                if os.path.exists(self.model_path):
+                    self.reload()
+            except Exception:
+                # El error queda en last_error; se reintenta cuando el archivo vuelva a cambiar
+                pass
+
+
+_registries: Dict[str, ModelRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(model_path: str = DEFAULT_MODEL_PATH, fast_start: Optional[bool] = None) -> ModelRegistry:
+    """
+    Registro compartido de un archivo de modelo (uno por ruta en el proceso).
+
+    Args:
+        model_path: Ruta del modelo
+        fast_start: Modo de arranque del registro (None conserva el actual);
+            solo afecta a las cargas posteriores
+
+    Returns:
+        ModelRegistry de esa ruta
+    """
+    key = os.path.abspath(model_path)
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = _registries[key] = ModelRegistry(model_path)
+        if fast_start is not None:
+            registry.fast_start = fast_start
+        return registry
@@ -0,0 +1,288 @@
+import pandas as pd
+import os
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from pathlib import Path
+from typing import Callable, Collection, Dict, List, Optional, Tuple
+from .provider_aggregates import ProviderAggregateState, StateReducer
+from .aggregate_store import provider_buckets
+from .schema_registry import parse_csv_block
+from .columnar_cache import is_cache_fresh, iter_table_chunks
+from .compression import compression_for
+from .data_quality import DataQualityError, DataQualityReport, close_file, collecting, merge_report, observe_chunk
+from .ingest_progress import report
+from .unified_ingestor import CLAIM_COLUMNS, claim_columns, load_beneficiaries, join_beneficiaries, READ_PROGRESS_SHARE
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Filas por bloque al leer los archivos que no se pueden dividir por bytes
+# (comprimidos o ya convertidos al caché columnar)
+DEFAULT_SPLIT_CHUNK_SIZE = 500_000
+
+# Particiones por proceso (más particiones que procesos equilibran la carga)
+PARTITIONS_PER_WORKER = 4
+
+# Tamaño máximo de un rango de bytes (acota la memoria de cada proceso)
+MAX_RANGE_BYTES = 64 * 1024 * 1024
+
+# Beneficiarios ya leídos en este proceso del pool (ruta, tabla)
+_worker_beneficiary: Tuple[Optional[str], Optional[pd.DataFrame]] = (None, None)
+
+
+def split_claim_file(path: Path, n_ranges: int, max_range_bytes: int = MAX_RANGE_BYTES) -> List[Tuple[int, int]]:
+    """
+    Divide un CSV sin comprimir en rangos de bytes que empiezan y terminan en un
+    salto de línea, para que cada proceso lea y parsee el suyo. Requiere que ningún
+    campo entre comillas contenga saltos de línea (ver has_quoted_newlines).
+
+    Args:
+        path: Archivo de claims
+        n_ranges: Número de rangos deseado
+        max_range_bytes: Tamaño máximo de cada rango
+
+    Returns:
+        Lista de rangos (inicio, fin) sin incluir la línea de encabezado
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        start = len(f.readline())
+        target = max(-(-(size - start) // max(n_ranges, 1)), -(-(size - start) // max_range_bytes), 1)
+        ranges = []
+        while start < size:
+            end = start + target
+            if end < size:
+                f.seek(end)
+                end += len(f.readline())
+            end = min(end, size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def has_quoted_newlines(path: Path, block_bytes: int = MAX_RANGE_BYTES) -> bool:
+    """
+    Indica si algún campo entre comillas del CSV contiene un salto de línea, en cuyo
+    caso el archivo no se puede dividir en rangos que terminen en un salto de línea.
+
+    Solo se examinan las líneas de los bloques que contienen comillas: una línea con
+    un número impar de comillas tiene un campo que continúa en la siguiente (las
+    comillas escapadas "" no cambian la paridad).
+
+    Args:
+        path: Archivo de claims sin comprimir
+        block_bytes: Bytes leídos por bloque
+
+    Returns:
+        True si hay campos entre comillas con saltos de línea
+    """
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_bytes)
+            if not block:
+                return False
+            block += f.readline()
+            if b'"' in block and any(line.count(b'"') % 2 for line in block.split(b'\n')):
+                return True
+
+
+def _claim_blocks(path: str, byte_range: Optional[Tuple[int, int]], chunk_size: int, columns: List[str]):
+    """Bloques de claims de un rango de bytes, o del archivo completo si no se puede dividir"""
+    if byte_range is None:
+        yield from iter_table_chunks(path, chunk_size, columns)
+        return
+    start, end = byte_range
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(start)
+        data = f.read(end - start)
+    yield parse_csv_block(header + data, path, columns)
+
+
+def _split_state(state: ProviderAggregateState, n_partitions: int) -> List[ProviderAggregateState]:
+    """Reparte un estado en particiones por hash de Provider (las mismas en todos los procesos)"""
+    sums_buckets = provider_buckets(state.sums.index.get_level_values('Provider'), n_partitions)
+    distinct_buckets = {source: provider_buckets(pairs['Provider'], n_partitions)
+                        for source, pairs in state.distinct.items()}
+    sketch_buckets = {source: provider_buckets(sketch.providers, n_partitions)
+                      for source, sketch in state.sketches.items()}
+    periods = _split_state(state.periods, n_partitions) if state.periods is not None else None
+    physician_buckets = provider_buckets(state.physicians['Provider'], n_partitions) \
+        if state.physicians is not None else None
+    code_buckets = provider_buckets(state.codes.providers, n_partitions) if state.codes is not None else None
+    signature_buckets = provider_buckets(state.signatures['Provider'], n_partitions) \
+        if state.signatures is not None else None
+    pieces = []
+    for p in range(n_partitions):
+        pieces.append(ProviderAggregateState(
+            state.sums[sums_buckets == p],
+            {source: pairs[distinct_buckets[source] == p] for source, pairs in state.distinct.items()},
+            {source: sketch.subset(sketch.providers[sketch_buckets[source] == p])
+             for source, sketch in state.sketches.items()},
+            periods[p] if periods is not None else None,
+            state.physicians[physician_buckets == p] if state.physicians is not None else None,
+            state.codes.subset(state.codes.providers[code_buckets == p]) if state.codes is not None else None,
+            state.signatures[signature_buckets == p] if state.signatures is not None else None,
+        ))
+    return pieces
+
+
+def _aggregate_range(path: str, byte_range: Optional[Tuple[int, int]], beneficiary_path: Optional[str],
+                     n_partitions: int, chunk_size: int,
+                     sketch_precision: Optional[int] = None,
+                     products: Collection[str] = ()) -> Tuple[Optional[List[ProviderAggregateState]], DataQualityReport, int]:
+    """
+    Lee, valida y agrega un rango de un archivo de claims en un proceso del pool.
+
+    Args:
+        path: Archivo de claims
+        byte_range: Rango de bytes a leer (None para el archivo completo)
+        beneficiary_path: Tabla de beneficiarios serializada por el proceso principal
+        n_partitions: Número de particiones por hash de Provider
+        chunk_size: Filas por bloque si se lee el archivo completo
+        sketch_precision: Precisión HyperLogLog para las features 'nunique' (None = exacto)
+        products: Productos de provider_aggregates.CLAIM_PRODUCTS a calcular en la misma pasada
+
+    Returns:
+        Estado del rango repartido por partición (None si la validación falló),
+        informe de calidad de sus bloques y número de claims leídos
+    """
+    global _worker_beneficiary
+    beneficiary = None
+    if beneficiary_path is not None:
+        if _worker_beneficiary[0] != beneficiary_path:
+            _worker_beneficiary = (beneficiary_path, pd.read_pickle(beneficiary_path))
+        beneficiary = _worker_beneficiary[1]
+
+    quality = DataQualityReport()
+    reducer = StateReducer()
+    rows = 0
+    try:
+        with collecting(quality):
+            for chunk in _claim_blocks(path, byte_range, chunk_size, claim_columns(products)):
+                observe_chunk(Path(path), chunk, CLAIM_COLUMNS)
+                chunk = chunk[chunk['Provider'].notna()] if 'Provider' in chunk.columns else chunk
+                rows += len(chunk)
+                if beneficiary is not None:
+                    chunk = join_beneficiaries(chunk, beneficiary)
+                reducer.add(ProviderAggregateState.from_claims(chunk, sketch_precision=sketch_precision,
+                                                               products=products))
+    except DataQualityError:
+        # El error queda en el informe; el proceso principal lo incorpora y detiene la ingesta
+        return None, quality, rows
+    state = reducer.result()
+    if state.sums.empty:
+        return [], quality, rows
+    return _split_state(state, n_partitions), quality, rows
+
+
+def aggregate_parallel(files: Dict[str, List[Path]], workers: int,
+                       chunk_size: Optional[int] = None,
+                       n_partitions: Optional[int] = None,
+                       sketch_precision: Optional[int] = None,
+                       on_partition: Optional[Callable[[ProviderAggregateState], None]] = None,
+                       products: Collection[str] = ()) -> ProviderAggregateState:
+    """
+    Agrega los claims en paralelo: cada proceso lee, parsea y agrega un rango de bytes
+    de un archivo, y solo sus agregados parciales vuelven al proceso principal.
+
+    Los archivos sin comprimir se dividen en rangos que terminan en un salto de línea;
+    los comprimidos, con caché columnar o con saltos de línea dentro de campos entre
+    comillas (ver has_quoted_newlines) se leen completos en un solo proceso. Cada
+    proceso devuelve su estado repartido por hash de Provider, y el proceso principal
+    combina cada partición con las de los demás rangos. Como ningún proveedor aparece
+    en dos particiones, las particiones combinadas se concatenan sin volver a agrupar.
+
+    Args:
+        files: Rutas por tipo de archivo (ver unified_ingestor.find_input_files)
+        workers: Número de procesos del pool
+        chunk_size: Filas por bloque al leer archivos que no se pueden dividir por bytes
+        n_partitions: Número de particiones (por defecto workers * PARTITIONS_PER_WORKER)
+        sketch_precision: Precisión HyperLogLog para las features 'nunique' (None = exacto)
+        on_partition: Función que recibe el estado de cada partición al terminar de combinarla
+            (sus proveedores ya no cambian, por lo que se pueden finalizar)
+        products: Productos de provider_aggregates.CLAIM_PRODUCTS a calcular en la misma pasada
+
+    Returns:
+        Estado agregado por proveedor, idéntico al de la ruta en serie
+    """
+    n_partitions = n_partitions or workers * PARTITIONS_PER_WORKER
+    chunk_size = chunk_size or DEFAULT_SPLIT_CHUNK_SIZE
+
+    claim_files = [Path(path) for claim_type in ['inpatient', 'outpatient'] for path in files.get(claim_type, [])]
+    total_bytes = sum(os.path.getsize(path) for path in claim_files) or 1
+    tasks = []
+    for path in claim_files:
+        splittable = compression_for(path) is None and not is_cache_fresh(path)
+        if splittable and has_quoted_newlines(path):
+            logger.info(f"{path.name} tiene saltos de línea entre comillas, se lee completo en un proceso")
+            splittable = False
+        if splittable:
+            # Rangos proporcionales al tamaño del archivo
+            n_ranges = max(1, round(workers * PARTITIONS_PER_WORKER * os.path.getsize(path) / total_bytes))
+            tasks.extend((path, byte_range, byte_range[1] - byte_range[0])
+                         for byte_range in split_claim_file(path, n_ranges))
+        else:
+            tasks.append((path, None, os.path.getsize(path)))
+    if not tasks:
+        return ProviderAggregateState()
+    pending_ranges = {path: sum(1 for task in tasks if task[0] == path) for path in claim_files}
+
+    with tempfile.TemporaryDirectory(prefix="ingest_ranges_") as tmp_dir:
+        # Los beneficiarios se leen una vez; cada proceso los carga una sola vez
+        beneficiary = load_beneficiaries(files)
+        beneficiary_path = None
+        if not beneficiary.empty:
+            beneficiary_path = os.path.join(tmp_dir, "beneficiary.pkl")
+            beneficiary.to_pickle(beneficiary_path)
+        del beneficiary
+
+        logger.info(f"Agregación paralela: {len(claim_files)} archivos en {len(tasks)} rangos, "
+                    f"{n_partitions} particiones, {workers} procesos")
+        report("reading_claims")
+        reducers = [StateReducer() for _ in range(n_partitions)]
+        total_rows = 0
+        done_bytes = 0
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            aggregate = partial(_aggregate_range, beneficiary_path=beneficiary_path, n_partitions=n_partitions,
+                                chunk_size=chunk_size, sketch_precision=sketch_precision, products=products)
+            futures = {pool.submit(aggregate, str(path), byte_range): (path, size)
+                       for path, byte_range, size in tasks}
+            for done, future in enumerate(as_completed(futures), start=1):
+                path, size = futures[future]
+                pieces, quality, rows = future.result()
+                merge_report(quality)
+                for p, piece in enumerate(pieces or []):
+                    if not piece.sums.empty:
+                        reducers[p].add(piece)
+                total_rows += rows
+                done_bytes += size
+                pending_ranges[path] -= 1
+                if pending_ranges[path] == 0:
+                    close_file(path)
+                report(rows=rows, fraction=READ_PROGRESS_SHARE * done_bytes / total_bytes,
+                       file=path.name, ranges_done=done, ranges_total=len(tasks))
+        finally:
+            # Si se cancela o falla la validación, no se inician los rangos pendientes
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    if total_rows == 0:
+        return ProviderAggregateState()
+
+    report("aggregating_partitions")
+    states = []
+    for p, reducer in enumerate(reducers, start=1):
+        state = reducer.result()
+        if not state.sums.empty:
+            states.append(state)
+            if on_partition is not None:
+                on_partition(state)
+        report(fraction=READ_PROGRESS_SHARE + 0.1 * p / n_partitions,
+               partitions_done=p, partitions_total=n_partitions)
+
+    # Las particiones son disjuntas por Provider: basta con concatenar
+    return ProviderAggregateState.concat(states)
@@ -0,0 +1,158 @@
+import pandas as pd
+import numpy as np
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from .columnar_cache import read_table, iter_table_chunks
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Columnas de médicos de los claims
+PHYSICIAN_COLUMNS = ['AttendingPhysician', 'OperatingPhysician', 'OtherPhysician']
+
+# Columnas de salida de test_network.csv
+NETWORK_COLUMNS = [
+    'Provider', 'Physician_Count', 'Shared_Physician_Degree',
+    'Flagged_Neighbors', 'Flagged_Physician_Share', 'Component_Size'
+]
+
+
+def physician_pairs(claims: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pares (Provider, Physician) distintos de un bloque de claims, con los médicos
+    de las tres columnas de médicos apilados en una sola columna.
+
+    Args:
+        claims: Claims con Provider y alguna de PHYSICIAN_COLUMNS
+
+    Returns:
+        DataFrame con columnas Provider y Physician (texto, sin nulos ni duplicados)
+    """
+    columns = [col for col in PHYSICIAN_COLUMNS if col in claims.columns]
+    if not columns:
+        return pd.DataFrame(columns=['Provider', 'Physician'])
+    providers = np.asarray(claims['Provider'].astype(str), dtype=object)
+    pairs = pd.DataFrame({
+        'Provider': np.tile(providers, len(columns)),
+        'Physician': np.concatenate([np.asarray(claims[col].astype(object), dtype=object) for col in columns]),
+    })
+    return pairs.dropna().astype(str).drop_duplicates(ignore_index=True)
+
+
+def load_physician_pairs(files: Dict[str, List[Path]], chunk_size: Optional[int] = None) -> pd.DataFrame:
+    """
+    Lee solo Provider y las columnas de médicos de los archivos de claims.
+
+    Args:
+        files: Rutas por tipo de archivo (ver unified_ingestor.find_input_files)
+        chunk_size: Si se indica, lee por bloques de este tamaño
+
+    Returns:
+        Pares (Provider, Physician) distintos de todos los claims
+    """
+    columns = ['Provider'] + PHYSICIAN_COLUMNS
+    pairs = []
+    for claim_type in ['inpatient', 'outpatient']:
+        for file in files.get(claim_type, []):
+            chunks = iter_table_chunks(file, chunk_size, columns) if chunk_size else [read_table(file, columns)]
+            for chunk in chunks:
+                pairs.append(physician_pairs(chunk))
+    if not pairs:
+        return pd.DataFrame(columns=['Provider', 'Physician'])
+    return pd.concat(pairs, ignore_index=True).drop_duplicates(ignore_index=True)
+
+
+def load_flagged_providers(path: Path) -> List[str]:
+    """
+    Lee la lista de proveedores señalados (columna Provider; si hay columna
+    PotentialFraud, solo las filas con 'Yes').
+
+    Args:
+        path: Ruta del CSV de proveedores señalados
+
+    Returns:
+        Proveedores señalados (vacío si el archivo no existe)
+    """
+    if not Path(path).exists():
+        return []
+    flagged = pd.read_csv(path, dtype=str)
+    if 'PotentialFraud' in flagged.columns:
+        flagged = flagged[flagged['PotentialFraud'].str.strip().str.lower() == 'yes']
+    return flagged['Provider'].dropna().unique().tolist()
+
+
+def compute_network_features(pairs: pd.DataFrame, providers: Optional[Iterable[str]] = None,
+                             flagged: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Calcula features de red proveedor-médico con álgebra lineal dispersa.
+
+    B es la matriz de incidencia proveedor x médico (CSR binaria). B @ B.T da los
+    proveedores que comparten al menos un médico; B.T @ f cuenta cuántos proveedores
+    señalados atiende cada médico; las componentes conexas se calculan sobre el
+    grafo bipartito [[0, B], [B.T, 0]] sin materializar pares de proveedores.
+
+    Args:
+        pairs: Pares (Provider, Physician) distintos (ver load_physician_pairs)
+        providers: Proveedores a incluir en la salida (por defecto los de pairs);
+            los que no tienen médicos quedan con grado 0 y componente de tamaño 1
+        flagged: Proveedores señalados como fraude
+
+    Returns:
+        DataFrame con las columnas de NETWORK_COLUMNS, una fila por proveedor
+    """
+    provider_index = pd.Index(pd.unique(pairs['Provider'].astype(str)), name='Provider')
+    if providers is not None:
+        provider_index = provider_index.append(pd.Index(providers, dtype=str)).unique()
+    n_providers = len(provider_index)
+
+    rows = provider_index.get_indexer(pairs['Provider'].astype(str))
+    cols, physicians = pd.factorize(pairs['Physician'].astype(str))
+    n_physicians = len(physicians)
+    incidence = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float64), (rows, cols)),
+        shape=(n_providers, n_physicians)
+    )
+    incidence.data[:] = 1.0  # Por si hubiera pares repetidos
+
+    # Vecinos: proveedores que comparten al menos un médico (sin contar al propio)
+    shared = incidence @ incidence.T
+    shared.setdiag(0)
+    shared.eliminate_zeros()
+    shared.data[:] = 1.0
+    degree = np.asarray(shared.sum(axis=1)).ravel()
+
+    flagged_vector = np.zeros(n_providers)
+    if flagged is not None:
+        flagged_positions = provider_index.get_indexer(pd.Index(list(flagged), dtype=str))
+        flagged_vector[flagged_positions[flagged_positions >= 0]] = 1.0
+    flagged_neighbors = shared @ flagged_vector
+
+    # Médicos que atienden a algún proveedor señalado distinto del propio
+    flagged_per_physician = incidence.T @ flagged_vector
+    coo = incidence.tocoo()
+    hits = (flagged_per_physician[coo.col] - flagged_vector[coo.row]) > 0
+    physician_count = np.asarray(incidence.sum(axis=1)).ravel()
+    flagged_physicians = np.bincount(coo.row, weights=hits, minlength=n_providers)
+    flagged_share = np.divide(flagged_physicians, physician_count,
+                              out=np.zeros(n_providers), where=physician_count > 0)
+
+    # Componentes conexas del grafo bipartito proveedor-médico
+    bipartite = sparse.bmat([[None, incidence], [incidence.T, None]], format='csr')
+    _, labels = connected_components(bipartite, directed=False)
+    provider_labels = labels[:n_providers]
+    component_size = np.bincount(provider_labels)[provider_labels]
+
+    logger.info(f"Red proveedor-médico: {n_providers} providers, {n_physicians} médicos, "
+                f"{len(pairs)} relaciones")
+    return pd.DataFrame({
+        'Provider': provider_index.astype(str),
+        'Physician_Count': physician_count.astype(np.int64),
+        'Shared_Physician_Degree': degree.astype(np.int64),
+        'Flagged_Neighbors': flagged_neighbors.astype(np.int64),
+        'Flagged_Physician_Share': flagged_share,
+        'Component_Size': component_size.astype(np.int64),
+    }, columns=NETWORK_COLUMNS).sort_values('Provider', ignore_index=True)
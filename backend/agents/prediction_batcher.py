@@ -0,0 +1,125 @@
+import asyncio
+import time
+import logging
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from .predictor import FraudPredictor, SMALL_BATCH_ROWS
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Tiempo máximo que una petición espera a que se le sumen otras (milisegundos)
+DEFAULT_MAX_WAIT_MS = 2.0
+
+# Filas máximas por lote (hasta SMALL_BATCH_ROWS el lote se evalúa con el evaluador compilado)
+DEFAULT_MAX_BATCH_SIZE = SMALL_BATCH_ROWS
+
+# Lotes que pueden puntuarse a la vez (el evaluador compilado libera el GIL)
+DEFAULT_SCORING_WORKERS = 2
+
+
+class PredictionBatcher:
+    """
+    Agrupa predicciones individuales concurrentes en lotes.
+
+    Cada petición se encola y espera su resultado. Si no hay ningún lote
+    puntuándose, la cola se despacha en la siguiente vuelta del event loop (sin
+    esperar la ventana), así que sin carga la latencia no aumenta. Mientras hay
+    lotes puntuándose, las peticiones que llegan se acumulan hasta max_batch_size
+    o hasta que vence la ventana de max_wait_ms, y se puntúan con una sola llamada
+    a FraudPredictor.predict_rows en un hilo aparte (sin bloquear el event loop).
+    """
+
+    def __init__(self, predictor: FraudPredictor, max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, scoring_workers: int = DEFAULT_SCORING_WORKERS):
+        if max_batch_size <= 0:
+            raise ValueError("max_batch_size debe ser mayor a 0")
+        self.predictor = predictor
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._executor = ThreadPoolExecutor(max_workers=scoring_workers, thread_name_prefix="predict-batch")
+        self._pending: List[Tuple[str, np.ndarray, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.Handle] = None
+        self._flush_now = False
+        self._scoring = 0
+        self._scoring_slots = scoring_workers
+        # Estadísticas para /health
+        self.requests = 0
+        self.batches = 0
+        self.largest_batch = 0
+
+    async def predict(self, provider: str, features: Sequence[float]) -> Dict[str, Any]:
+        """
+        Puntúa una fila junto con las peticiones concurrentes.
+
+        Args:
+            provider: Identificador del proveedor
+            features: Valores en el orden de predictor.feature_names
+
+        Returns:
+            Predicción con Provider, Prediccion y Probabilidad_Fraude (ver PredictionBatch.to_records)
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((provider, np.asarray(features, dtype=np.float32), future))
+        self.requests += 1
+        # Lote lleno, o nada puntuándose: se despacha en la siguiente vuelta del loop
+        # (las peticiones que llegaron en la misma vuelta van en el mismo lote)
+        self._schedule_flush(loop, now=len(self._pending) >= self.max_batch_size or self._scoring == 0)
+        return await future
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de peticiones y lotes"""
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_batch_size": self.max_batch_size,
+        }
+
+    def _schedule_flush(self, loop: asyncio.AbstractEventLoop, now: bool) -> None:
+        if self._flush_handle is not None:
+            if self._flush_now or not now:
+                return
+            # Se adelanta el despacho programado al vencer la ventana
+            self._flush_handle.cancel()
+        self._flush_now = now
+        self._flush_handle = loop.call_soon(self._flush) if now else loop.call_later(self.max_wait, self._flush)
+
+    def _flush(self) -> None:
+        self._flush_handle = None
+        while self._pending and self._scoring < self._scoring_slots:
+            batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+            self._scoring += 1
+            asyncio.ensure_future(self._score(batch))
+
+    async def _score(self, batch: List[Tuple[str, np.ndarray, asyncio.Future]]) -> None:
+        loop = asyncio.get_running_loop()
+        providers = [provider for provider, _, _ in batch]
+        X = np.vstack([features for _, features, _ in batch])
+        started = time.perf_counter()
+        try:
+            records = await loop.run_in_executor(
+                self._executor, lambda: self.predictor.predict_rows(providers, X).to_records()
+            )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, _, future), record in zip(batch, records):
+                # La petición pudo cancelarse (cliente desconectado) mientras se puntuaba
+                if not future.done():
+                    future.set_result(record)
+        finally:
+            self._scoring -= 1
+            self.batches += 1
+            self.largest_batch = max(self.largest_batch, len(batch))
+            logger.debug(f"Lote de {len(batch)} predicciones en {(time.perf_counter() - started) * 1000:.2f} ms")
+            # Lo acumulado mientras se puntuaba sale sin esperar la ventana
+            if self._pending:
+                self._schedule_flush(loop, now=True)
@@ -1,8 +1,21 @@
 import pandas as pd
-import joblib
-import os
 import numpy as np
-from typing import List, Dict, Any, Tuple
+import logging
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+from .columnar_cache import read_table
+from .model_registry import DEFAULT_MODEL_PATH, ModelRegistry, ModelVersion, get_registry
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Umbral de probabilidad de fraude por defecto (el de model.predict en XGBoost binario)
+DEFAULT_THRESHOLD = 0.5
+
+# Hasta este número de filas se puntúa con el evaluador compilado; en lotes mayores
+# el booster de XGBoost (multihilo) es más rápido
+SMALL_BATCH_ROWS = 128
 
 def convert_numpy_types(obj):
     """Convierte tipos numpy a tipos nativos de Python para serialización JSON"""
@@ -19,14 +32,47 @@ def convert_numpy_types(obj):
     else:
         return obj
 
+@dataclass(frozen=True)
+class PredictionBatch:
+    """
+    Predicciones de un lote en columnas NumPy (una posición por proveedor).
+    Los diccionarios por proveedor solo se generan al responder (ver to_records).
+    """
+    providers: np.ndarray
+    probabilities: np.ndarray
+    predictions: np.ndarray
+    
+    def __len__(self) -> int:
+        return len(self.providers)
+    
+    def to_records(self, decimals: int = 4) -> List[Dict[str, Any]]:
+        """
+        Convierte el lote en la lista de predicciones por Provider de la API.
+        
+        Args:
+            decimals: Decimales de Probabilidad_Fraude
+            
+        Returns:
+            Lista de diccionarios con Provider, Prediccion y Probabilidad_Fraude (tipos nativos)
+        """
+        return [
+            {'Provider': provider, 'Prediccion': prediction, 'Probabilidad_Fraude': round(probability, decimals)}
+            for provider, prediction, probability in zip(
+                self.providers.tolist(), self.predictions.tolist(), self.probabilities.tolist()
+            )
+        ]
+
 class FraudPredictor:
     """
     Agente para cargar el modelo XGBoost y realizar predicciones de fraude médico.
     """
     
-    def __init__(self, model_path: str = "models/xgb_fraud_model.pkl"):
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, threshold: float = DEFAULT_THRESHOLD,
+                 registry: Optional[ModelRegistry] = None):
         self.model_path = model_path
-        self.model = None
+        self.threshold = threshold
+        # El modelo se comparte con los explainers a través del registro (una carga por versión)
+        self.registry = registry or get_registry(model_path)
         self.feature_names = [
             'Total_Reimbursed', 'Mean_Reimbursed', 'Claim_Count', 
             'Unique_Beneficiaries', 'Pct_Male'
@@ -36,104 +82,141 @@ class FraudPredictor:
         self._load_model()
     
     def _load_model(self):
-        """Carga el modelo XGBoost desde el archivo .pkl"""
-        try:
-            if not os.path.exists(self.model_path):
-                raise FileNotFoundError(f"Modelo no encontrado en: {self.model_path}")
+        """Carga el modelo XGBoost desde el archivo .pkl (si el registro aún no lo cargó)"""
+        self.registry.current()
+    
+    @property
+    def model(self) -> Any:
+        """Modelo de la versión publicada"""
+        return self.registry.current().model
+    
+    @property
+    def forest(self) -> Any:
+        """Evaluador compilado de la versión publicada (None si no está disponible)"""
+        return self.registry.current().forest
+    
+    def score(self, X: np.ndarray) -> np.ndarray:
+        """
+        Probabilidad de fraude de cada fila con una sola pasada del modelo.
+        Los lotes de hasta SMALL_BATCH_ROWS filas se evalúan con el evaluador compilado.
+        
+        Args:
+            X: Matriz de features con las columnas en el orden de feature_names
             
-            self.model = joblib.load(self.model_path)
+        Returns:
+            Array float64 con la probabilidad de la clase positiva
+        """
+        # Una sola versión para todo el lote, aunque el registro la reemplace mientras tanto
+        version = self.registry.current()
+        X = np.asarray(X, dtype=np.float32)
+        scorer = version.forest if version.forest is not None and len(X) <= SMALL_BATCH_ROWS else version.model
+        return scorer.predict_proba(X)[:, 1].astype(np.float64)
+    
+    def labels(self, probabilities: np.ndarray, threshold: Optional[float] = None) -> np.ndarray:
+        """
+        Clase predicha a partir de las probabilidades (sin volver a evaluar el modelo).
+        Con el umbral por defecto coincide con model.predict.
+        
+        Args:
+            probabilities: Probabilidades de fraude (ver score)
+            threshold: Umbral de fraude (por defecto self.threshold)
             
-        except Exception as e:
-            raise
+        Returns:
+            Array int64 con la clase de cada fila
+        """
+        threshold = self.threshold if threshold is None else threshold
+        return np.asarray(self.model.classes_)[(probabilities > threshold).astype(np.intp)].astype(np.int64)
     
-    def predict_from_csv(self, csv_path: str) -> List[Dict[str, Any]]:
+    def predict_rows(self, providers: Sequence[str], X: np.ndarray,
+                     threshold: Optional[float] = None) -> PredictionBatch:
+        """
+        Puntúa filas ya armadas como matriz (sin pasar por un DataFrame), el camino
+        de menor latencia para una predicción individual.
+        
+        Args:
+            providers: Identificador de cada fila
+            X: Matriz de features con las columnas en el orden de feature_names
+            threshold: Umbral de fraude (por defecto self.threshold)
+            
+        Returns:
+            PredictionBatch con proveedores, probabilidades y clases
+        """
+        probabilities = self.score(X)
+        return PredictionBatch(
+            providers=np.asarray(providers, dtype=object),
+            probabilities=probabilities,
+            predictions=self.labels(probabilities, threshold),
+        )
+    
+    def predict_batch(self, df: pd.DataFrame, threshold: Optional[float] = None) -> PredictionBatch:
+        """
+        Puntúa un lote de proveedores: el modelo se evalúa una sola vez y la clase
+        se deriva de la probabilidad con el umbral.
+        
+        Args:
+            df: DataFrame con Provider y las columnas de feature_names
+            threshold: Umbral de fraude (por defecto self.threshold)
+            
+        Returns:
+            PredictionBatch con proveedores, probabilidades y clases
+        """
+        required_columns = ['Provider'] + self.feature_names
+        missing_columns = [col for col in required_columns if col not in df.columns]
+        if missing_columns:
+            raise ValueError(f"Columnas faltantes: {missing_columns}")
+        
+        return self.predict_rows(df['Provider'].astype(str).to_numpy(dtype=object),
+                                 df[self.feature_names].to_numpy(dtype=np.float32, na_value=np.nan), threshold)
+    
+    def predict_from_csv(self, csv_path: str, threshold: Optional[float] = None) -> List[Dict[str, Any]]:
         """
         Realiza predicciones desde un archivo CSV procesado.
         
         Args:
             csv_path: Ruta al archivo CSV procesado (test_final.csv)
+            threshold: Umbral de fraude (por defecto self.threshold)
             
         Returns:
             Lista de diccionarios con predicciones por Provider
         """
-        try:
-            # Leer datos procesados
-            df = pd.read_csv(csv_path)
-            
-            # Validar columnas requeridas
-            required_columns = ['Provider'] + self.feature_names
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                raise ValueError(f"Columnas faltantes en CSV: {missing_columns}")
-            
-            # Preparar features para predicción
-            X = df[self.feature_names]
-            
-            # Realizar predicciones
-            assert self.model is not None
-            predictions = self.model.predict(X)
-            probabilities = self.model.predict_proba(X)
-            
-            # Crear resultados
-            results = []
-            for i, provider in enumerate(df['Provider']):
-                # Convertir todos los valores numpy a tipos nativos de Python
-                fraud_prob = float(probabilities[i][1])  # Convertir a float nativo de Python
-                prediction = int(predictions[i])  # Convertir predicción a int nativo
-                
-                results.append({
-                    'Provider': str(provider),  # Asegurar que sea string
-                    'Prediccion': prediction,
-                    'Probabilidad_Fraude': float(round(fraud_prob, 4))
-                })
-            
-            return convert_numpy_types(results)  # type: ignore
-            
-        except Exception as e:
-            raise
+        # Leer datos procesados (solo las columnas necesarias)
+        df = read_table(csv_path, ['Provider'] + self.feature_names)
+        return self.predict_batch(df, threshold).to_records()
     
-    def predict_from_dataframe(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+    def predict_from_dataframe(self, df: pd.DataFrame, threshold: Optional[float] = None) -> List[Dict[str, Any]]:
         """
         Realiza predicciones desde un DataFrame.
         
         Args:
             df: DataFrame con datos procesados
+            threshold: Umbral de fraude (por defecto self.threshold)
             
         Returns:
             Lista de diccionarios con predicciones por Provider
         """
-        try:
-            # Validar columnas requeridas
-            required_columns = ['Provider'] + self.feature_names
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                raise ValueError(f"Columnas faltantes: {missing_columns}")
-            
-            # Preparar features para predicción
-            X = df[self.feature_names]
-            
-            # Realizar predicciones
-            assert self.model is not None
-            predictions = self.model.predict(X)
-            probabilities = self.model.predict_proba(X)
-            
-            # Crear resultados
-            results = []
-            for i, provider in enumerate(df['Provider']):
-                # Convertir todos los valores numpy a tipos nativos de Python
-                fraud_prob = float(probabilities[i][1])  # Convertir a float nativo de Python
-                prediction = int(predictions[i])  # Convertir predicción a int nativo
-                
-                results.append({
-                    'Provider': str(provider),  # Asegurar que sea string
-                    'Prediccion': prediction,
-                    'Probabilidad_Fraude': float(round(fraud_prob, 4))
-                })
-            
-            return convert_numpy_types(results)  # type: ignore
+        return self.predict_batch(df, threshold).to_records()
+    
+    def predict_periods(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Puntúa todas las filas (Provider, Period) con una sola llamada al modelo.
+        
+        Args:
+            df: Features del modelo por proveedor y mes (test_periods.csv)
             
-        except Exception as e:
-            raise
+        Returns:
+            DataFrame con Provider, Period, Prediccion y Probabilidad_Fraude por fila
+        """
+        required_columns = ['Provider', 'Period'] + self.feature_names
+        missing_columns = [col for col in required_columns if col not in df.columns]
+        if missing_columns:
+            raise ValueError(f"Columnas faltantes: {missing_columns}")
+        
+        probabilities = self.score(df[self.feature_names].to_numpy(dtype=np.float32, na_value=np.nan))
+        result = df[['Provider', 'Period']].reset_index(drop=True)
+        result['Provider'] = result['Provider'].astype(str)
+        result['Prediccion'] = self.labels(probabilities)
+        result['Probabilidad_Fraude'] = probabilities.round(4)
+        return result
     
     def get_model_info(self) -> Dict[str, Any]:
         """
@@ -142,14 +225,19 @@ class FraudPredictor:
         Returns:
             Dict con información del modelo
         """
-        if self.model is None:
+        try:
+            version = self.registry.current()
+        except Exception:
             return {"error": "Modelo no cargado"}
         
         return {
-            "model_type": type(self.model).__name__,
+            "model_type": type(version.model).__name__,
             "feature_names": self.feature_names,
             "n_features": len(self.feature_names),
-            "model_path": self.model_path
+            "model_path": self.model_path,
+            "model_version": version.version_id,
+            "threshold": self.threshold,
+            "compiled_evaluator": version.forest is not None
         }
 
 # Función de conveniencia para uso directo
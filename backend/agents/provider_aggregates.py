@@ -0,0 +1,354 @@
+import pandas as pd
+import numpy as np
+import logging
+from typing import Collection, Dict, List, Optional, Tuple
+from .feature_spec import (FeatureSpec, PERIOD_COLUMN, PERIOD_FEATURES, PERIOD_SOURCE,
+                           compile_plan, compute_partial_sums, finalize_features, month_buckets)
+from .hll_sketch import HLLSketches
+from .physician_network import PHYSICIAN_COLUMNS, physician_pairs
+from .code_features import CODE_COLUMNS, ProviderCodeCounts
+from .duplicate_claims import SIGNATURE_COLUMNS, claim_signatures
+from .schema_registry import concat_frames
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Productos de los claims que se calculan en la misma pasada que los agregados
+# (ver ProviderAggregateState.from_claims), con las columnas que necesitan
+CLAIM_PRODUCTS: Dict[str, List[str]] = {
+    'physicians': PHYSICIAN_COLUMNS,
+    'codes': CODE_COLUMNS,
+    'signatures': ['ClaimID'] + SIGNATURE_COLUMNS,
+}
+
+
+def product_columns(products: Collection[str]) -> List[str]:
+    """Columnas de claims que necesitan los productos indicados (ver CLAIM_PRODUCTS)"""
+    return list(dict.fromkeys(col for product in CLAIM_PRODUCTS if product in products
+                              for col in CLAIM_PRODUCTS[product]))
+
+
+def _concat_pairs(pairs: List[Optional[pd.DataFrame]]) -> Optional[pd.DataFrame]:
+    """Une pares (Provider, Physician) distintos de varios estados (None si ninguno los tiene)"""
+    pairs = [df for df in pairs if df is not None]
+    if not pairs:
+        return None
+    return pd.concat(pairs, ignore_index=True).drop_duplicates(ignore_index=True) if len(pairs) > 1 else pairs[0]
+
+
+def _merge_codes(codes: List[Optional[ProviderCodeCounts]]) -> Optional[ProviderCodeCounts]:
+    """Suma los conteos de códigos de varios estados (None si ninguno los tiene)"""
+    codes = [counts for counts in codes if counts is not None]
+    return ProviderCodeCounts.merge_all(codes) if codes else None
+
+
+def _concat_signatures(signatures: List[Optional[pd.DataFrame]]) -> Optional[pd.DataFrame]:
+    """Une las firmas de claims de varios estados (None si ninguno las tiene)"""
+    signatures = [df.copy(deep=False) for df in signatures if df is not None]
+    if not signatures:
+        return None
+    return concat_frames(signatures) if len(signatures) > 1 else signatures[0]
+
+
+def provider_index_as_str(index: pd.Index) -> pd.Index:
+    """Convierte a texto el nivel Provider de un índice (puede venir categórico de la lectura)"""
+    if isinstance(index, pd.MultiIndex):
+        return pd.MultiIndex.from_arrays(
+            [index.get_level_values(name).astype(str) if name == 'Provider' else index.get_level_values(name)
+             for name in index.names],
+            names=index.names
+        )
+    return pd.Index(index.astype(str), name='Provider')
+
+
+class ProviderAggregateState:
+    """
+    Agregados parciales por proveedor que se pueden combinar entre sí.
+
+    Solo guarda las sumas y conteos compilados desde feature_spec (más los pares
+    Provider/valor distintos de las features 'nunique'), de modo que el resultado
+    de procesar un archivo por bloques es idéntico al de procesarlo completo.
+    Las medias y proporciones se calculan al final en finalize().
+
+    En modo aproximado, las features 'nunique' guardan un sketch HyperLogLog de
+    tamaño fijo por proveedor en lugar de los pares distintos.
+
+    Si los claims tienen fecha, periods guarda otro estado con las PERIOD_FEATURES
+    agrupadas por (Provider, Period), que se combina igual que el principal.
+
+    Los productos de CLAIM_PRODUCTS que se pidan (los pares proveedor-médico de la
+    red, los conteos de códigos, las firmas de los claims) se calculan de los mismos bloques y se combinan con el estado, para
+    no volver a leer los archivos de claims; los que no se pidan quedan en None.
+    """
+
+    def __init__(self, sums: Optional[pd.DataFrame] = None,
+                 distinct: Optional[Dict[str, pd.DataFrame]] = None,
+                 sketches: Optional[Dict[str, HLLSketches]] = None,
+                 periods: Optional["ProviderAggregateState"] = None,
+                 physicians: Optional[pd.DataFrame] = None,
+                 codes: Optional[ProviderCodeCounts] = None,
+                 signatures: Optional[pd.DataFrame] = None):
+        # Sumas y conteos indexados por Provider
+        self.sums = sums if sums is not None else pd.DataFrame(index=pd.Index([], name='Provider'))
+        # Pares (Provider, valor) distintos por columna origen de las features 'nunique'
+        self.distinct = distinct if distinct is not None else {}
+        # Sketches HyperLogLog por columna origen (modo aproximado)
+        self.sketches = sketches if sketches is not None else {}
+        # Agregados por (Provider, Period) (None si los claims no tienen fecha)
+        self.periods = periods
+        # Pares (Provider, Physician) distintos, como texto (None si no se pidieron)
+        self.physicians = physicians
+        # Conteos de códigos por proveedor (None si no se pidieron)
+        self.codes = codes
+        # Firma de cada claim para buscar repetidos (None si no se pidieron)
+        self.signatures = signatures
+
+    @property
+    def keys(self) -> List[str]:
+        """Columnas de agrupación del estado (Provider, o Provider y Period)"""
+        return list(self.sums.index.names)
+
+    @property
+    def products(self) -> List[str]:
+        """Productos de CLAIM_PRODUCTS que tiene el estado"""
+        return [product for product in CLAIM_PRODUCTS if getattr(self, product) is not None]
+
+    def with_products(self, products: Collection[str]) -> "ProviderAggregateState":
+        """Copia del estado sin los productos que no están en products (comparte los datos)"""
+        return ProviderAggregateState(self.sums, self.distinct, self.sketches, self.periods,
+                                      self.physicians if 'physicians' in products else None,
+                                      self.codes if 'codes' in products else None,
+                                      self.signatures if 'signatures' in products else None)
+
+    @classmethod
+    def from_claims(cls, claims: pd.DataFrame,
+                    features: Optional[List[FeatureSpec]] = None,
+                    sketch_precision: Optional[int] = None,
+                    products: Collection[str] = ()) -> "ProviderAggregateState":
+        """
+        Calcula los agregados parciales de un bloque de claims ya unido con beneficiarios.
+
+        Args:
+            claims: Bloque de claims (ver unified_ingestor.load_claims)
+            features: Features a calcular (por defecto feature_spec.PROVIDER_FEATURES)
+            sketch_precision: Si se indica, las features 'nunique' se aproximan con
+                HyperLogLog de esta precisión (ver hll_sketch.precision_for_error)
+            products: Productos de CLAIM_PRODUCTS a calcular del mismo bloque
+                (solo con las features por defecto)
+
+        Returns:
+            Estado parcial del bloque
+        """
+        plan = compile_plan(claims.columns, features)
+        sums = compute_partial_sums(claims, plan)
+        periods = cls.periods_from_claims(claims) if features is None else None
+        products = products if features is None else ()
+        physicians = physician_pairs(claims) if 'physicians' in products else None
+        codes = ProviderCodeCounts.from_claims(claims) if 'codes' in products else None
+        signatures = claim_signatures(claims) if 'signatures' in products else None
+        if sketch_precision is not None:
+            sketches = {
+                source: HLLSketches.from_pairs(claims['Provider'], claims[source], sketch_precision)
+                for source in plan['distinct']
+            }
+            return cls(sums, sketches=sketches, periods=periods, physicians=physicians, codes=codes,
+                       signatures=signatures)
+        distinct = {
+            source: claims[['Provider', source]].dropna().drop_duplicates()
+            for source in plan['distinct']
+        }
+        return cls(sums, distinct, periods=periods, physicians=physicians, codes=codes, signatures=signatures)
+
+    @classmethod
+    def periods_from_claims(cls, claims: pd.DataFrame) -> Optional["ProviderAggregateState"]:
+        """
+        Calcula los agregados por (Provider, mes de ClaimStartDt) de un bloque de claims.
+        El mes se obtiene con una conversión vectorizada de la columna de fechas y la
+        agregación es la misma groupby numérica del estado principal con dos claves.
+        Los conteos de distintos por mes son siempre exactos.
+
+        Args:
+            claims: Bloque de claims ya unido con beneficiarios
+
+        Returns:
+            Estado indexado por (Provider, Period), o None si los claims no tienen fecha
+        """
+        if PERIOD_SOURCE not in claims.columns:
+            return None
+        plan = compile_plan(claims.columns, PERIOD_FEATURES)
+        keys = ['Provider', PERIOD_COLUMN]
+        sources = [source for _, source, _ in plan['partials'].values()] + plan['distinct']
+        keyed = pd.DataFrame({column: claims[column] for column in dict.fromkeys(['Provider'] + sources)})
+        keyed[PERIOD_COLUMN] = month_buckets(claims[PERIOD_SOURCE])
+        sums = compute_partial_sums(keyed, plan, keys)
+        distinct = {
+            source: keyed[keys + [source]].dropna().drop_duplicates()
+            for source in plan['distinct']
+        }
+        return cls(sums, distinct)
+
+    def merge(self, other: "ProviderAggregateState") -> "ProviderAggregateState":
+        """
+        Combina dos estados parciales.
+
+        Args:
+            other: Estado parcial a combinar
+
+        Returns:
+            Nuevo estado con los agregados de ambos
+        """
+        return ProviderAggregateState.merge_all([self, other])
+
+    @classmethod
+    def merge_all(cls, states: List["ProviderAggregateState"]) -> "ProviderAggregateState":
+        """
+        Combina varios estados parciales con una sola agrupación de las sumas y una
+        sola eliminación de duplicados por columna (en lugar de una por cada par).
+
+        Args:
+            states: Estados parciales (pueden compartir proveedores)
+
+        Returns:
+            Estado con los agregados de todos
+        """
+        states = [state for state in states if not state.sums.empty]
+        if not states:
+            return cls()
+        if len(states) == 1:
+            return states[0]
+        keys = states[0].keys
+        sums = pd.concat([state.sums for state in states]).groupby(level=keys, observed=True).sum()
+        distinct = {}
+        for source in dict.fromkeys(source for state in states for source in state.distinct):
+            pairs = [state.distinct[source] for state in states if source in state.distinct]
+            distinct[source] = pd.concat(pairs, ignore_index=True).drop_duplicates() if len(pairs) > 1 else pairs[0]
+        sketches = {}
+        for state in states:
+            for source, sketch in state.sketches.items():
+                sketches[source] = sketches[source].merge(sketch) if source in sketches else sketch
+        periods = [state.periods for state in states if state.periods is not None]
+        return cls(sums, distinct, sketches, cls.merge_all(periods) if periods else None,
+                   _concat_pairs([state.physicians for state in states]),
+                   _merge_codes([state.codes for state in states]),
+                   _concat_signatures([state.signatures for state in states]))
+
+    @classmethod
+    def concat(cls, states: List["ProviderAggregateState"]) -> "ProviderAggregateState":
+        """
+        Une estados de conjuntos de proveedores disjuntos (p. ej. particiones por hash
+        de Provider) sin volver a agrupar.
+
+        Args:
+            states: Estados parciales sin proveedores en común
+
+        Returns:
+            Estado con los agregados de todos
+        """
+        states = [state for state in states if not state.sums.empty]
+        if not states:
+            return cls()
+        sums = pd.concat([state.sums for state in states])
+        sums.index = provider_index_as_str(sums.index)
+        distinct = {}
+        for source in sorted({source for state in states for source in state.distinct}):
+            distinct[source] = pd.concat([state.distinct[source] for state in states if source in state.distinct],
+                                         ignore_index=True)
+        sketches = {}
+        for state in states:
+            for source, sketch in state.sketches.items():
+                sketches[source] = sketches[source].merge(sketch) if source in sketches else sketch
+        periods = [state.periods for state in states if state.periods is not None]
+        return cls(sums, distinct, sketches, cls.concat(periods) if periods else None,
+                   _concat_pairs([state.physicians for state in states]),
+                   _merge_codes([state.codes for state in states]),
+                   _concat_signatures([state.signatures for state in states]))
+
+    def finalize(self, features: Optional[List[FeatureSpec]] = None) -> pd.DataFrame:
+        """
+        Convierte los agregados parciales en las features finales por proveedor.
+
+        Args:
+            features: Features a calcular (por defecto feature_spec.PROVIDER_FEATURES)
+
+        Returns:
+            DataFrame con una fila por Provider (o por Provider y Period), ordenado
+        """
+        # Provider puede venir categórico de la lectura; la salida usa texto plano
+        sums = self.sums.set_axis(provider_index_as_str(self.sums.index)).sort_index()
+        distinct_counts = {}
+        for source, pairs in self.distinct.items():
+            counts = pairs.groupby(self.keys, observed=True).size()
+            distinct_counts[source] = counts.set_axis(provider_index_as_str(counts.index))
+        for source, sketch in self.sketches.items():
+            counts = sketch.estimate()
+            distinct_counts[source] = counts.set_axis(counts.index.astype(str))
+        return finalize_features(sums, distinct_counts, features).reset_index()
+
+    def finalize_periods(self) -> pd.DataFrame:
+        """
+        Features por proveedor y mes.
+
+        Returns:
+            DataFrame con una fila por (Provider, Period), Period como 'AAAA-MM',
+            ordenado por Provider y Period (vacío si los claims no tenían fecha)
+        """
+        if self.periods is None or self.periods.sums.empty:
+            return pd.DataFrame(columns=['Provider', PERIOD_COLUMN])
+        periods = self.periods.finalize(PERIOD_FEATURES)
+        periods[PERIOD_COLUMN] = pd.to_datetime(periods[PERIOD_COLUMN]).dt.strftime('%Y-%m')
+        return periods
+
+
+class StateReducer:
+    """
+    Combina una secuencia de estados parciales en árbol: cada estado nuevo se
+    combina solo con los de tamaño parecido (como un contador binario), así que
+    cada fila se vuelve a agrupar O(log n) veces en lugar de una vez por bloque,
+    y en memoria quedan O(log n) estados pendientes.
+    """
+
+    def __init__(self):
+        # (nivel, estado): el estado de nivel k combina 2^k estados agregados
+        self._levels: List[Tuple[int, ProviderAggregateState]] = []
+
+    def add(self, state: ProviderAggregateState) -> None:
+        """Agrega un estado parcial (en el orden de los bloques)"""
+        level = 0
+        while self._levels and self._levels[-1][0] == level:
+            _, previous = self._levels.pop()
+            state = previous.merge(state)
+            level += 1
+        self._levels.append((level, state))
+
+    def result(self) -> ProviderAggregateState:
+        """Estado combinado de todo lo agregado hasta ahora"""
+        if len(self._levels) > 1:
+            state = ProviderAggregateState.merge_all([state for _, state in self._levels])
+            self._levels = [(self._levels[0][0], state)]
+        return self._levels[0][1] if self._levels else ProviderAggregateState()
+
+
+def aggregate_in_chunks(chunks, sketch_precision: Optional[int] = None,
+                        products: Collection[str] = ()) -> ProviderAggregateState:
+    """
+    Agrega un iterable de bloques de claims combinando sus estados parciales.
+
+    Args:
+        chunks: Iterable de DataFrames de claims ya unidos con beneficiarios
+        sketch_precision: Precisión HyperLogLog para las features 'nunique' (None = exacto)
+        products: Productos de CLAIM_PRODUCTS a calcular de los mismos bloques
+
+    Returns:
+        Estado combinado de todos los bloques
+    """
+    reducer = StateReducer()
+    total_rows = 0
+    for chunk in chunks:
+        total_rows += len(chunk)
+        reducer.add(ProviderAggregateState.from_claims(chunk, sketch_precision=sketch_precision,
+                                                       products=products))
+    state = reducer.result()
+    logger.info(f"Agregación por bloques completada: {total_rows} claims, {len(state.sums)} providers")
+    return state
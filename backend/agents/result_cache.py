@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Directorio de resultados de ingesta direccionados por contenido
+RESULT_CACHE_DIR = Path(__file__).parent.parent / "data" / "ingest_cache"
+
+# Tamaño máximo en disco de las entradas (se eliminan las menos usadas al superarlo)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Bloque de lectura al calcular el hash de contenido
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Archivo con los hashes ya calculados (por tamaño y fecha de modificación)
+HASH_INDEX_FILE = "file_hashes.json"
+
+# Metadatos de cada entrada (su fecha de modificación marca el último uso)
+RESULT_FILE = "result.json"
+
+
+def content_hash(path) -> str:
+    """
+    Hash SHA-256 del contenido de un archivo, leído por bloques.
+
+    Args:
+        path: Ruta del archivo
+
+    Returns:
+        Hash hexadecimal
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestResultCache:
+    """
+    Salidas de ingesta (test_final.csv, test_dashboard.csv, ...) indexadas por el hash
+    del contenido de los archivos de entrada y la versión del pipeline.
+
+    Si el mismo conjunto de archivos ya se procesó, las salidas se restauran sin
+    volver a ejecutar la agregación. Las entradas menos usadas se eliminan cuando
+    el tamaño total supera max_bytes.
+    """
+
+    def __init__(self, cache_dir: Path = RESULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hash_index_path = self.cache_dir / HASH_INDEX_FILE
+
+    def _load_hash_index(self) -> Dict[str, Any]:
+        if not self.hash_index_path.exists():
+            return {}
+        try:
+            with open(self.hash_index_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _file_hashes(self, paths: List[Path]) -> Dict[str, str]:
+        """Hash de contenido de cada archivo, reutilizando los ya calculados si no cambió"""
+        index = self._load_hash_index()
+        hashes = {}
+        changed = False
+        for path in paths:
+            stat = os.stat(path)
+            entry = index.get(str(Path(path).resolve()))
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                hashes[path.name] = entry["sha256"]
+                continue
+            digest = content_hash(path)
+            index[str(Path(path).resolve())] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+            hashes[path.name] = digest
+            changed = True
+
+        if changed:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.hash_index_path.with_suffix(".json.tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self.hash_index_path)
+        return hashes
+
+    def key_for(self, paths: List[Path], version: Dict[str, Any]) -> str:
+        """
+        Clave de un conjunto de archivos de entrada.
+
+        Args:
+            paths: Archivos de entrada
+            version: Versión del pipeline y opciones que cambian las salidas
+
+        Returns:
+            Clave hexadecimal (independiente del orden de los archivos y de su fecha)
+        """
+        hashes = self._file_hashes(sorted(paths))
+        payload = json.dumps({"files": hashes, "version": version}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key
+
+    @staticmethod
+    def _entry_file(entry_dir: Path, name: str, path: Path) -> Path:
+        """Copia guardada de una salida (conserva la extensión de la salida)"""
+        return entry_dir / f"{name}{Path(path).suffix}"
+
+    def lookup(self, key: str, outputs: Dict[str, Optional[Path]]) -> Optional[Dict[str, Any]]:
+        """
+        Restaura las salidas de una entrada si contiene todas las solicitadas.
+
+        Args:
+            key: Clave del conjunto de entrada (ver key_for)
+            outputs: Nombre de salida -> ruta destino (None para no generarla)
+
+        Returns:
+            Resultado guardado del procesamiento, o None si no hay entrada utilizable
+        """
+        entry_dir = self._entry_dir(key)
+        result_path = entry_dir / RESULT_FILE
+        wanted = {name: Path(path) for name, path in outputs.items() if path is not None}
+        if not result_path.exists() or not all(self._entry_file(entry_dir, name, path).exists()
+                                               for name, path in wanted.items()):
+            return None
+
+        with open(result_path, 'r') as f:
+            result = json.load(f)
+        for name, path in wanted.items():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + ".tmp")
+            shutil.copyfile(self._entry_file(entry_dir, name, path), tmp_path)
+            os.replace(tmp_path, path)
+
+        # La fecha de modificación de result.json marca el último uso (LRU)
+        os.utime(result_path)
+        logger.info(f"Resultado de ingesta reutilizado desde caché: {key}")
+        return result
+
+    def store(self, key: str, outputs: Dict[str, Optional[Path]], result: Dict[str, Any]) -> None:
+        """
+        Guarda las salidas generadas para un conjunto de entrada y aplica el límite de tamaño.
+
+        Args:
+            key: Clave del conjunto de entrada (ver key_for)
+            outputs: Nombre de salida -> ruta generada (None si no se generó)
+            result: Resultado del procesamiento a devolver en los aciertos
+        """
+        entry_dir = self._entry_dir(key)
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        for name, path in outputs.items():
+            if path is not None and Path(path).exists():
+                entry_file = self._entry_file(entry_dir, name, path)
+                tmp_path = entry_file.with_name(entry_file.name + ".tmp")
+                shutil.copyfile(path, tmp_path)
+                os.replace(tmp_path, entry_file)
+
+        tmp_path = entry_dir / f"{RESULT_FILE}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(result, f, indent=2)
+        os.replace(tmp_path, entry_dir / RESULT_FILE)
+        self.evict()
+
+    def evict(self) -> None:
+        """Elimina las entradas menos usadas hasta que el total quede bajo max_bytes"""
+        if not self.cache_dir.exists():
+            return
+        entries = []
+        for entry_dir in self.cache_dir.iterdir():
+            result_path = entry_dir / RESULT_FILE
+            if not entry_dir.is_dir() or not result_path.exists():
+                continue
+            size = sum(f.stat().st_size for f in entry_dir.iterdir() if f.is_file())
+            entries.append((result_path.stat().st_mtime, size, entry_dir))
+
+        total = sum(size for _, size, _ in entries)
+        for last_used, size, entry_dir in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            logger.info(f"Entrada de caché de ingesta eliminada (sin uso desde {time.ctime(last_used)}): {entry_dir.name}")
+
+    def clear(self) -> None:
+        """Elimina todas las entradas"""
+        if self.cache_dir.exists():
+            shutil.rmtree(self.cache_dir)
@@ -0,0 +1,282 @@
+import pandas as pd
+import numpy as np
+import io
+import fnmatch
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+from .feature_spec import CHRONIC_CONDITIONS
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Versión del registro; cambiarla invalida los cachés columnares generados con otros tipos
+SCHEMA_VERSION = 2
+
+# Tipos especiales del registro (además de los dtypes de pandas)
+DATETIME = 'datetime'
+# Formato de las columnas DATETIME en los CSV de entrada: ISO 8601, con o sin hora
+# (AAAA-MM-DD y AAAA-MM-DD HH:MM:SS pueden convivir en la misma columna)
+DATE_FORMAT = 'ISO8601'
+# IDs con prefijo fijo y sufijo numérico (p. ej. CLM67387 -> 67387 en int32)
+PREFIXED_ID = 'prefixed_id'
+
+
+@dataclass(frozen=True)
+class FileSchema:
+    """
+    Columnas que se leen de un tipo de archivo de entrada y su tipo compacto.
+
+    Attributes:
+        kind: Tipo de archivo ('beneficiary', 'inpatient', 'outpatient')
+        pattern: Patrón glob del nombre de archivo
+        columns: Columna -> dtype de pandas, DATETIME o PREFIXED_ID
+        id_prefixes: Prefijo de cada columna PREFIXED_ID
+    """
+    kind: str
+    pattern: str
+    columns: Dict[str, str]
+    id_prefixes: Dict[str, str] = field(default_factory=dict)
+
+
+# Columnas de los claims que alimentan las features (inpatient y outpatient)
+CLAIM_TYPES: Dict[str, str] = {
+    'Provider': 'category',
+    'BeneID': 'category',
+    'ClaimID': PREFIXED_ID,
+    'InscClaimAmtReimbursed': 'Int32',
+}
+
+# Columnas de beneficiarios que se unen a los claims
+BENEFICIARY_TYPES: Dict[str, str] = {
+    'BeneID': 'category',
+    'DOB': DATETIME,
+    'Gender': 'UInt8',
+    'RenalDiseaseIndicator': 'category',
+    **{condition: 'UInt8' for condition in CHRONIC_CONDITIONS},
+}
+
+# Prefijo de las columnas PREFIXED_ID
+ID_PREFIXES: Dict[str, str] = {'ClaimID': 'CLM'}
+
+FILE_SCHEMAS: Dict[str, FileSchema] = {
+    'beneficiary': FileSchema('beneficiary', '*Beneficiary*', BENEFICIARY_TYPES),
+    'inpatient': FileSchema('inpatient', '*Inpatient*', CLAIM_TYPES, ID_PREFIXES),
+    'outpatient': FileSchema('outpatient', '*Outpatient*', CLAIM_TYPES, ID_PREFIXES),
+}
+
+# Tipos de otras columnas conocidas del formato Kaggle (se aplican al convertir
+# el archivo completo al caché columnar, aunque no alimenten features)
+KNOWN_COLUMN_TYPES: Dict[str, str] = {
+    'AttendingPhysician': 'category',
+    'OperatingPhysician': 'category',
+    'OtherPhysician': 'category',
+    'DeductibleAmtPaid': 'Int32',
+    'IPAnnualReimbursementAmt': 'Int32',
+    'IPAnnualDeductibleAmt': 'Int32',
+    'OPAnnualReimbursementAmt': 'Int32',
+    'OPAnnualDeductibleAmt': 'Int32',
+    'ClaimStartDt': DATETIME,
+    'ClaimEndDt': DATETIME,
+    'AdmissionDt': DATETIME,
+    'DischargeDt': DATETIME,
+    'DOD': DATETIME,
+}
+
+
+def schema_for(path) -> Optional[FileSchema]:
+    """
+    Devuelve el esquema registrado para un archivo según su nombre.
+
+    Args:
+        path: Ruta del archivo de entrada
+
+    Returns:
+        FileSchema, o None si el archivo no es de un tipo registrado
+    """
+    name = Path(path).name
+    for schema in FILE_SCHEMAS.values():
+        if fnmatch.fnmatch(name, schema.pattern):
+            return schema
+    return None
+
+
+def column_types(path, all_columns: bool = False) -> Dict[str, str]:
+    """
+    Tipos a aplicar al leer un archivo.
+
+    Args:
+        path: Ruta del archivo de entrada
+        all_columns: Si es True incluye también KNOWN_COLUMN_TYPES
+
+    Returns:
+        Columna -> tipo del registro
+    """
+    schema = schema_for(path)
+    types = dict(KNOWN_COLUMN_TYPES) if all_columns else {}
+    if schema is not None:
+        types.update(schema.columns)
+    return types
+
+
+def encode_prefixed_id(values: pd.Series, prefix: str) -> pd.Series:
+    """
+    Codifica IDs con prefijo fijo como enteros (PRV51002 -> 51002).
+    Si algún valor no sigue el formato, se usa un categórico.
+
+    Args:
+        values: Serie de IDs en texto
+        prefix: Prefijo esperado
+
+    Returns:
+        Serie Int32 (o categórica si no se puede codificar)
+    """
+    present = values.dropna().astype(str)
+    digits = present.str.slice(len(prefix))
+    valid = present.str.startswith(prefix) & digits.str.isdigit() & (digits.str.len() <= 9)
+    if not valid.all() or (digits.str.startswith('0') & (digits.str.len() > 1)).any():
+        return values.astype('category')
+    encoded = pd.Series(pd.array(np.full(len(values), pd.NA), dtype='Int32'), index=values.index)
+    encoded.loc[present.index] = pd.to_numeric(digits).astype('int32').values
+    return encoded
+
+
+def decode_prefixed_id(values: pd.Series, prefix: str) -> pd.Series:
+    """Revierte encode_prefixed_id (51002 -> PRV51002)"""
+    if not pd.api.types.is_integer_dtype(values):
+        return values.astype(object)
+    return (prefix + values.astype('Int64').astype(str)).where(values.notna())
+
+
+def _csv_read_args(path, columns: Optional[List[str]], all_columns: bool,
+                   header: Optional[List[str]] = None) -> Dict:
+    """Argumentos usecols/dtype/parse_dates/date_format de read_csv según el registro"""
+    header = header if header is not None else pd.read_csv(path, nrows=0).columns
+    wanted = list(header) if columns is None else [col for col in header if col in set(columns)]
+    types = column_types(path, all_columns=all_columns)
+    dtype = {col: types[col] for col in wanted
+             if col in types and types[col] not in (DATETIME, PREFIXED_ID)}
+    parse_dates = [col for col in wanted if types.get(col) == DATETIME]
+    return {'usecols': wanted, 'dtype': dtype, 'parse_dates': parse_dates, 'date_format': DATE_FORMAT}
+
+
+def _finish(df: pd.DataFrame, path) -> pd.DataFrame:
+    """Codifica las columnas PREFIXED_ID leídas como texto"""
+    schema = schema_for(path)
+    if schema is not None:
+        for col, prefix in schema.id_prefixes.items():
+            if col in df.columns:
+                df[col] = encode_prefixed_id(df[col], prefix)
+    return df
+
+
+def read_csv_typed(path, columns: Optional[List[str]] = None, chunksize: Optional[int] = None,
+                   all_columns: bool = False) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """
+    Lee un CSV con las columnas y tipos compactos del registro.
+    Si los datos no encajan en los tipos declarados, se reintenta sin tipos.
+
+    Args:
+        path: Ruta del CSV
+        columns: Columnas a leer (las que no existan se ignoran); None para todas
+        chunksize: Si se indica, devuelve un iterador de bloques
+        all_columns: Si es True aplica también KNOWN_COLUMN_TYPES
+
+    Returns:
+        DataFrame, o iterador de DataFrames si se indica chunksize
+    """
+    args = _csv_read_args(path, columns, all_columns)
+    if chunksize:
+        return _iter_csv_typed(path, args, chunksize)
+    try:
+        df = pd.read_csv(path, low_memory=False, **args)
+    except (ValueError, TypeError) as e:
+        logger.warning(f"{path} no encaja en los tipos del registro ({e}), se lee sin tipos")
+        df = pd.read_csv(path, usecols=args['usecols'], low_memory=False)
+    return _finish(df, path)
+
+
+def parse_csv_block(data: bytes, path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Parsea un bloque de CSV en memoria (encabezado + filas completas) con los tipos
+    del registro que corresponden al archivo path.
+
+    Args:
+        data: Bytes del bloque, empezando por la línea de encabezado
+        path: Nombre o ruta del archivo al que pertenece el bloque
+        columns: Columnas a leer (las que no existan se ignoran); None para todas
+
+    Returns:
+        DataFrame del bloque
+    """
+    header = list(pd.read_csv(io.BytesIO(data), nrows=0).columns)
+    args = _csv_read_args(path, columns, all_columns=False, header=header)
+    try:
+        df = pd.read_csv(io.BytesIO(data), low_memory=False, **args)
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Bloque de {path} no encaja en los tipos del registro ({e}), se lee sin tipos")
+        df = pd.read_csv(io.BytesIO(data), usecols=args['usecols'], low_memory=False)
+    return _finish(df, path)
+
+
+def _iter_csv_typed(path, args: Dict, chunksize: int) -> Iterator[pd.DataFrame]:
+    rows = 0
+    with pd.read_csv(path, chunksize=chunksize, **args) as reader:
+        while True:
+            try:
+                chunk = next(reader)
+            except StopIteration:
+                return
+            except (ValueError, TypeError) as e:
+                logger.warning(f"{path} no encaja en los tipos del registro a partir de la fila {rows} ({e}), "
+                               f"el resto se lee sin tipos")
+                break
+            rows += len(chunk)
+            yield _finish(chunk, path)
+    # El bloque que falló y los siguientes se leen sin tipos, como en la lectura completa,
+    # para que la validación de calidad informe el valor que no encajaba
+    skiprows = (lambda i: 0 < i <= rows) if rows else None
+    for chunk in pd.read_csv(path, chunksize=chunksize, usecols=args['usecols'], skiprows=skiprows):
+        yield _finish(chunk, path)
+
+
+def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatena DataFrames conservando las columnas categóricas (unifica sus categorías
+    antes de concatenar para que pandas no las convierta a object). Una columna
+    categórica en unos bloques y sin valores en otros sigue siendo categórica. Si un
+    ID con prefijo quedó como entero en unos bloques y categórico en otros, se
+    decodifica y se concatena como categórico.
+
+    Args:
+        frames: DataFrames a concatenar
+
+    Returns:
+        DataFrame concatenado
+    """
+    frames = [df for df in frames if df is not None]
+    if len(frames) > 1:
+        for col, prefix in ID_PREFIXES.items():
+            dtypes = [df[col].dtype for df in frames if col in df.columns]
+            if any(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes) and \
+                    any(pd.api.types.is_integer_dtype(dtype) for dtype in dtypes):
+                for df in frames:
+                    if col in df.columns and pd.api.types.is_integer_dtype(df[col]):
+                        df[col] = decode_prefixed_id(df[col], prefix).astype('category')
+        for col in frames[0].columns:
+            is_categorical = [col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype) for df in frames]
+            if any(is_categorical) and not all(is_categorical) and \
+                    all(col in df.columns and df[col].isna().all() for df, cat in zip(frames, is_categorical) if not cat):
+                empty = frames[is_categorical.index(True)][col].cat.categories[:0]
+                for df, cat in zip(frames, is_categorical):
+                    if not cat:
+                        df[col] = pd.Categorical.from_codes(np.full(len(df), -1), categories=empty)
+            if all(col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype) for df in frames):
+                categories = pd.api.types.union_categoricals(
+                    [pd.Categorical([], categories=df[col].cat.categories) for df in frames]
+                ).categories
+                for df in frames:
+                    df[col] = df[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
@@ -1,48 +1,52 @@
 import pandas as pd
 import numpy as np
-import joblib
 import os
-import shap
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Optional, Tuple
 import json
 from .predictor import FraudPredictor
+from .columnar_cache import read_table
+from .model_registry import DEFAULT_MODEL_PATH, ModelRegistry, get_registry
 
 class SHAPExplainer:
     """
     Agente para generar explicaciones SHAP del modelo de detección de fraude.
     """
     
-    def __init__(self, model_path: str = "models/xgb_fraud_model.pkl"):
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, registry: Optional[ModelRegistry] = None,
+                 lazy: bool = False):
         self.model_path = model_path
-        self.model = None
-        self.explainer = None
+        # Modelo, evaluador compilado y TreeExplainer compartidos por versión (ver ModelRegistry)
+        self.registry = registry or get_registry(model_path)
         self.feature_names = [
             'Total_Reimbursed', 'Mean_Reimbursed', 'Claim_Count', 
             'Unique_Beneficiaries', 'Pct_Male'
         ]
         
-        # Cargar modelo y crear explainer
+        # Cargar modelo y crear explainer (con lazy, SHAP se importa en la primera explicación)
         self._load_model()
-        self._create_explainer()
+        if not lazy:
+            self._create_explainer()
     
     def _load_model(self):
-        """Carga el modelo XGBoost"""
-        try:
-            if not os.path.exists(self.model_path):
-                raise FileNotFoundError(f"Modelo no encontrado en: {self.model_path}")
-            
-            self.model = joblib.load(self.model_path)
-            
-        except Exception as e:
-            raise
+        """Carga el modelo XGBoost (si el registro aún no lo cargó)"""
+        self.registry.current()
     
     def _create_explainer(self):
-        """Crea el explainer SHAP para el modelo XGBoost"""
-        try:
-            # Para XGBoost, usar TreeExplainer que es más eficiente
-            self.explainer = shap.TreeExplainer(self.model)
-        except Exception as e:
-            raise
+        """Crea el explainer SHAP para el modelo XGBoost (uno por versión del modelo)"""
+        # Para XGBoost, usar TreeExplainer que es más eficiente
+        self.registry.current().tree_explainer()
+    
+    @property
+    def model(self) -> Any:
+        return self.registry.current().model
+    
+    @property
+    def forest(self) -> Any:
+        return self.registry.current().forest
+    
+    @property
+    def explainer(self) -> Any:
+        return self.registry.current().tree_explainer()
     
     def explain_prediction(self, features: Dict[str, float]) -> Dict[str, Any]:
         """
@@ -55,7 +59,11 @@ class SHAPExplainer:
             Diccionario con la explicación SHAP
         """
         try:
-            if self.model is None or self.explainer is None:
+            # Una sola versión del modelo para toda la explicación
+            version = self.registry.current()
+            model, explainer = version.model, version.tree_explainer()
+            
+            if model is None or explainer is None:
                 raise ValueError("Modelo o explainer no están cargados")
                 
             # Convertir features a array
@@ -63,20 +71,23 @@ class SHAPExplainer:
             X = np.array([feature_values])
             
             # Calcular valores SHAP
-            shap_values = self.explainer.shap_values(X)
+            shap_values = explainer.shap_values(X)
             
             # Para clasificación binaria, shap_values puede ser una lista
             if isinstance(shap_values, list):
                 shap_values = shap_values[1]  # Usar valores para clase positiva (fraude)
             
+            # Predicción de la fila con el evaluador compilado si está disponible
+            scorer = version.forest if version.forest is not None else model
+            
             # Crear explicación
             explanation = {
                 'feature_names': self.feature_names,
                 'feature_values': feature_values,
                 'shap_values': shap_values[0].tolist(),  # Primer (y único) ejemplo
-                'base_value': float(self.explainer.expected_value),
-                'prediction': int(self.model.predict(X)[0]),
-                'prediction_proba': float(self.model.predict_proba(X)[0][1])
+                'base_value': float(explainer.expected_value),
+                'prediction': int(scorer.predict(X)[0]),
+                'prediction_proba': float(scorer.predict_proba(X)[0][1])
             }
             
             # Calcular contribuciones por feature
@@ -110,11 +121,15 @@ class SHAPExplainer:
             Diccionario con explicaciones para todos los proveedores
         """
         try:
-            if self.model is None or self.explainer is None:
+            # Una sola versión del modelo para toda la explicación
+            version = self.registry.current()
+            model, explainer = version.model, version.tree_explainer()
+            
+            if model is None or explainer is None:
                 raise ValueError("Modelo o explainer no están cargados")
                 
             # Leer datos
-            df = pd.read_csv(csv_path)
+            df = read_table(csv_path, ['Provider'] + self.feature_names)
             
             # Validar columnas
             required_columns = ['Provider'] + self.feature_names
@@ -126,7 +141,7 @@ class SHAPExplainer:
             X = df[self.feature_names]
             
             # Calcular valores SHAP para todo el dataset
-            shap_values = self.explainer.shap_values(X)
+            shap_values = explainer.shap_values(X)
             if isinstance(shap_values, list):
                 shap_values = shap_values[1]
             
@@ -138,9 +153,9 @@ class SHAPExplainer:
                     'feature_names': self.feature_names,
                     'feature_values': X.iloc[i].tolist(),
                     'shap_values': shap_values[i].tolist(),
-                    'base_value': float(self.explainer.expected_value),
-                    'prediction': int(self.model.predict(X.iloc[i:i+1])[0]),
-                    'prediction_proba': float(self.model.predict_proba(X.iloc[i:i+1])[0][1])
+                    'base_value': float(explainer.expected_value),
+                    'prediction': int(model.predict(X.iloc[i:i+1])[0]),
+                    'prediction_proba': float(model.predict_proba(X.iloc[i:i+1])[0][1])
                 }
                 
                 # Contribuciones por feature
@@ -163,7 +178,7 @@ class SHAPExplainer:
             return {
                 'explanations': explanations,
                 'total_providers': len(explanations),
-                'base_value': float(self.explainer.expected_value)
+                'base_value': float(explainer.expected_value)
             }
             
         except Exception as e:
@@ -180,17 +195,22 @@ class SHAPExplainer:
             Diccionario con resumen de importancia de features
         """
         try:
-            if self.model is None:
+            # Una sola versión del modelo para todo el resumen
+            version = self.registry.current()
+            model = version.model
+            
+            if model is None:
                 raise ValueError("Modelo no está cargado")
                 
             if csv_path and os.path.exists(csv_path):
                 # Calcular importancia en datos específicos
-                if self.explainer is None:
+                explainer = version.tree_explainer()
+                if explainer is None:
                     raise ValueError("Explainer no está cargado")
                     
-                df = pd.read_csv(csv_path)
+                df = read_table(csv_path, self.feature_names)
                 X = df[self.feature_names]
-                shap_values = self.explainer.shap_values(X)
+                shap_values = explainer.shap_values(X)
                 if isinstance(shap_values, list):
                     shap_values = shap_values[1]
                 
@@ -198,7 +218,7 @@ class SHAPExplainer:
                 feature_importance = np.mean(np.abs(shap_values), axis=0)
             else:
                 # Usar importancia del modelo (menos preciso pero más rápido)
-                feature_importance = self.model.feature_importances_
+                feature_importance = model.feature_importances_
             
             # Normalizar los valores para que sumen 1.0 (100%)
             total_importance = float(np.sum(feature_importance))
@@ -0,0 +1,76 @@
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Informe de tiempos del último arranque
+STARTUP_REPORT_FILE = Path("metrics") / "startup_timing.json"
+
+
+class StartupTimer:
+    """
+    Tiempos de las fases del arranque del servidor (importaciones, carga del modelo,
+    creación de agentes...). Cada mark() registra el tiempo transcurrido desde la
+    marca anterior.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self._last = self._started
+        self.phases: List[Dict[str, Any]] = []
+        self.ready_seconds = None
+        self.mode = None
+        self._lock = threading.Lock()
+
+    def mark(self, phase: str) -> None:
+        """Cierra una fase del arranque"""
+        now = time.perf_counter()
+        with self._lock:
+            self.phases.append({"phase": phase, "seconds": round(now - self._last, 4)})
+            self._last = now
+
+    def finish(self, mode: str, path: Path = STARTUP_REPORT_FILE) -> Dict[str, Any]:
+        """
+        Marca el servidor como listo y guarda el informe.
+
+        Args:
+            mode: Modo de arranque (fast o eager)
+            path: Archivo JSON del informe
+
+        Returns:
+            Informe de tiempos (ver report)
+        """
+        self.ready_seconds = round(time.perf_counter() - self._started, 4)
+        self.mode = mode
+        report = self.report()
+        try:
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar el informe de arranque en {path}: {e}")
+        logger.info(f"Servidor listo en {self.ready_seconds:.2f} s (modo {mode}): "
+                    + ", ".join(f"{p['phase']} {p['seconds']:.2f} s" for p in report["phases"]))
+        return report
+
+    def report(self) -> Dict[str, Any]:
+        """Informe de tiempos para la API"""
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "started_at": self.started_at,
+                "ready_seconds": self.ready_seconds,
+                "phases": list(self.phases),
+            }
+
+
+# Temporizador del proceso (se crea al importar main)
+startup_timer = StartupTimer()
@@ -0,0 +1,189 @@
+import pandas as pd
+import os
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional
+from .schema_registry import schema_for, parse_csv_block
+from .compression import StreamDecompressor, compression_for
+from .provider_aggregates import CLAIM_PRODUCTS, ProviderAggregateState, StateReducer
+from .aggregate_store import UploadPartialStore, file_signature
+from .data_quality import DataQualityError, DataQualityReport
+from .unified_ingestor import INPUT_DIR, CLAIM_COLUMNS, claim_columns, find_input_files, load_beneficiaries, join_beneficiaries
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bytes recibidos que se acumulan antes de parsear y agregar un bloque
+DEFAULT_BLOCK_BYTES = 8 * 1024 * 1024
+
+# Tipos de archivo cuyos claims se agregan durante la subida
+CLAIM_KINDS = ('inpatient', 'outpatient')
+
+
+class ClaimStreamAggregator:
+    """
+    Agrega un archivo de claims a medida que llegan sus bytes.
+
+    feed() acumula los bytes recibidos y entrega bloques de líneas completas;
+    process() parsea cada bloque con los tipos del registro, lo valida con el
+    informe de calidad del archivo (como la ingesta, antes de unir beneficiarios),
+    lo une con los beneficiarios y combina sus agregados en el estado del archivo
+    (en árbol, ver StateReducer). Si un bloque no supera la validación se deja de
+    agregar y el error queda en quality. Se calculan todos los CLAIM_PRODUCTS, ya
+    que todavía no se sabe cuáles pedirá la ingesta.
+    """
+
+    def __init__(self, file_name: str, beneficiary: pd.DataFrame,
+                 block_bytes: int = DEFAULT_BLOCK_BYTES):
+        self.file_name = file_name
+        self.beneficiary = beneficiary
+        self.block_bytes = block_bytes
+        self.header: Optional[bytes] = None
+        self.buffer = bytearray()
+        self.reducer = StateReducer()
+        self.quality = DataQualityReport()
+        self.rows = 0
+
+    def feed(self, data: bytes) -> Optional[bytes]:
+        """
+        Acumula bytes recibidos.
+
+        Args:
+            data: Bytes recibidos
+
+        Returns:
+            Bloque de líneas completas listo para process(), o None si aún no hay suficientes
+        """
+        self.buffer.extend(data)
+        if self.header is None:
+            newline = self.buffer.find(b'\n')
+            if newline < 0:
+                return None
+            self.header = bytes(self.buffer[:newline + 1])
+            del self.buffer[:newline + 1]
+        if len(self.buffer) < self.block_bytes:
+            return None
+        return self._take(self.buffer.rfind(b'\n') + 1)
+
+    def flush(self) -> Optional[bytes]:
+        """Devuelve las filas pendientes al terminar la subida"""
+        if self.header is None:
+            self.header = bytes(self.buffer)
+            self.buffer.clear()
+            return None
+        return self._take(len(self.buffer))
+
+    def _take(self, end: int) -> Optional[bytes]:
+        if end <= 0:
+            return None
+        block = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        return block if block.strip() else None
+
+    def process(self, block: bytes) -> None:
+        """
+        Parsea un bloque y combina sus agregados (trabajo de CPU, se ejecuta fuera del event loop).
+
+        Args:
+            block: Bloque de líneas completas devuelto por feed() o flush()
+        """
+        if self.quality.errors:
+            return
+        chunk = parse_csv_block(self.header + block, self.file_name, claim_columns(CLAIM_PRODUCTS))
+        try:
+            self.quality.observe(Path(self.file_name), chunk, CLAIM_COLUMNS)
+        except DataQualityError as e:
+            logger.warning(f"{self.file_name} no supera la validación, se agregará en la ingesta: {e}")
+            return
+        self.rows += len(chunk)
+        chunk = join_beneficiaries(chunk, self.beneficiary)
+        self.reducer.add(ProviderAggregateState.from_claims(chunk, products=CLAIM_PRODUCTS))
+
+    @property
+    def state(self) -> ProviderAggregateState:
+        """Estado combinado de los bloques procesados hasta ahora"""
+        return self.reducer.result()
+
+
+async def stream_upload(chunks: AsyncIterator[bytes], file_path: Path,
+                        input_dir: Path = INPUT_DIR,
+                        block_bytes: int = DEFAULT_BLOCK_BYTES,
+                        partials: Optional[UploadPartialStore] = None) -> Dict[str, Any]:
+    """
+    Guarda un archivo subido por bloques y, si es de claims, lo agrega mientras llega.
+
+    Los bloques se parsean y agregan en un hilo mientras el event loop sigue recibiendo
+    bytes (como máximo un bloque en proceso a la vez). Al terminar, el agregado del
+    archivo se guarda en UploadPartialStore (con el informe de calidad de sus bloques)
+    y la ingesta lo reutiliza en lugar de volver a leer el archivo. Si algún bloque no
+    supera la validación no se guarda parcial y el error se devuelve en quality_errors.
+    Los archivos .csv.gz / .csv.zst se guardan comprimidos y solo se descomprimen en
+    memoria, por bloques, para agregarlos. Si todavía no se subieron los beneficiarios,
+    el archivo solo se guarda y se agrega en la ingesta.
+
+    Args:
+        chunks: Iterador asíncrono con los bytes del cuerpo de la petición
+        file_path: Ruta destino del archivo
+        input_dir: Directorio con los archivos ya subidos (para los beneficiarios)
+        block_bytes: Bytes acumulados antes de agregar un bloque
+        partials: Almacén de agregados parciales (por defecto data/upload_partials)
+
+    Returns:
+        Dict con el tamaño del archivo y, si se agregó, filas y proveedores
+        (o quality_errors si no superó la validación)
+    """
+    file_path = Path(file_path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    partials = partials or UploadPartialStore()
+    partials.discard(file_path)
+    loop = asyncio.get_running_loop()
+
+    aggregator = None
+    decompressor = None
+    beneficiary_files = {}
+    schema = schema_for(file_path)
+    if schema is not None and schema.kind in CLAIM_KINDS:
+        files = find_input_files(input_dir)
+        if files['beneficiary']:
+            beneficiary_files = {p.name: file_signature(p) for p in files['beneficiary']}
+            beneficiary = await loop.run_in_executor(None, load_beneficiaries, files)
+            aggregator = ClaimStreamAggregator(file_path.name, beneficiary, block_bytes)
+            decompressor = StreamDecompressor(compression_for(file_path))
+        else:
+            logger.info(f"Sin beneficiarios subidos, {file_path.name} se agregará en la ingesta")
+
+    tmp_path = file_path.with_name(file_path.name + ".part")
+    pending = None
+    try:
+        with open(tmp_path, "wb") as buffer:
+            async for data in chunks:
+                if not data:
+                    continue
+                await loop.run_in_executor(None, buffer.write, data)
+                block = aggregator.feed(decompressor.feed(data)) if aggregator else None
+                if block is not None:
+                    if pending is not None:
+                        await pending
+                    pending = loop.run_in_executor(None, aggregator.process, block)
+        if pending is not None:
+            await pending
+        if aggregator is not None:
+            for block in (aggregator.feed(decompressor.flush()), aggregator.flush()):
+                if block is not None:
+                    await loop.run_in_executor(None, aggregator.process, block)
+        os.replace(tmp_path, file_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    aggregated = aggregator is not None and not aggregator.quality.errors
+    result = {"file_size": os.path.getsize(file_path), "aggregated": aggregated}
+    if aggregated:
+        partials.save(file_path, aggregator.state, beneficiary_files, aggregator.quality)
+        result.update({"rows": aggregator.rows, "providers": len(aggregator.state.sums)})
+    elif aggregator is not None:
+        # Sin parcial: la ingesta vuelve a leer el archivo y rechaza la ingesta con su informe
+        result["quality_errors"] = list(aggregator.quality.errors)
+    return result
@@ -0,0 +1,762 @@
+import pandas as pd
+import numpy as np
+import os
+import logging
+from pathlib import Path
+from typing import Callable, Collection, Dict, Any, List, Optional, Iterator
+from .feature_spec import FEATURE_DEFAULTS, PERIOD_COLUMN, PERIOD_SOURCE, source_columns, spec_fingerprint
+from .columnar_cache import read_table, iter_table_chunks, write_table, convert_csv_to_cache
+from .schema_registry import BENEFICIARY_TYPES, CLAIM_TYPES, SCHEMA_VERSION, concat_frames
+from .provider_aggregates import CLAIM_PRODUCTS, ProviderAggregateState, aggregate_in_chunks, product_columns
+from .aggregate_store import AggregateStateStore, UploadPartialStore, file_signature
+from .hll_sketch import precision_for_error, standard_error
+from .compression import input_glob
+from .ingest_progress import IngestCancelled, listening, report
+from .result_cache import IngestResultCache
+from .physician_network import compute_network_features, load_flagged_providers
+from .duplicate_claims import drilldown_path, duplicate_features, find_duplicate_claims
+from .claim_index import update_claim_index, index_path, is_available as claim_index_available
+from .data_quality import DataQualityError, DataQualityReport, close_file, collecting, merge_report, observe_chunk
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Directorios de entrada y salida
+DATA_DIR = Path(__file__).parent.parent / "data"
+INPUT_DIR = DATA_DIR / "test_uploaded"
+FINAL_OUTPUT_FILE = DATA_DIR / "test_final" / "test_final.csv"
+DASHBOARD_OUTPUT_FILE = DATA_DIR / "test_dashboard" / "test_dashboard.csv"
+PERIOD_OUTPUT_FILE = DATA_DIR / "test_periods" / "test_periods.csv"
+NETWORK_OUTPUT_FILE = DATA_DIR / "test_network" / "test_network.csv"
+CODE_OUTPUT_FILE = DATA_DIR / "test_final" / "test_codes.npz"
+DUPLICATE_OUTPUT_FILE = DATA_DIR / "test_duplicates" / "test_duplicates.csv"
+CLAIMS_OUTPUT_FILE = DATA_DIR / "test_claims" / "test_claims.arrow"
+
+# Proveedores señalados como fraude (opcional) para las features de red
+FLAGGED_PROVIDERS_FILE = DATA_DIR / "flagged_providers.csv"
+
+# Versión del pipeline de ingesta; cambiarla invalida los resultados en caché
+PIPELINE_VERSION = 2
+
+# Fracción del progreso que corresponde a leer y agregar los claims (el resto es combinar y escribir)
+READ_PROGRESS_SHARE = 0.8
+
+# Proveedores por evento de agregados finales (ver report_final_providers)
+FINAL_BATCH_SIZE = 500
+
+# Fecha de referencia para calcular la edad de los beneficiarios
+REFERENCE_DATE = pd.Timestamp("2009-01-01")
+
+# Columnas de beneficiarios que se unen a los claims (tipos en schema_registry)
+BENEFICIARY_COLUMNS = list(BENEFICIARY_TYPES)
+
+# Columnas de claims que se leen (las que no existan en el archivo se ignoran)
+CLAIM_COLUMNS = list(dict.fromkeys(list(CLAIM_TYPES) + source_columns() + [PERIOD_SOURCE]))
+
+# Columnas de salida de test_final.csv (predicción)
+FINAL_COLUMNS = [
+    'Provider', 'Total_Reimbursed', 'Mean_Reimbursed', 'Claim_Count',
+    'Unique_Beneficiaries', 'Avg_Beneficiary_Age', 'Pct_Male'
+]
+
+# Columnas de salida de test_periods.csv (features del modelo por proveedor y mes)
+PERIOD_COLUMNS = ['Provider', PERIOD_COLUMN] + FINAL_COLUMNS[1:]
+
+# Columnas de salida de test_dashboard.csv según especificación
+DASHBOARD_COLUMNS = [
+    'Provider', 'Total_Reimbursed', 'Mean_Reimbursed', 'Claim_Count', 'Unique_Beneficiaries',
+    'Alzheimer', 'Heartfailure', 'Cancer', 'ObstrPulmonary', 'Depression',
+    'Diabetes', 'IschemicHeart', 'Osteoporasis', 'Arthritis', 'Stroke',
+    'RenalDisease', 'Avg_Age', 'Pct_Male'
+]
+
+def find_input_files(input_dir: Path = INPUT_DIR) -> Dict[str, List[Path]]:
+    """
+    Busca los archivos de entrada por tipo en el directorio de subida
+    (CSV planos o comprimidos .csv.gz / .csv.zst, que se descomprimen al leer).
+
+    Args:
+        input_dir: Directorio con los archivos subidos
+
+    Returns:
+        Dict con las rutas encontradas por tipo de archivo
+    """
+    input_dir = Path(input_dir)
+    return {
+        'beneficiary': input_glob(input_dir, "*Beneficiary*"),
+        'inpatient': input_glob(input_dir, "*Inpatient*"),
+        'outpatient': input_glob(input_dir, "*Outpatient*"),
+    }
+
+
+def load_beneficiaries(files: Dict[str, List[Path]]) -> pd.DataFrame:
+    """
+    Lee los archivos de beneficiarios con solo las columnas necesarias y calcula Age.
+
+    Args:
+        files: Rutas por tipo de archivo (ver find_input_files)
+
+    Returns:
+        DataFrame de beneficiarios (vacío si no hay archivos)
+    """
+    beneficiary_files = files.get('beneficiary', [])
+    if not beneficiary_files:
+        logger.warning("No se encontraron datos de beneficiarios, se usarán valores por defecto")
+        return pd.DataFrame()
+
+    report("reading_beneficiaries")
+    frames = []
+    for file in beneficiary_files:
+        frame = read_table(file, BENEFICIARY_COLUMNS)
+        observe_chunk(file, frame)
+        close_file(file)
+        frames.append(frame)
+    beneficiary = concat_frames(frames)
+    logger.info(f"Beneficiarios cargados: {len(beneficiary)} filas")
+
+    # Limpieza de beneficiarios
+    beneficiary = beneficiary.drop_duplicates('BeneID')
+
+    # Calcular edad (años cumplidos) a la fecha de referencia
+    if 'DOB' in beneficiary.columns:
+        dob = pd.to_datetime(beneficiary['DOB'], errors='coerce')
+        beneficiary = beneficiary.drop(columns=['DOB'])
+        beneficiary['Age'] = np.trunc((REFERENCE_DATE - dob).dt.days / 365.25)
+
+    return beneficiary
+
+
+def join_beneficiaries(claims: pd.DataFrame, beneficiary: pd.DataFrame,
+                       columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Une los datos de beneficiarios a los claims (los datos de beneficiarios
+    prevalecen sobre columnas homónimas de los claims).
+
+    En lugar de un merge, BeneID se codifica como entero y se busca la posición
+    de cada claim en la tabla de beneficiarios; solo las columnas necesarias se
+    toman por posición, sin materializar la tabla ancha intermedia.
+
+    Args:
+        claims: Claims (completos o un bloque)
+        beneficiary: Beneficiarios con BeneID único (ver load_beneficiaries)
+        columns: Columnas de beneficiarios a unir (por defecto las que usan las features)
+
+    Returns:
+        Claims con las columnas de beneficiarios (NaN si el claim no tiene beneficiario)
+    """
+    if beneficiary.empty or 'BeneID' not in claims.columns:
+        return claims
+
+    needed = source_columns() if columns is None else columns
+    bene_columns = [col for col in beneficiary.columns if col != 'BeneID' and col in needed]
+    positions = beneficiary_positions(claims['BeneID'], beneficiary['BeneID'])
+
+    joined = {col: claims[col] for col in claims.columns if col not in bene_columns}
+    for col in bene_columns:
+        values = beneficiary[col]
+        values = values.array if isinstance(values.dtype, pd.api.extensions.ExtensionDtype) else values.to_numpy()
+        joined[col] = pd.api.extensions.take(values, positions, allow_fill=True)
+    return pd.DataFrame(joined, index=claims.index, copy=False)
+
+
+def beneficiary_positions(claim_ids: pd.Series, bene_ids: pd.Series) -> np.ndarray:
+    """
+    Posición en la tabla de beneficiarios de cada claim, con BeneID codificado como entero.
+
+    Si ambas columnas son categóricas se usan sus códigos: las categorías del bloque
+    de claims se traducen a códigos de beneficiarios (la tabla hash de las categorías
+    de beneficiarios se construye una vez y se reutiliza en cada bloque); si no, se
+    factorizan los BeneID de beneficiarios y se codifican los de los claims.
+
+    Args:
+        claim_ids: BeneID de los claims
+        bene_ids: BeneID de los beneficiarios (únicos)
+
+    Returns:
+        Array de posiciones (-1 si el claim no tiene beneficiario)
+    """
+    if isinstance(claim_ids.dtype, pd.CategoricalDtype) and isinstance(bene_ids.dtype, pd.CategoricalDtype):
+        translate = np.append(bene_ids.cat.categories.get_indexer(claim_ids.cat.categories), -1)
+        claim_codes = translate[claim_ids.cat.codes.to_numpy()]
+        bene_codes = bene_ids.cat.codes.to_numpy()
+        n_codes = len(bene_ids.cat.categories)
+    else:
+        bene_codes, uniques = pd.factorize(bene_ids.astype(str).where(bene_ids.notna()))
+        claim_codes = uniques.get_indexer(claim_ids.astype(str).where(claim_ids.notna()))
+        n_codes = len(uniques)
+
+    # Tabla código -> posición; la última entrada recibe el código -1 (sin beneficiario)
+    lookup = np.full(n_codes + 1, -1, dtype=np.intp)
+    valid = bene_codes >= 0
+    lookup[bene_codes[valid]] = np.flatnonzero(valid)
+    return lookup[claim_codes]
+
+
+def _claim_files_progress(files: Dict[str, List[Path]]):
+    """Pares (tipo, archivo, fracción del progreso al terminar de leerlo) según el tamaño de los archivos"""
+    claim_files = [(claim_type, file) for claim_type in ['inpatient', 'outpatient']
+                   for file in files.get(claim_type, [])]
+    total = sum(os.path.getsize(file) for _, file in claim_files) or 1
+    done = 0
+    for claim_type, file in claim_files:
+        done += os.path.getsize(file)
+        yield claim_type, file, READ_PROGRESS_SHARE * done / total
+
+
+def claim_columns(products: Collection[str] = ()) -> List[str]:
+    """
+    Columnas de claims a leer: las de CLAIM_COLUMNS más las que necesitan los productos
+    que se calculan en la misma pasada (ver provider_aggregates.CLAIM_PRODUCTS).
+    La validación de calidad se hace solo sobre CLAIM_COLUMNS.
+
+    Args:
+        products: Productos a calcular
+
+    Returns:
+        Columnas a leer
+    """
+    return list(dict.fromkeys(CLAIM_COLUMNS + product_columns(products)))
+
+
+def load_claims(files: Dict[str, List[Path]], columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Lee cada archivo una sola vez y construye la tabla intermedia de claims
+    (inpatient + outpatient) unida con los datos de beneficiarios.
+
+    Args:
+        files: Rutas por tipo de archivo (ver find_input_files)
+        columns: Columnas de claims a leer (por defecto CLAIM_COLUMNS, ver claim_columns)
+
+    Returns:
+        DataFrame de claims con Age, Gender y condiciones crónicas por claim
+    """
+    claims_list = []
+    for claim_type, file, fraction in _claim_files_progress(files):
+        report("reading_claims", file=file.name)
+        df = read_table(file, columns or CLAIM_COLUMNS)
+        observe_chunk(file, df, CLAIM_COLUMNS)
+        close_file(file)
+        # Las columnas de texto que solo usan los productos (médicos, códigos) se guardan
+        # como categóricas: la tabla completa ocupa mucho menos y sus valores distintos
+        # solo se normalizan una vez
+        for col in df.columns:
+            if col not in CLAIM_COLUMNS and df[col].dtype == object:
+                df[col] = df[col].astype('category')
+        logger.info(f"Procesando {claim_type}: {file} - {len(df)} filas")
+        claims_list.append(df)
+        report(rows=len(df), fraction=fraction, file=file.name)
+
+    if not claims_list:
+        return pd.DataFrame()
+
+    claims = concat_frames(claims_list)
+    claims = join_beneficiaries(claims, load_beneficiaries(files))
+    logger.info(f"Claims con beneficiarios: {len(claims)} registros")
+    return claims
+
+
+def iter_raw_claim_chunks(files: Dict[str, List[Path]], chunk_size: int,
+                          columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Lee los claims (inpatient y outpatient) por bloques de tamaño fijo, sin unir beneficiarios.
+
+    Args:
+        files: Rutas por tipo de archivo (ver find_input_files)
+        chunk_size: Número de filas por bloque
+        columns: Columnas de claims a leer (por defecto CLAIM_COLUMNS, ver claim_columns)
+
+    Yields:
+        Bloques de claims con las columnas indicadas
+    """
+    for claim_type, file, fraction in _claim_files_progress(files):
+        logger.info(f"Procesando {claim_type} por bloques de {chunk_size} filas: {file}")
+        report("reading_claims", file=file.name)
+        for chunk in iter_table_chunks(file, chunk_size, columns or CLAIM_COLUMNS):
+            observe_chunk(file, chunk, CLAIM_COLUMNS)
+            report(rows=len(chunk), file=file.name)
+            yield chunk
+        close_file(file)
+        report(fraction=fraction, file=file.name)
+
+
+def iter_claim_chunks(files: Dict[str, List[Path]], chunk_size: int,
+                      columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Lee los claims por bloques de tamaño fijo, cada bloque ya unido con beneficiarios.
+    Solo la tabla de beneficiarios se mantiene completa en memoria.
+
+    Args:
+        files: Rutas por tipo de archivo (ver find_input_files)
+        chunk_size: Número de filas por bloque
+        columns: Columnas de claims a leer (por defecto CLAIM_COLUMNS, ver claim_columns)
+
+    Yields:
+        Bloques de claims unidos con beneficiarios
+    """
+    beneficiary = load_beneficiaries(files)
+    for chunk in iter_raw_claim_chunks(files, chunk_size, columns):
+        yield join_beneficiaries(chunk, beneficiary)
+
+
+def aggregate_by_provider(claims: pd.DataFrame) -> pd.DataFrame:
+    """
+    Ejecuta una única agregación por proveedor con todas las features de
+    feature_spec que necesitan tanto test_final.csv como test_dashboard.csv.
+
+    Args:
+        claims: Tabla intermedia de claims (ver load_claims)
+
+    Returns:
+        DataFrame con una fila por Provider
+    """
+    return ProviderAggregateState.from_claims(claims).finalize()
+
+
+def _select_columns(agg_by_provider: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    """Selecciona y ordena columnas, completando las faltantes con valores por defecto"""
+    df = agg_by_provider.copy()
+    for col in columns:
+        if col not in df.columns:
+            df[col] = FEATURE_DEFAULTS.get(col, 0.0)
+    return df[columns].fillna(0)
+
+
+def build_final_table(agg_by_provider: pd.DataFrame) -> pd.DataFrame:
+    """
+    Construye la tabla de features del modelo (test_final.csv).
+
+    Args:
+        agg_by_provider: Agregados por proveedor (ver aggregate_by_provider)
+
+    Returns:
+        DataFrame con las columnas de FINAL_COLUMNS
+    """
+    df = agg_by_provider.rename(columns={'Avg_Age': 'Avg_Beneficiary_Age'})
+    return _select_columns(df, FINAL_COLUMNS)
+
+
+def build_dashboard_table(agg_by_provider: pd.DataFrame) -> pd.DataFrame:
+    """
+    Construye la tabla del dashboard (test_dashboard.csv).
+
+    Args:
+        agg_by_provider: Agregados por proveedor (ver aggregate_by_provider)
+
+    Returns:
+        DataFrame con las columnas de DASHBOARD_COLUMNS
+    """
+    return _select_columns(agg_by_provider, DASHBOARD_COLUMNS)
+
+
+def build_period_table(agg_by_period: pd.DataFrame) -> pd.DataFrame:
+    """
+    Construye la tabla de features del modelo por proveedor y mes (test_periods.csv).
+
+    Args:
+        agg_by_period: Agregados por (Provider, Period) (ver ProviderAggregateState.finalize_periods)
+
+    Returns:
+        DataFrame con las columnas de PERIOD_COLUMNS
+    """
+    df = agg_by_period.rename(columns={'Avg_Age': 'Avg_Beneficiary_Age'})
+    return _select_columns(df, PERIOD_COLUMNS)
+
+
+def report_final_providers(agg_by_provider: pd.DataFrame) -> int:
+    """
+    Informa al seguimiento activo las features de proveedores cuyos agregados ya
+    son definitivos, en lotes de FINAL_BATCH_SIZE (evento con 'final_rows'), para
+    que se puedan puntuar antes de que termine la ingesta.
+
+    Args:
+        agg_by_provider: Agregados finalizados por proveedor
+
+    Returns:
+        Número de proveedores informados
+    """
+    final_df = build_final_table(agg_by_provider)
+    for start in range(0, len(final_df), FINAL_BATCH_SIZE):
+        report(final_rows=final_df.iloc[start:start + FINAL_BATCH_SIZE])
+    return len(final_df)
+
+
+def aggregate_files(files: Dict[str, List[Path]], chunk_size: Optional[int] = None,
+                    workers: Optional[int] = None,
+                    sketch_precision: Optional[int] = None,
+                    partials: Optional[UploadPartialStore] = None,
+                    on_partition: Optional[Callable[[ProviderAggregateState], None]] = None,
+                    products: Collection[str] = ()) -> ProviderAggregateState:
+    """
+    Agrega los claims de los archivos indicados en un estado parcial combinable.
+    Los archivos que ya se agregaron durante la subida (ver stream_ingestor) no se vuelven a leer:
+    su informe de calidad se incorpora al informe activo y se comprueban sus proporciones
+    como las de un archivo leído en la ingesta.
+
+    Args:
+        files: Rutas por tipo de archivo (ver find_input_files)
+        chunk_size: Si se indica, lee los claims por bloques de este tamaño
+        workers: Si es mayor a 1, agrega particiones por hash de Provider en un pool de procesos
+        sketch_precision: Precisión HyperLogLog para las features 'nunique' (None = exacto)
+        partials: Agregados parciales calculados en la subida (por defecto data/upload_partials)
+        on_partition: En modo paralelo, función que recibe cada partición terminada. Solo se
+            usa si no hay agregados de la subida que combinar (si no, las particiones no son finales)
+        products: Productos de provider_aggregates.CLAIM_PRODUCTS a calcular en la misma pasada
+
+    Returns:
+        Estado agregado por proveedor (vacío si no hay claims)
+
+    Raises:
+        DataQualityError: Si algún archivo (leído o agregado en la subida) no supera la validación
+    """
+    partials = partials or UploadPartialStore()
+    beneficiary_files = {p.name: file_signature(p) for p in files.get('beneficiary', [])}
+    precomputed = []
+    pending_files = dict(files)
+    for claim_type in ['inpatient', 'outpatient']:
+        pending_files[claim_type] = []
+        for path in files.get(claim_type, []):
+            partial = partials.load(path, beneficiary_files, sketch_precision, products)
+            if partial is None:
+                pending_files[claim_type].append(path)
+            else:
+                logger.info(f"Usando agregado calculado durante la subida: {path.name}")
+                partial_state, partial_quality = partial
+                merge_report(partial_quality)
+                close_file(path)
+                precomputed.append(partial_state.with_products(products))
+
+    state = _aggregate_claim_files(pending_files, chunk_size, workers, sketch_precision,
+                                   on_partition if not precomputed else None, products)
+    if precomputed:
+        report("merging_partials")
+        state = ProviderAggregateState.merge_all([state] + precomputed)
+    return state
+
+
+def _aggregate_claim_files(files: Dict[str, List[Path]], chunk_size: Optional[int],
+                           workers: Optional[int], sketch_precision: Optional[int],
+                           on_partition: Optional[Callable[[ProviderAggregateState], None]] = None,
+                           products: Collection[str] = ()) -> ProviderAggregateState:
+    """Lee y agrega los claims de los archivos indicados (ver aggregate_files)"""
+    if not files.get('inpatient') and not files.get('outpatient'):
+        return ProviderAggregateState()
+    if workers and workers > 1:
+        from .parallel_ingestor import aggregate_parallel
+        return aggregate_parallel(files, workers, chunk_size, sketch_precision=sketch_precision,
+                                  on_partition=on_partition, products=products)
+    columns = claim_columns(products)
+    if chunk_size:
+        return aggregate_in_chunks(iter_claim_chunks(files, chunk_size, columns), sketch_precision, products)
+    claims = load_claims(files, columns)
+    if claims.empty:
+        return ProviderAggregateState()
+    return ProviderAggregateState.from_claims(claims, sketch_precision=sketch_precision, products=products)
+
+
+def _update_output(rows: pd.DataFrame, output: Path) -> None:
+    """Reemplaza en un archivo de salida existente solo las filas de los proveedores recalculados"""
+    existing = read_table(output)
+    existing['Provider'] = existing['Provider'].astype(str)
+    rows = rows.assign(Provider=rows['Provider'].astype(str))
+    existing = existing[~existing['Provider'].isin(rows['Provider'])]
+    sort_by = ['Provider', PERIOD_COLUMN] if PERIOD_COLUMN in rows.columns else 'Provider'
+    combined = pd.concat([existing, rows], ignore_index=True).sort_values(sort_by, ignore_index=True)
+    write_table(combined, output)
+
+
+def process_all_files(input_dir: Path = INPUT_DIR,
+                      final_output: Optional[Path] = FINAL_OUTPUT_FILE,
+                      dashboard_output: Optional[Path] = DASHBOARD_OUTPUT_FILE,
+                      period_output: Optional[Path] = PERIOD_OUTPUT_FILE,
+                      network_output: Optional[Path] = NETWORK_OUTPUT_FILE,
+                      flagged_file: Path = FLAGGED_PROVIDERS_FILE,
+                      code_output: Optional[Path] = CODE_OUTPUT_FILE,
+                      duplicate_output: Optional[Path] = DUPLICATE_OUTPUT_FILE,
+                      claims_output: Optional[Path] = CLAIMS_OUTPUT_FILE,
+                      chunk_size: Optional[int] = None,
+                      incremental: bool = False,
+                      store: Optional[AggregateStateStore] = None,
+                      workers: Optional[int] = None,
+                      distinct_error: Optional[float] = None,
+                      use_cache: bool = True,
+                      result_cache: Optional[IngestResultCache] = None) -> Dict[str, Any]:
+    """
+    Procesa los archivos de test en una sola pasada: lee cada archivo una vez,
+    agrega por proveedor una vez y genera test_final.csv y test_dashboard.csv
+    desde el mismo resultado intermedio.
+
+    Args:
+        input_dir: Directorio con los archivos subidos
+        final_output: Ruta de test_final.csv (None para no generarlo)
+        dashboard_output: Ruta de test_dashboard.csv (None para no generarlo)
+        period_output: Ruta de test_periods.csv, features por proveedor y mes de
+            ClaimStartDt (None para no generarlo)
+        network_output: Ruta de test_network.csv, features de la red proveedor-médico
+            (None para no generarlo). Se recalcula completa en cada ingesta con los pares
+            proveedor-médico recogidos al agregar (en modo incremental, guardados en el estado)
+        flagged_file: CSV con los proveedores señalados para las features de red
+        code_output: Ruta de test_codes.npz, conteos dispersos de códigos de diagnóstico y
+            procedimiento por proveedor con hashing, contados en la misma pasada que los
+            agregados (None para no generarlo)
+        duplicate_output: Ruta de test_duplicates.csv, tasas de claims repetidos por proveedor
+            (mismo beneficiario, fechas y diagnósticos); el detalle de los claims repetidos se
+            guarda junto a él en test_duplicate_claims.csv (None para no generarlos). Las firmas
+            se calculan en la misma pasada que los agregados; en modo incremental solo se
+            comparan las firmas nuevas con las guardadas en el estado
+        claims_output: Ruta de test_claims.arrow, los claims ordenados por Provider con su
+            índice de offsets en test_claims_index.csv para la consulta paginada por
+            proveedor (None para no generarlos; requiere pyarrow). No se guarda en la caché
+            de resultados: los archivos nuevos se agregan como un segmento aparte. Con
+            chunk_size los claims también se ordenan por bloques (ver claim_index)
+        chunk_size: Si se indica, lee los claims por bloques de este tamaño y combina
+            agregados parciales, de modo que la memoria no depende del número de claims
+        incremental: Si es True, mantiene un estado persistido de agregados y solo procesa
+            los archivos de claims nuevos, reescribiendo únicamente los proveedores afectados.
+            Si cambian los beneficiarios, la definición de features o un archivo ya procesado,
+            se recalcula todo
+        store: Estado persistido a usar en modo incremental (por defecto data/aggregate_state)
+        workers: Número de procesos para agregar en paralelo particiones por hash de Provider
+            (None o 1 para procesar en serie; el resultado es idéntico)
+        distinct_error: Si se indica, Unique_Beneficiaries se aproxima con sketches
+            HyperLogLog de tamaño fijo por proveedor con este error relativo (p. ej. 0.02),
+            en lugar de guardar todos los pares Provider/BeneID. Por defecto el conteo es exacto
+        use_cache: Si es True y el mismo contenido de entrada ya se procesó con la misma
+            versión del pipeline, se restauran las salidas guardadas sin volver a agregar
+        result_cache: Caché de resultados a usar (por defecto data/ingest_cache)
+
+    Returns:
+        Dict con información del procesamiento
+    """
+    try:
+        report("starting")
+        files = find_input_files(input_dir)
+        logger.info("Archivos encontrados: " + ", ".join(f"{k}={len(v)}" for k, v in files.items()))
+
+        claim_files = {p.name: file_signature(p) for p in files['inpatient'] + files['outpatient']}
+        beneficiary_files = {p.name: file_signature(p) for p in files['beneficiary']}
+        if not claim_files:
+            logger.warning("No se encontraron datos de claims")
+            return {
+                "success": False,
+                "message": "No se encontraron datos de claims (Inpatient/Outpatient)"
+            }
+
+        mode = "parallel" if workers and workers > 1 else "chunked" if chunk_size else "in_memory"
+        # Productos de los claims que se calculan en la misma pasada que los agregados
+        requested = {'physicians': network_output, 'codes': code_output, 'signatures': duplicate_output}
+        products = [product for product in CLAIM_PRODUCTS if requested.get(product) is not None]
+        sketch_precision = precision_for_error(distinct_error) if distinct_error is not None else None
+
+        outputs = {'test_final': final_output, 'test_dashboard': dashboard_output,
+                   'test_periods': period_output, 'test_network': network_output,
+                   'test_codes': code_output, 'test_duplicates': duplicate_output,
+                   'test_duplicate_claims': drilldown_path(duplicate_output) if duplicate_output is not None else None}
+        if not claim_index_available():
+            claims_output = None
+        # Los claims ordenados no pasan por la caché de resultados: se actualizan en el lugar
+        claim_outputs = {'test_claims': claims_output,
+                         'test_claims_index': index_path(claims_output) if claims_output is not None else None}
+        cache_key = None
+        if use_cache:
+            result_cache = result_cache or IngestResultCache()
+            flagged_files = [Path(flagged_file)] if network_output is not None and Path(flagged_file).exists() else []
+            cache_key = result_cache.key_for(
+                files['beneficiary'] + files['inpatient'] + files['outpatient'] + flagged_files,
+                {"pipeline": PIPELINE_VERSION, "feature_spec": spec_fingerprint(),
+                 "schema": SCHEMA_VERSION, "sketch_precision": sketch_precision}
+            )
+            cached = result_cache.lookup(cache_key, outputs)
+            if cached is not None:
+                if listening() and final_output is not None:
+                    report_final_providers(read_table(final_output))
+                if claims_output is not None:
+                    report("indexing_claims")
+                    update_claim_index(files, claims_output, chunk_size)
+                report("completed", fraction=1.0, cache_hit=True)
+                for path in outputs.values():
+                    if path is not None and Path(path).suffix == '.csv':
+                        convert_csv_to_cache(path)
+                return {
+                    **cached,
+                    "cache_hit": True,
+                    "output_files": {name: str(path) for name, path in {**outputs, **claim_outputs}.items()
+                                     if path is not None},
+                }
+
+        # Con alguien escuchando, en modo paralelo cada partición terminada se informa
+        # como agregados finales en cuanto se completa
+        streamed = []
+
+        def on_partition(partition_state: ProviderAggregateState) -> None:
+            if listening():
+                partition = partition_state.finalize()
+                report_final_providers(partition)
+                streamed.append(partition['Provider'])
+
+        affected_only = False
+        # La validación se hace sobre los bloques que se leen para agregar, antes de unir beneficiarios
+        quality = DataQualityReport()
+        with collecting(quality):
+            if incremental:
+                store = store or AggregateStateStore()
+                manifest = store.load_manifest()
+                outputs_exist = all(output is None or Path(output).exists()
+                                    for output in outputs.values())
+                can_fold = (
+                    manifest is not None and outputs_exist
+                    and manifest.get("sketch_precision") == sketch_precision
+                    and manifest.get("products") == products
+                    and manifest["beneficiary_files"] == beneficiary_files
+                    and all(claim_files.get(name) == signature
+                            for name, signature in manifest["claim_files"].items())
+                )
+                if can_fold:
+                    mode = "incremental"
+                    new_files = {
+                        'beneficiary': files['beneficiary'],
+                        'inpatient': [p for p in files['inpatient'] if p.name not in manifest["claim_files"]],
+                        'outpatient': [p for p in files['outpatient'] if p.name not in manifest["claim_files"]],
+                    }
+                    logger.info(f"Ingesta incremental: {len(new_files['inpatient']) + len(new_files['outpatient'])} archivos nuevos")
+                    delta = aggregate_files(new_files, chunk_size, workers, sketch_precision, products=products)
+                    state = store.fold(delta, claim_files, beneficiary_files) if not delta.sums.empty else delta
+                    affected_only = True
+                else:
+                    logger.info("Estado incremental no reutilizable, se recalculan todos los proveedores")
+                    state = aggregate_files(files, chunk_size, workers, sketch_precision,
+                                            on_partition=on_partition, products=products)
+                    store.save(state, claim_files, beneficiary_files)
+            else:
+                state = aggregate_files(files, chunk_size, workers, sketch_precision,
+                                        on_partition=on_partition, products=products)
+        quality_report = quality.finish()
+
+        agg_by_provider = state.finalize()
+        if agg_by_provider.empty and not affected_only:
+            logger.warning("No se encontraron datos de claims")
+            return {
+                "success": False,
+                "message": "No se encontraron datos de claims (Inpatient/Outpatient)"
+            }
+
+        if listening():
+            pending = agg_by_provider
+            if streamed:
+                pending = pending[~pending['Provider'].isin(pd.concat(streamed))]
+            report_final_providers(pending)
+
+        report("writing_outputs", fraction=0.9)
+        output_files = {}
+        write_output = _update_output if affected_only else write_table
+        if final_output is not None and not agg_by_provider.empty:
+            final_df = build_final_table(agg_by_provider)
+            write_output(final_df, final_output)
+            output_files['test_final'] = str(final_output)
+            logger.info(f"Archivo test_final.csv guardado en: {final_output}")
+
+        if dashboard_output is not None and not agg_by_provider.empty:
+            dashboard_df = build_dashboard_table(agg_by_provider)
+            write_output(dashboard_df, dashboard_output)
+            output_files['test_dashboard'] = str(dashboard_output)
+            logger.info(f"Dashboard guardado en: {dashboard_output}")
+
+        total_periods = 0
+        if period_output is not None and not agg_by_provider.empty:
+            period_df = build_period_table(state.finalize_periods())
+            if not period_df.empty:
+                write_output(period_df, period_output)
+                output_files['test_periods'] = str(period_output)
+                total_periods = len(period_df)
+                logger.info(f"Agregados mensuales guardados en: {period_output} ({total_periods} filas)")
+
+        if network_output is not None and not agg_by_provider.empty:
+            # La red es global (un archivo nuevo cambia vecinos y componentes): siempre completa,
+            # con los pares recogidos al agregar (en modo incremental, los guardados más los nuevos)
+            report("building_network")
+            providers = agg_by_provider['Provider']
+            if affected_only and final_output is not None:
+                providers = read_table(final_output, ['Provider'])['Provider'].astype(str)
+            network_df = compute_network_features(state.physicians, providers,
+                                                  load_flagged_providers(flagged_file))
+            write_table(network_df, network_output)
+            output_files['test_network'] = str(network_output)
+            logger.info(f"Features de red guardadas en: {network_output}")
+
+        if code_output is not None and not agg_by_provider.empty:
+            # Contados al agregar; en modo incremental, los guardados en el estado más los nuevos
+            report("counting_codes")
+            state.codes.save(code_output)
+            output_files['test_codes'] = str(code_output)
+
+        if duplicate_output is not None and not agg_by_provider.empty:
+            # Las firmas se calculan al agregar; con estado incremental, los conteos ya se
+            # actualizaron en el estado con las firmas nuevas
+            report("finding_duplicates")
+            if incremental:
+                counts, drilldown_df = store.load_duplicates()
+                duplicate_df = duplicate_features(counts)
+            else:
+                duplicate_df, drilldown_df = find_duplicate_claims(state.signatures)
+            write_table(duplicate_df, duplicate_output)
+            write_table(drilldown_df, drilldown_path(duplicate_output))
+            output_files['test_duplicates'] = str(duplicate_output)
+            output_files['test_duplicate_claims'] = str(drilldown_path(duplicate_output))
+            logger.info(f"Claims repetidos guardados en: {duplicate_output}")
+
+        if claims_output is not None and not agg_by_provider.empty:
+            # Solo se ordenan los archivos que todavía no están indexados
+            report("indexing_claims")
+            update_claim_index(files, claims_output, chunk_size)
+            output_files['test_claims'] = str(claims_output)
+            output_files['test_claims_index'] = str(index_path(claims_output))
+
+        logger.info(f"Proveedores procesados: {len(agg_by_provider)}")
+
+        total_providers = len(agg_by_provider)
+        if affected_only and final_output is not None:
+            total_providers = len(read_table(final_output, ['Provider']))
+
+        result = {
+            "success": True,
+            "message": "Procesamiento completado",
+            "input_files": {k: len(v) for k, v in files.items()},
+            "total_providers": total_providers,
+            "affected_providers": len(agg_by_provider),
+            "total_periods": total_periods,
+            "mode": mode,
+            "distinct_mode": "approximate" if sketch_precision is not None else "exact",
+            "distinct_error": round(standard_error(sketch_precision), 4) if sketch_precision is not None else 0.0,
+            "cache_hit": False,
+            "quality_report": quality_report,
+            "output_files": output_files
+        }
+        if incremental:
+            # El estado solo se marca como reutilizable con todas las salidas ya reemplazadas
+            store.commit()
+        if cache_key is not None and output_files:
+            result_cache.store(cache_key, outputs, result)
+        report("completed", fraction=1.0, cache_hit=False)
+        return result
+
+    except IngestCancelled:
+        logger.info("Ingesta cancelada")
+        raise
+    except DataQualityError as e:
+        return {
+            "success": False,
+            "message": str(e),
+            "error": str(e),
+            "quality_report": e.report
+        }
+    except Exception as e:
+        logger.error(f"Error procesando archivos: {str(e)}")
+        return {
+            "success": False,
+            "message": f"Error procesando archivos: {str(e)}",
+            "error": str(e)
+        }
+
+
+if __name__ == '__main__':
+    process_all_files()
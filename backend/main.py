@@ -1,24 +1,34 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Body
+# Primero el temporizador, para medir también las importaciones
+from agents.startup_timing import startup_timer
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Body, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import os
 import shutil
 import json
-from typing import List, Dict, Any
+import asyncio
+from pathlib import Path
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 import logging
 import pandas as pd
 from pydantic import BaseModel
 import numpy as np
-import joblib
-import lime
-import lime.lime_tabular
 
 # Importar agentes
 from agents.ingestor import DataIngestor, process_test_files
-from agents.predictor import FraudPredictor
-from agents.dashboard_ingestor import process_dashboard_files
+from agents.predictor import FraudPredictor, convert_numpy_types
+from agents.prediction_batcher import PredictionBatcher
+from agents.unified_ingestor import process_all_files, DASHBOARD_OUTPUT_FILE
+from agents.ingest_jobs import ingest_jobs
+from agents.columnar_cache import read_table, convert_csv_to_cache
+from agents.code_features import ProviderCodeCounts
+from agents.claim_index import MAX_PAGE_SIZE, open_claim_index
+from agents.stream_ingestor import stream_upload
+from agents.compression import is_csv_file, is_supported
 from agents.shap_explainer import SHAPExplainer
 from agents.lime_explainer import LIMEExplainer
+from agents.model_registry import get_registry
 
 # Para Gemini AI (opcional)
 import requests
@@ -31,6 +41,14 @@ from utils.ai_assistant import ai_assistant_chat
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+startup_timer.mark("imports")
+
+# Modo de arranque: "fast" (por defecto) publica el modelo apenas se carga (el evaluador
+# compilado se prepara en segundo plano) y crea los explainers SHAP/LIME en su primer uso;
+# "eager" prepara todo antes de empezar a atender
+STARTUP_MODE = os.environ.get("STARTUP_MODE", "fast").lower()
+FAST_START = STARTUP_MODE != "eager"
+
 # Modelo para predicción individual
 class SinglePredictionRequest(BaseModel):
     Provider: str
@@ -55,11 +73,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Inicializar agentes
+# Inicializar agentes (el predictor y los explainers comparten el modelo del registro)
 ingestor = DataIngestor()
-predictor = FraudPredictor()
-shap_explainer = SHAPExplainer()
-lime_explainer = LIMEExplainer()
+model_registry = get_registry(fast_start=FAST_START)
+predictor = FraudPredictor(registry=model_registry)
+startup_timer.mark("model_load")
+# Las predicciones individuales concurrentes se puntúan en lotes
+prediction_batcher = PredictionBatcher(predictor)
+shap_explainer = SHAPExplainer(registry=model_registry, lazy=FAST_START)
+lime_explainer = LIMEExplainer(registry=model_registry, lazy=FAST_START)
+startup_timer.mark("explainers")
+
+# Recargar el modelo en segundo plano cuando cambie models/xgb_fraud_model.pkl
+model_registry.start_watching()
 
 # Para Gemini AI (opcional)
 import requests
@@ -93,19 +119,35 @@ async def root():
         "version": "1.0.0"
     }
 
+def _save_upload(file: UploadFile, file_path: str) -> None:
+    """Guarda un archivo subido y genera su caché columnar (trabajo bloqueante, se ejecuta en un hilo)"""
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+
+    # Convertir una sola vez a formato columnar tipado para las lecturas posteriores
+    try:
+        convert_csv_to_cache(file_path)
+    except Exception as cache_err:
+        logger.warning(f"No se pudo generar el caché columnar de {file_path}: {cache_err}")
+
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
     """
     Endpoint para subir archivos CSV de test a data/test_uploaded/
+    Acepta CSV comprimidos (.csv.gz, .csv.zst), que se guardan sin descomprimir.
     """
     try:
-        if not file.filename or not file.filename.lower().endswith('.csv'):
-            raise HTTPException(status_code=400, detail="Solo se permiten archivos CSV")
+        if not file.filename or not is_csv_file(file.filename):
+            raise HTTPException(status_code=400, detail="Solo se permiten archivos CSV (.csv, .csv.gz o .csv.zst)")
+        if not is_supported(file.filename):
+            raise HTTPException(status_code=400, detail="Los archivos .csv.zst requieren el paquete zstandard")
         upload_dir = "data/test_uploaded"
         os.makedirs(upload_dir, exist_ok=True)
         file_path = os.path.join(upload_dir, file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # La copia y la conversión se hacen en un hilo para no bloquear el event loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, _save_upload, file, file_path)
+        
         return {
             "success": True,
             "message": "Archivo subido exitosamente",
@@ -113,44 +155,293 @@ async def upload_file(file: UploadFile = File(...)):
             "file_path": file_path,
             "file_size": os.path.getsize(file_path)
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error subiendo archivo: {str(e)}")
 
+@app.post("/upload-stream")
+async def upload_file_stream(request: Request, filename: str):
+    """
+    Sube un CSV enviado como cuerpo de la petición (sin multipart), leyéndolo por bloques
+    sin bloquear el event loop. Los archivos de claims se agregan mientras llegan los bytes,
+    de modo que /ingest reutiliza el agregado en lugar de volver a leer el archivo.
+    """
+    try:
+        filename = os.path.basename(filename)
+        if not is_csv_file(filename):
+            raise HTTPException(status_code=400, detail="Solo se permiten archivos CSV (.csv, .csv.gz o .csv.zst)")
+        if not is_supported(filename):
+            raise HTTPException(status_code=400, detail="Los archivos .csv.zst requieren el paquete zstandard")
+        upload_dir = "data/test_uploaded"
+        file_path = os.path.join(upload_dir, filename)
+        result = await stream_upload(request.stream(), Path(file_path), input_dir=Path(upload_dir))
+        
+        return {
+            "success": True,
+            "message": "Archivo subido exitosamente",
+            "filename": filename,
+            "file_path": file_path,
+            **result
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error subiendo archivo: {str(e)}")
+
+def _ingest_params(chunk_size: Optional[int], incremental: bool, workers: Optional[int],
+                   distinct_error: Optional[float], use_cache: bool) -> Dict[str, Any]:
+    """Valida los parámetros de ingesta y los convierte en argumentos de process_all_files"""
+    if chunk_size is not None and chunk_size <= 0:
+        raise HTTPException(status_code=400, detail="chunk_size debe ser mayor a 0")
+    if workers is not None and workers <= 0:
+        raise HTTPException(status_code=400, detail="workers debe ser mayor a 0")
+    if distinct_error is not None and not 0 < distinct_error < 1:
+        raise HTTPException(status_code=400, detail="distinct_error debe estar entre 0 y 1")
+    return {
+        "chunk_size": chunk_size,
+        "incremental": incremental,
+        "workers": workers,
+        "distinct_error": distinct_error,
+        "use_cache": use_cache,
+    }
+
 @app.post("/ingest")
-async def ingest_data():
+async def ingest_data(chunk_size: Optional[int] = None, incremental: bool = False,
+                      workers: Optional[int] = None, distinct_error: Optional[float] = None,
+                      use_cache: bool = True):
     """
     Procesa los 4 archivos de test en data/test_uploaded/ y genera tanto test_final.csv como test_dashboard.csv.
+    Cada archivo se lee una sola vez y la agregación por proveedor se comparte entre ambas salidas.
+    Con chunk_size los claims se leen por bloques (para archivos más grandes que la memoria).
+    Con incremental=true solo se procesan los archivos de claims nuevos y se reescriben los proveedores afectados.
+    Con workers > 1 la agregación se reparte por hash de Provider en un pool de procesos.
+    Con distinct_error (p. ej. 0.02) Unique_Beneficiaries se aproxima con sketches HyperLogLog
+    de tamaño fijo por proveedor; por defecto el conteo es exacto.
+    Si el contenido de los archivos ya se procesó con la misma versión del pipeline, se reutilizan
+    las salidas guardadas (cache_hit=true); use_cache=false fuerza el reprocesamiento.
+    La respuesta incluye quality_report (nulos, rangos, importes negativos, fechas inválidas y
+    ClaimID duplicados); si los archivos no superan la validación, la ingesta falla antes de agregar
+    y se responde 422 con el mensaje y quality_report en detail.
+    El procesamiento se ejecuta como trabajo en segundo plano (ver /ingest/jobs) y este endpoint
+    espera su resultado sin bloquear el resto de la API.
     """
     try:
-        # Ejecutar ingestor normal para test_final.csv
-        logger.info("Ejecutando ingestor normal...")
-        process_test_files()
+        params = _ingest_params(chunk_size, incremental, workers, distinct_error, use_cache)
         
-        # Ejecutar ingestor de dashboard para test_dashboard.csv
-        logger.info("Ejecutando ingestor de dashboard...")
-        success = process_dashboard_files()
+        logger.info("Ejecutando ingestor unificado...")
+        job, _ = ingest_jobs.submit(**params)
+        await asyncio.wrap_future(job.future)
         
-        if not success:
-            raise HTTPException(status_code=500, detail="Error generando datos de dashboard")
+        if job.status != "completed":
+            quality_report = (job.result or {}).get("quality_report")
+            if quality_report is not None:
+                # Archivos rechazados por la validación: error del cliente, con el informe
+                raise HTTPException(status_code=422, detail={
+                    "message": job.error or "Los archivos no superan la validación",
+                    "job_id": job.job_id,
+                    "quality_report": quality_report
+                })
+            raise HTTPException(status_code=500, detail=job.error or "Error en procesamiento")
+        result = job.result
         
         return {
             "success": True, 
-            "message": "Procesamiento completado: test_final.csv y test_dashboard.csv generados"
+            "message": "Procesamiento completado: test_final.csv y test_dashboard.csv generados",
+            "job_id": job.job_id,
+            "total_providers": result["total_providers"],
+            "affected_providers": result["affected_providers"],
+            "mode": result["mode"],
+            "distinct_mode": result["distinct_mode"],
+            "distinct_error": result["distinct_error"],
+            "cache_hit": result["cache_hit"],
+            "quality_report": result.get("quality_report")
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en procesamiento: {str(e)}")
 
+@app.post("/ingest/jobs")
+async def submit_ingest_job(chunk_size: Optional[int] = None, incremental: bool = False,
+                            workers: Optional[int] = None, distinct_error: Optional[float] = None,
+                            use_cache: bool = True):
+    """
+    Encola una ingesta (mismos parámetros que /ingest) y devuelve su id sin esperar.
+    Si ya hay un trabajo igual en curso para los mismos archivos, se devuelve ese trabajo.
+    """
+    try:
+        params = _ingest_params(chunk_size, incremental, workers, distinct_error, use_cache)
+        job, coalesced = ingest_jobs.submit(**params)
+        return {
+            "success": True,
+            "job_id": job.job_id,
+            "status": job.status,
+            "coalesced": coalesced
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error encolando ingesta: {str(e)}")
+
+@app.get("/ingest/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """Estado de un trabajo de ingesta: etapa, filas procesadas, tiempo transcurrido y ETA"""
+    try:
+        job = ingest_jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Trabajo '{job_id}' no encontrado")
+        return {"success": True, "job": job.to_dict()}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo trabajo: {str(e)}")
+
+@app.post("/ingest/jobs/{job_id}/cancel")
+async def cancel_ingest_job(job_id: str):
+    """Cancela un trabajo de ingesta en cola o en ejecución"""
+    try:
+        job = ingest_jobs.cancel(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Trabajo '{job_id}' no encontrado")
+        return {"success": True, "job": job.to_dict()}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error cancelando trabajo: {str(e)}")
+
+@app.get("/ingest/jobs/{job_id}/result")
+async def get_ingest_job_result(job_id: str):
+    """Resultado de un trabajo de ingesta terminado"""
+    try:
+        job = ingest_jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Trabajo '{job_id}' no encontrado")
+        if job.status in ("queued", "running"):
+            raise HTTPException(status_code=409, detail=f"El trabajo '{job_id}' aún no terminó")
+        return {
+            "success": job.status == "completed",
+            "job": job.to_dict(),
+            "result": job.result
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo resultado: {str(e)}")
+
+# Segundos sin eventos tras los que se envía un keepalive al cliente
+EVENT_KEEPALIVE_SECONDS = 15
+
+async def _ingest_events(job, predict: bool) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Eventos de un trabajo de ingesta a medida que ocurren.
+
+    Emite 'progress' con cada avance, 'predictions' con las predicciones de cada lote
+    de proveedores cuyos agregados ya son finales (con predictor.predict_from_dataframe),
+    'keepalive' si no hay actividad y 'done' con el estado final del trabajo.
+
+    Args:
+        job: Trabajo de ingesta (ver agents.ingest_jobs)
+        predict: Si es False, los lotes de proveedores finales no se puntúan
+
+    Yields:
+        (nombre del evento, datos)
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    listener = lambda event: loop.call_soon_threadsafe(queue.put_nowait, event)
+    job.tracker.add_listener(listener)
+    # Al terminar el trabajo se encola None (después de sus últimos eventos)
+    job.future.add_done_callback(lambda _: loop.call_soon_threadsafe(queue.put_nowait, None))
+    try:
+        yield "progress", job.to_dict()
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=EVENT_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield "keepalive", {}
+                continue
+            if event is None:
+                break
+            final_rows = event.pop("final_rows", None)
+            if final_rows is None:
+                yield "progress", event
+            elif predict:
+                predictions = await loop.run_in_executor(None, predictor.predict_from_dataframe, final_rows)
+                yield "predictions", {"count": len(predictions), "predictions": predictions}
+        yield "done", job.to_dict()
+    finally:
+        job.tracker.remove_listener(listener)
+
+async def _sse_stream(job, predict: bool) -> AsyncIterator[str]:
+    """Formatea los eventos de un trabajo como Server-Sent Events"""
+    async for name, data in _ingest_events(job, predict):
+        if name == "keepalive":
+            yield ": keepalive\n\n"
+        else:
+            yield f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.get("/ingest/jobs/{job_id}/events")
+async def stream_ingest_job_events(job_id: str, predict: bool = True):
+    """
+    Progreso de un trabajo de ingesta en vivo (Server-Sent Events).
+    Además de las etapas, envía las predicciones de fraude de cada lote de proveedores
+    en cuanto sus agregados son finales, sin esperar a que termine toda la ingesta.
+    """
+    try:
+        job = ingest_jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Trabajo '{job_id}' no encontrado")
+        return StreamingResponse(
+            _sse_stream(job, predict),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo eventos: {str(e)}")
+
+@app.websocket("/ingest/jobs/{job_id}/ws")
+async def ingest_job_websocket(websocket: WebSocket, job_id: str, predict: bool = True):
+    """Mismos eventos que /ingest/jobs/{job_id}/events, por WebSocket ({"event", "data"})"""
+    await websocket.accept()
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        await websocket.send_json({"event": "error", "data": {"detail": f"Trabajo '{job_id}' no encontrado"}})
+        await websocket.close()
+        return
+    try:
+        async for name, data in _ingest_events(job, predict):
+            await websocket.send_text(json.dumps({"event": name, "data": data}, default=str))
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info(f"Cliente desconectado de los eventos del trabajo {job_id}")
+
+async def _run_dashboard_job():
+    """
+    Genera test_dashboard.csv como trabajo de ingesta en segundo plano y espera su fin
+    sin bloquear el event loop (un trabajo igual en curso se reutiliza).
+    """
+    job, _ = ingest_jobs.submit(final_output=None, dashboard_output=DASHBOARD_OUTPUT_FILE,
+                                period_output=None, network_output=None, code_output=None,
+                                duplicate_output=None, claims_output=None)
+    await asyncio.wrap_future(job.future)
+    return job
+
 @app.post("/generate-dashboard")
 async def generate_dashboard():
     """
-    Genera datos de dashboard agregados por proveedor.
+    Genera datos de dashboard agregados por proveedor (como trabajo en segundo plano).
     """
     try:
-        success = process_dashboard_files()
-        if success:
-            return {"success": True, "message": "Dashboard generado exitosamente"}
+        job = await _run_dashboard_job()
+        if job.status == "completed":
+            return {"success": True, "message": "Dashboard generado exitosamente", "job_id": job.job_id}
         else:
-            raise HTTPException(status_code=500, detail="Error generando dashboard")
+            raise HTTPException(status_code=500, detail=job.error or "Error generando dashboard")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando dashboard: {str(e)}")
 
@@ -162,12 +453,12 @@ async def get_dashboard_data():
         dashboard_file = os.path.join("data", "test_dashboard", "test_dashboard.csv")
         if not os.path.exists(dashboard_file):
             logger.info("Generando datos de dashboard...")
-            success = process_dashboard_files()
-            if not success:
+            job = await _run_dashboard_job()
+            if job.status != "completed":
                 return {"success": False, "error": "Error generando dashboard"}
         
         # Cargar datos de dashboard
-        dashboard_df = pd.read_csv(dashboard_file)
+        dashboard_df = read_table(dashboard_file)
         logger.info(f"Datos de dashboard cargados: {len(dashboard_df)} providers")
         
         # Convertir a lista de diccionarios para el frontend
@@ -195,21 +486,157 @@ async def get_provider_details(provider_name: str):
                 detail="No se encontró el archivo de dashboard. Ejecute /ingest primero."
             )
         
-        df = pd.read_csv(dashboard_file)
+        df = read_table(dashboard_file)
         provider_data = df[df['Provider'] == provider_name]
         
         if provider_data.empty:
             raise HTTPException(status_code=404, detail=f"Proveedor '{provider_name}' no encontrado")
         
+        # Features de la red proveedor-médico (si la ingesta las generó)
+        network = None
+        network_file = os.path.join("data", "test_network", "test_network.csv")
+        if os.path.exists(network_file):
+            network_df = read_table(network_file)
+            network_row = network_df[network_df['Provider'] == provider_name]
+            if not network_row.empty:
+                network = convert_numpy_types(network_row.iloc[0].to_dict())
+
+        # Códigos de diagnóstico/procedimiento más frecuentes (conteos con hashing)
+        top_codes = []
+        codes_file = os.path.join("data", "test_final", "test_codes.npz")
+        if os.path.exists(codes_file):
+            top_codes = ProviderCodeCounts.load(codes_file).top_codes(provider_name)
+
         return {
             "success": True,
-            "provider": provider_data.iloc[0].to_dict()
+            "provider": provider_data.iloc[0].to_dict(),
+            "network": network,
+            "top_codes": top_codes
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo detalles del proveedor: {str(e)}")
 
+@app.get("/provider-trajectory/{provider_name}")
+async def get_provider_trajectory(provider_name: str):
+    """
+    Trayectoria de riesgo de un proveedor: features y probabilidad de fraude por mes.
+    Todos los meses del proveedor se puntúan en una sola llamada al modelo.
+    """
+    try:
+        periods_file = os.path.join("data", "test_periods", "test_periods.csv")
+        if not os.path.exists(periods_file):
+            raise HTTPException(
+                status_code=404,
+                detail="No se encontró el archivo de agregados mensuales. Ejecute /ingest primero."
+            )
+        
+        df = read_table(periods_file)
+        provider_periods = df[df['Provider'] == provider_name].sort_values('Period')
+        
+        if provider_periods.empty:
+            raise HTTPException(status_code=404, detail=f"Proveedor '{provider_name}' no encontrado")
+        
+        scores = predictor.predict_periods(provider_periods)
+        trajectory = provider_periods.reset_index(drop=True).assign(
+            Prediccion=scores['Prediccion'],
+            Probabilidad_Fraude=scores['Probabilidad_Fraude']
+        )
+        peak = trajectory.loc[trajectory['Probabilidad_Fraude'].idxmax()]
+        
+        return {
+            "success": True,
+            "provider": provider_name,
+            "total_periods": len(trajectory),
+            "peak_period": str(peak['Period']),
+            "peak_probability": float(peak['Probabilidad_Fraude']),
+            "trajectory": convert_numpy_types(trajectory.to_dict(orient="records"))
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo trayectoria del proveedor: {str(e)}")
+
+@app.get("/provider-duplicates/{provider_name}")
+async def get_provider_duplicates(provider_name: str):
+    """
+    Claims repetidos de un proveedor: tasas de repetición y, por cada firma repetida
+    (mismo beneficiario, fechas y diagnósticos), todos los claims que la comparten,
+    incluidos los de otros proveedores.
+    """
+    try:
+        duplicates_file = os.path.join("data", "test_duplicates", "test_duplicates.csv")
+        drilldown_file = os.path.join("data", "test_duplicates", "test_duplicate_claims.csv")
+        if not os.path.exists(duplicates_file) or not os.path.exists(drilldown_file):
+            raise HTTPException(
+                status_code=404,
+                detail="No se encontró el archivo de claims repetidos. Ejecute /ingest primero."
+            )
+
+        df = read_table(duplicates_file)
+        provider_row = df[df['Provider'] == provider_name]
+        if provider_row.empty:
+            raise HTTPException(status_code=404, detail=f"Proveedor '{provider_name}' no encontrado")
+
+        drilldown = read_table(drilldown_file)
+        signatures = drilldown.loc[drilldown['Provider'] == provider_name, 'Signature'].unique()
+        groups = drilldown[drilldown['Signature'].isin(signatures)]
+
+        return {
+            "success": True,
+            "provider": provider_name,
+            "features": convert_numpy_types(provider_row.iloc[0].to_dict()),
+            "total_groups": len(signatures),
+            "claims": convert_numpy_types(groups.to_dict(orient="records"))
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo claims repetidos del proveedor: {str(e)}")
+
+@app.get("/provider-claims/{provider_name}")
+async def get_provider_claims(provider_name: str, offset: int = 0, limit: int = 100):
+    """
+    Claims de un proveedor, paginados y ordenados por fecha de inicio.
+    Se leen del archivo ordenado por proveedor (ver agents.claim_index): solo se toca
+    la página pedida, así que la latencia no depende del volumen total de claims.
+    """
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="offset debe ser mayor o igual a 0")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit debe estar entre 1 y {MAX_PAGE_SIZE}")
+    try:
+        claim_index = open_claim_index(Path("data") / "test_claims" / "test_claims.arrow")
+        if claim_index is None:
+            raise HTTPException(
+                status_code=404,
+                detail="No se encontró el índice de claims. Ejecute /ingest primero."
+            )
+
+        page = claim_index.page(provider_name, offset, limit)
+        if page is None:
+            raise HTTPException(status_code=404, detail=f"Proveedor '{provider_name}' no encontrado")
+
+        return {
+            "success": True,
+            "provider": provider_name,
+            "offset": offset,
+            "limit": limit,
+            "total_claims": page["total_claims"],
+            "claims": page["claims"]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo claims del proveedor: {str(e)}")
+
 @app.post("/predict")
-async def predict_fraud():
+async def predict_fraud(threshold: Optional[float] = None):
+    """
+    Puntúa todos los proveedores de test_final.csv con una sola pasada del modelo.
+    Con threshold se cambia el umbral de probabilidad a partir del cual se predice fraude.
+    """
+    if threshold is not None and not 0 < threshold < 1:
+        raise HTTPException(status_code=400, detail="threshold debe estar entre 0 y 1")
     try:
         processed_file = "data/test_final/test_final.csv"
         if not os.path.exists(processed_file):
@@ -217,11 +644,13 @@ async def predict_fraud():
                 status_code=404,
                 detail="No se encontró el archivo procesado. Ejecute /ingest primero."
             )
-        predictions = predictor.predict_from_csv(processed_file)
+        df = read_table(processed_file, ['Provider'] + predictor.feature_names)
+        batch = predictor.predict_batch(df, threshold)
         return {
             "success": True,
-            "predictions": predictions,
-            "total_providers": len(predictions)
+            "predictions": batch.to_records(),
+            "total_providers": len(batch),
+            "threshold": predictor.threshold if threshold is None else threshold
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en predicción: {str(e)}")
@@ -314,7 +743,10 @@ async def health_check():
         return {
             "status": "healthy",
             "model_loaded": "error" not in model_info,
-            "model_info": model_info
+            "model_info": model_info,
+            "model_registry": model_registry.status(),
+            "prediction_batching": prediction_batcher.stats(),
+            "startup": {"mode": STARTUP_MODE, "ready_seconds": startup_timer.ready_seconds}
         }
     except Exception as e:
         return {
@@ -322,12 +754,35 @@ async def health_check():
             "error": str(e)
         }
 
+@app.get("/startup-timing")
+async def get_startup_timing():
+    """Tiempos de las fases del arranque (también en metrics/startup_timing.json)"""
+    return {"success": True, **startup_timer.report(), "model_registry": model_registry.status()}
+
+@app.get("/model/version")
+async def get_model_version():
+    """Versión del modelo en uso y estado de la recarga automática"""
+    return {"success": True, **model_registry.status()}
+
+@app.post("/model/reload")
+async def reload_model():
+    """
+    Carga models/xgb_fraud_model.pkl si cambió y reemplaza la versión en uso sin
+    interrumpir las peticiones en curso (también ocurre solo al vigilar el archivo).
+    """
+    try:
+        loop = asyncio.get_running_loop()
+        version = await loop.run_in_executor(None, lambda: model_registry.reload(force=True))
+        return {"success": True, "reloaded": version is not None, **model_registry.status()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error recargando el modelo: {str(e)}")
+
 @app.get('/api/test-final-preview')
 def test_final_preview():
     try:
         base_dir = os.path.dirname(os.path.abspath(__file__))
         test_final_path = os.path.join(base_dir, 'data', 'test_final', 'test_final.csv')
-        df = pd.read_csv(test_final_path)
+        df = read_table(test_final_path)
         preview = df.head(10).to_dict(orient='records')
         return JSONResponse(content=preview)
     except Exception as e:
@@ -338,6 +793,7 @@ async def predict_single(request: SinglePredictionRequest):
     """
     Realiza una predicción individual con los datos proporcionados.
     Calcula automáticamente Mean_Reimbursed = Total_Reimbursed / Claim_Count
+    Las peticiones concurrentes se puntúan juntas en un lote (ver PredictionBatcher).
     """
     try:
         # Validar datos
@@ -350,27 +806,21 @@ async def predict_single(request: SinglePredictionRequest):
         # Calcular Mean_Reimbursed automáticamente
         mean_reimbursed = request.Total_Reimbursed / request.Claim_Count
         
-        # Crear DataFrame con los datos
-        data = {
-            'Provider': [request.Provider],
-            'Total_Reimbursed': [request.Total_Reimbursed],
-            'Mean_Reimbursed': [mean_reimbursed],
-            'Claim_Count': [request.Claim_Count],
-            'Unique_Beneficiaries': [request.Unique_Beneficiaries],
-            'Pct_Male': [request.Pct_Male]
-        }
+        # Una fila en el orden de predictor.feature_names (sin DataFrame: evaluador compilado)
+        features = [
+            request.Total_Reimbursed,
+            mean_reimbursed,
+            request.Claim_Count,
+            request.Unique_Beneficiaries,
+            request.Pct_Male
+        ]
         
-        df = pd.DataFrame(data)
-        
-        # Realizar predicción
-        predictions = predictor.predict_from_dataframe(df)
-        
-        if not predictions:
-            raise HTTPException(status_code=500, detail="Error en la predicción")
+        # Realizar predicción (en lote con las peticiones concurrentes)
+        prediction = await prediction_batcher.predict(request.Provider, features)
         
         return {
             "success": True,
-            "prediction": predictions[0],
+            "prediction": prediction,
             "calculated_mean_reimbursed": mean_reimbursed
         }
         
@@ -475,7 +925,8 @@ async def compare_explanations(provider_name: str):
                 detail="No se encontró el archivo test_final.csv. Ejecute /ingest primero."
             )
         
-        df = pd.read_csv(csv_path)
+        df = read_table(csv_path, ['Provider', 'Total_Reimbursed', 'Mean_Reimbursed', 'Claim_Count',
+                                   'Unique_Beneficiaries', 'Pct_Male'])
         provider_data = df[df['Provider'] == provider_name]
         
         if provider_data.empty:
@@ -714,6 +1165,9 @@ async def ai_assistant_endpoint(
     """
     return await ai_assistant_chat(user_message, context)
 
+startup_timer.mark("routes")
+startup_timer.finish(STARTUP_MODE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -0,0 +1,192 @@
+"""
+Paridad del evaluador compilado (CompiledForest) con el booster de XGBoost:
+filas aleatorias, filas con nulos y valores exactamente en los umbrales,
+lotes de una fila y de N filas, sobre modelos sintéticos y el modelo real.
+"""
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+xgb = pytest.importorskip("xgboost")
+joblib = pytest.importorskip("joblib")
+
+from agents.forest_evaluator import PARITY_TOLERANCE, CompiledForest, compile_forest
+
+MODEL_PATH = Path(__file__).resolve().parents[1] / "models" / "xgb_fraud_model.pkl"
+
+
+def booster_proba(model, X: np.ndarray) -> np.ndarray:
+    """Probabilidad de fraude según booster.predict (los NaN son nulos)"""
+    booster = model.get_booster()
+    dmatrix = xgb.DMatrix(X, missing=np.nan, feature_names=booster.feature_names)
+    iteration_range = (0, model.best_iteration + 1) if getattr(model, 'best_iteration', None) is not None else (0, 0)
+    return booster.predict(dmatrix, iteration_range=iteration_range).astype(np.float64)
+
+
+def max_difference(forest: CompiledForest, model, X: np.ndarray) -> float:
+    return float(np.max(np.abs(forest.predict_proba(X)[:, 1] - booster_proba(model, X)), initial=0.0))
+
+
+def threshold_rows(forest: CompiledForest) -> np.ndarray:
+    """
+    Una fila por umbral de cada split: la feature del split vale exactamente el umbral,
+    el float32 inmediatamente inferior o el inmediatamente superior, y el resto es nulo.
+    """
+    n_features = len(forest.feature_names) or int(forest.feature.max()) + 1
+    split = forest.left != -1
+    rows = []
+    for col in range(n_features):
+        thresholds = np.unique(forest.threshold[split & (forest.feature == col)])
+        for values in (thresholds,
+                       np.nextafter(thresholds, np.float32(-np.inf)),
+                       np.nextafter(thresholds, np.float32(np.inf))):
+            block = np.full((len(values), n_features), np.nan, dtype=np.float32)
+            block[:, col] = values
+            rows.append(block)
+    return np.concatenate(rows)
+
+
+def random_rows(n_rows: int, n_features: int, nan_share: float = 0.0, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, n_features)).astype(np.float32)
+    X[rng.random(X.shape) < nan_share] = np.nan
+    return X
+
+
+def train_model(n_rows: int = 600, n_features: int = 5, nan_share: float = 0.15,
+                early_stopping: bool = False, seed: int = 0):
+    """Clasificador sintético con nulos en el entrenamiento (ramas por defecto a ambos lados)"""
+    X = random_rows(n_rows, n_features, nan_share, seed)
+    signal = np.nan_to_num(X[:, 0]) + 0.5 * np.nan_to_num(X[:, 1]) - np.isnan(X[:, 2])
+    y = (signal + np.random.default_rng(seed + 1).normal(scale=0.5, size=n_rows) > 0).astype(int)
+    if early_stopping:
+        model = xgb.XGBClassifier(n_estimators=200, max_depth=4, learning_rate=0.3,
+                                  early_stopping_rounds=5, random_state=seed)
+        model.fit(X[:400], y[:400], eval_set=[(X[400:], y[400:])], verbose=False)
+    else:
+        model = xgb.XGBClassifier(n_estimators=40, max_depth=4, random_state=seed)
+        model.fit(X, y)
+    return model
+
+
+@pytest.fixture(scope="module")
+def synthetic():
+    model = train_model()
+    return model, CompiledForest.from_model(model)
+
+
+@pytest.fixture(scope="module")
+def real_model():
+    if not MODEL_PATH.exists():
+        pytest.skip(f"No se encontró el modelo {MODEL_PATH}")
+    with warnings.catch_warnings():
+        # Advertencia de XGBoost al deserializar un pickle de otra versión
+        warnings.simplefilter("ignore")
+        model = joblib.load(MODEL_PATH)
+    return model, CompiledForest.from_model(model)
+
+
+class TestSyntheticModel:
+
+    def test_random_rows(self, synthetic):
+        model, forest = synthetic
+        X = random_rows(5000, 5, seed=7)
+        assert max_difference(forest, model, X) <= PARITY_TOLERANCE
+
+    def test_rows_with_nulls(self, synthetic):
+        model, forest = synthetic
+        X = random_rows(5000, 5, nan_share=0.3, seed=8)
+        X[:10] = np.nan
+        assert max_difference(forest, model, X) <= PARITY_TOLERANCE
+
+    def test_values_on_thresholds(self, synthetic):
+        model, forest = synthetic
+        X = threshold_rows(forest)
+        assert max_difference(forest, model, X) <= PARITY_TOLERANCE
+
+    def test_parity_sample(self, synthetic):
+        model, forest = synthetic
+        assert max_difference(forest, model, forest.parity_sample()) <= PARITY_TOLERANCE
+
+    def test_early_stopping_uses_best_iteration(self):
+        model = train_model(early_stopping=True)
+        forest = CompiledForest.from_model(model)
+        assert forest.n_trees == model.best_iteration + 1
+        X = random_rows(2000, 5, nan_share=0.2, seed=9)
+        assert max_difference(forest, model, X) <= PARITY_TOLERANCE
+
+    def test_unsupported_objective(self):
+        X = random_rows(300, 3, seed=3)
+        y = np.arange(300) % 3
+        model = xgb.XGBClassifier(n_estimators=5, max_depth=2).fit(X, y)
+        with pytest.raises(ValueError):
+            CompiledForest.from_model(model)
+        assert compile_forest(model) is None
+
+
+class TestRealModel:
+
+    def test_random_rows(self, real_model):
+        model, forest = real_model
+        # Valores en la escala de cada feature: entre el menor y el mayor umbral (y algo más)
+        rng = np.random.default_rng(11)
+        split = forest.left != -1
+        X = np.empty((20000, len(forest.feature_names)), dtype=np.float32)
+        for col in range(X.shape[1]):
+            thresholds = forest.threshold[split & (forest.feature == col)]
+            low, high = (thresholds.min(), thresholds.max()) if len(thresholds) else (0.0, 1.0)
+            span = max(high - low, 1.0)
+            X[:, col] = rng.uniform(low - 0.1 * span, high + 0.1 * span, size=len(X))
+        assert max_difference(forest, model, X) <= PARITY_TOLERANCE
+
+    def test_rows_with_nulls(self, real_model):
+        model, forest = real_model
+        X = forest.parity_sample(n_rows=5000, seed=12)
+        X[:, 0] = np.nan
+        X[-1] = np.nan
+        assert max_difference(forest, model, X) <= PARITY_TOLERANCE
+
+    def test_values_on_thresholds(self, real_model):
+        model, forest = real_model
+        X = threshold_rows(forest)
+        assert max_difference(forest, model, X) <= PARITY_TOLERANCE
+
+    def test_parity_sample(self, real_model):
+        model, forest = real_model
+        assert max_difference(forest, model, forest.parity_sample(seed=13)) <= PARITY_TOLERANCE
+        assert forest.check_parity(model) <= PARITY_TOLERANCE
+
+    def test_batch_of_one(self, real_model):
+        model, forest = real_model
+        X = forest.parity_sample(n_rows=64, seed=14)
+        batch = forest.predict_proba(X)
+        for i, row in enumerate(X):
+            single = forest.predict_proba(row)
+            assert single.shape == (1, 2)
+            assert single[0, 1] == batch[i, 1]
+            assert abs(single[0, 1] - booster_proba(model, row.reshape(1, -1))[0]) <= PARITY_TOLERANCE
+
+    @pytest.mark.parametrize("n_rows", [1, 2, 7, 256, 4096])
+    def test_batch_sizes(self, real_model, n_rows):
+        model, forest = real_model
+        X = forest.parity_sample(n_rows=n_rows, seed=n_rows)
+        proba = forest.predict_proba(X)
+        assert proba.shape == (n_rows, 2)
+        np.testing.assert_allclose(proba.sum(axis=1), 1.0, rtol=0, atol=1e-6)
+        assert max_difference(forest, model, X) <= PARITY_TOLERANCE
+
+    def test_matches_classifier_on_dataframe(self, real_model):
+        model, forest = real_model
+        X = pd.DataFrame(forest.parity_sample(n_rows=500, seed=15), columns=forest.feature_names)
+        # Las columnas desordenadas se reordenan como en el entrenamiento
+        shuffled = X[forest.feature_names[::-1]]
+        expected = model.predict_proba(X)
+        np.testing.assert_allclose(forest.predict_proba(shuffled), expected, rtol=0, atol=PARITY_TOLERANCE)
+        np.testing.assert_array_equal(forest.predict(shuffled), model.predict(X))
+
+    def test_compile_forest(self, real_model):
+        model, _ = real_model
+        assert compile_forest(model) is not None
@@ -1,7 +1,5 @@
 import os
 from .config import GEMINI_API_KEY_B64, gemini_model
-from langdetect import detect
-import google.generativeai as genai
 from collections import Counter
 import base64
 
@@ -35,9 +33,17 @@ ALLOWED_TOPICS = [
 def get_gemini_api_key():
     return base64.b64decode(GEMINI_API_KEY_B64).decode()
 
-# Inicialización de Gemini
-if GEMINI_API_KEY_B64:
-    genai.configure(api_key=get_gemini_api_key())
+# Cliente de Gemini: se importa y configura en el primer uso (no en el arranque del servidor)
+_genai = None
+
+def get_genai():
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        if GEMINI_API_KEY_B64:
+            genai.configure(api_key=get_gemini_api_key())
+        _genai = genai
+    return _genai
 
 def is_fraud_topic(message: str) -> bool:
     message_lower = message.lower()
@@ -61,6 +67,7 @@ def is_fraud_topic_history(history):
 
 def get_language(message: str) -> str:
     try:
+        from langdetect import detect
         return detect(message)
     except Exception:
         return "es"
@@ -105,7 +112,7 @@ async def ai_assistant_chat(user_message: str, context: dict):
     lang = dominant_lang
     prompt = build_prompt(user_message, context, lang)
     try:
-        model = genai.GenerativeModel(gemini_model)
+        model = get_genai().GenerativeModel(gemini_model)
         response = await model.generate_content_async(prompt)
         answer = response.text if hasattr(response, 'text') else str(response)
         return {